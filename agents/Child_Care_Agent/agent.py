@@ -4,6 +4,7 @@
 """
 
 from google.adk.agents import LlmAgent
+from agents.Common.conversation_history import create_history_manager
 # 画像生成機能を一時的に無効化
 # from .vertex_ai_tools import (
 #     generate_child_image_tool,
@@ -59,6 +60,8 @@ root_agent = LlmAgent(
 子供からのメッセージを受け取ったら、適切に応答し、楽しく遊んでください。
 絵を描いてほしいと言われたら、言葉で美しく説明してあげてください。
     """,
+    # 長い会話でもプロンプトが大きくなり続けないよう、古いターンは要約にまとめる
+    before_model_callback=create_history_manager("child_care_agent"),
            tools=[
            # 画像生成機能を一時的に無効化
            # generate_child_image_tool,
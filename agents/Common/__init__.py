@@ -0,0 +1,3 @@
+"""
+共通モジュール - エージェント間・Webアプリで共有する基盤機能
+"""
@@ -0,0 +1,210 @@
+"""
+エージェントセッション管理 - InMemoryRunner のADKセッションを再利用・期限切れで破棄する
+リクエストごとにセッションを作って残し続けると、インスタンスのメモリが使った回数に比例して増えるため
+
+- クライアントが送ってきた session_id が同じクライアント・ユーザーのものなら、そのセッションを使い続ける（会話の継続）
+- 最後に使ってから ttl 秒たったセッションは定期的に削除する
+- 1クライアントあたりのセッション数が上限を超えたら、そのクライアントの最も古いものから削除する
+  （クライアントはサーバー側で決める接続元のキー。user_id はクライアントが自由に送れるので上限には使わない）
+- 全体のセッション数が上限を超えたら、全体で最も古いものから削除する
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class AgentSessionManager:
+    """1つの Runner のADKセッションのライフサイクルを管理する"""
+
+    def __init__(self, runner, ttl: float = 1800, max_per_client: int = 200, max_sessions: int = 5000):
+        self.runner = runner
+        self.ttl = ttl
+        self.max_per_client = max_per_client
+        self.max_sessions = max_sessions
+        # session_id → (クライアント, ユーザー, 最終利用時刻)。全体で古い順に並ぶ
+        self._sessions: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        # クライアント → そのクライアントの session_id（古い順）
+        self._clients: Dict[str, "OrderedDict[str, None]"] = {}
+        # session_id → (数え終わったイベント数, そのサイズ)。estimated_bytes を差分だけで更新する
+        self._event_bytes: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._counters = {"created": 0, "reused": 0, "expired": 0, "evicted": 0, "released": 0}
+
+    async def acquire(self, user_id: str, session_id: Optional[str] = None, client: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        セッションIDを返す（同じクライアント・ユーザーの管理中の session_id ならそれを再利用し、なければ新しく作る）
+
+        Args:
+            user_id: ADKのユーザーID
+            session_id: 続けたいセッションのID
+            client: 上限を数えるクライアントのキー（省略時は user_id）
+
+        Returns:
+            (session_id, 新しく作ったかどうか)
+        """
+        client = client or user_id
+        if session_id:
+            with self._lock:
+                entry = self._sessions.get(session_id)
+                if entry is not None and entry[:2] == (client, user_id):
+                    self._touch(session_id, client, user_id)
+                    self._counters["reused"] += 1
+                    return session_id, False
+
+        session = await self.create(user_id, client)
+        return session.id, True
+
+    async def create(self, user_id: str, client: Optional[str] = None):
+        """新しいセッションを作って管理対象にする（上限を超えたら最も古いセッションから削除）"""
+        client = client or user_id
+        session = await self.runner.session_service.create_session(app_name=self.runner.app_name, user_id=user_id)
+        with self._lock:
+            self._touch(session.id, client, user_id)
+            self._counters["created"] += 1
+            evicted = []
+            client_sessions = self._clients[client]
+            while len(client_sessions) > self.max_per_client:
+                evicted.append(self._pop(next(iter(client_sessions))))
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._pop(next(iter(self._sessions))))
+            self._counters["evicted"] += len(evicted)
+        for evicted_user_id, old_session_id in evicted:
+            await self._delete(evicted_user_id, old_session_id)
+        return session
+
+    async def release(self, user_id: str, session_id: str) -> None:
+        """使い終わったセッションをすぐに削除する"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[1] != user_id:
+                return
+            self._pop(session_id)
+            self._counters["released"] += 1
+        await self._delete(user_id, session_id)
+
+    async def sweep(self) -> int:
+        """ttl 秒以上使われていないセッションを削除し、削除した数を返す"""
+        deadline = time.monotonic() - self.ttl
+        expired = []
+        with self._lock:
+            # 古い順に並んでいるので、期限内のものが出たら打ち切る
+            while self._sessions:
+                session_id, (_, _, last_used) = next(iter(self._sessions.items()))
+                if last_used > deadline:
+                    break
+                expired.append(self._pop(session_id))
+            self._counters["expired"] += len(expired)
+        for user_id, session_id in expired:
+            await self._delete(user_id, session_id)
+        return len(expired)
+
+    async def run_sweeper(self, interval: Optional[float] = None) -> None:
+        """定期的に sweep() を実行する（起動時にタスクとして開始する）"""
+        interval = interval or max(min(self.ttl / 2, 60), 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                expired = await self.sweep()
+                if expired:
+                    logger.info("🧹 期限切れのエージェントセッションを削除", app_name=self.runner.app_name, expired=expired)
+            except Exception as e:
+                logger.error("❌ エージェントセッションの削除エラー", app_name=self.runner.app_name, error=str(e))
+
+    def _touch(self, session_id: str, client: str, user_id: str) -> None:
+        # ロックを取ってから呼ぶ。全体とクライアントごとの並びの末尾へ移動する
+        self._sessions[session_id] = (client, user_id, time.monotonic())
+        self._sessions.move_to_end(session_id)
+        client_sessions = self._clients.setdefault(client, OrderedDict())
+        client_sessions[session_id] = None
+        client_sessions.move_to_end(session_id)
+
+    def _pop(self, session_id: str) -> Tuple[str, str]:
+        # ロックを取ってから呼ぶ。(user_id, session_id) を返す
+        client, user_id, _ = self._sessions.pop(session_id)
+        client_sessions = self._clients.get(client)
+        if client_sessions is not None:
+            client_sessions.pop(session_id, None)
+            if not client_sessions:
+                del self._clients[client]
+        self._event_bytes.pop(session_id, None)
+        return user_id, session_id
+
+    async def _delete(self, user_id: str, session_id: str) -> None:
+        try:
+            await self.runner.session_service.delete_session(
+                app_name=self.runner.app_name, user_id=user_id, session_id=session_id
+            )
+        except Exception as e:
+            logger.warning("⚠️ エージェントセッションを削除できません", session_id=session_id, error=str(e))
+
+    def session_count(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _estimated_bytes(self) -> Optional[int]:
+        """
+        保持しているイベントのJSONサイズの合計（InMemorySessionService の場合のみ）
+
+        イベントは追加されるだけなので、前回から増えた分だけをシリアライズする。
+        """
+        app_sessions = getattr(self.runner.session_service, "sessions", {}).get(self.runner.app_name)
+        if app_sessions is None:
+            return None
+        total = 0
+        counted: Dict[str, Tuple[int, int]] = {}
+        with self._lock:
+            previous = dict(self._event_bytes)
+        for user_sessions in list(app_sessions.values()):
+            for session_id, session in list(user_sessions.items()):
+                events = session.events
+                seen, size = previous.get(session_id, (0, 0))
+                if seen > len(events):
+                    seen, size = 0, 0
+                size += sum(len(event.model_dump_json(exclude_none=True)) for event in events[seen:])
+                counted[session_id] = (len(events), size)
+                # 状態（会話の要約など）は書き換わるので毎回数える（小さい）
+                total += size + len(json.dumps(session.state, default=str))
+        with self._lock:
+            self._event_bytes = {session_id: counted[session_id] for session_id in counted if session_id in self._sessions}
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "sessions": len(self._sessions),
+                "clients": len(self._clients),
+                "ttl": self.ttl,
+                "max_per_client": self.max_per_client,
+                "max_sessions": self.max_sessions,
+                **self._counters,
+            }
+        stats["estimated_bytes"] = self._estimated_bytes()
+        return stats
+
+
+def create_agent_session_manager(runner) -> AgentSessionManager:
+    """
+    環境変数から作成
+
+    AGENT_SESSION_TTL: 最後に使ってから削除するまでの秒数（デフォルト: 1800）
+    AGENT_SESSIONS_PER_CLIENT: 1クライアントあたりのセッション数の上限（デフォルト: 200）
+    AGENT_SESSIONS_MAX: 全体のセッション数の上限（デフォルト: 5000）
+    """
+    return AgentSessionManager(
+        runner,
+        ttl=float(os.environ.get("AGENT_SESSION_TTL", 1800)),
+        max_per_client=int(os.environ.get("AGENT_SESSIONS_PER_CLIENT", 200)),
+        max_sessions=int(os.environ.get("AGENT_SESSIONS_MAX", 5000)),
+    )
+
+
+__all__ = ["AgentSessionManager", "create_agent_session_manager"]
@@ -0,0 +1,129 @@
+"""
+会話履歴の管理 - 長い会話でもモデルに送るプロンプトの大きさを一定に保つ
+
+ADKは毎ターン、セッションの全イベントからプロンプトを組み立てるため、
+同じセッションで会話を続けるとターンごとの待ち時間とトークン数が増え続ける。
+before_model_callback として登録し、直近 keep_turns ターンだけをそのまま送り、
+それより古いターンは1ターン1行の要約（抽出型: 発言の最初の一文）にまとめてシステム指示に加える。
+
+要約はセッションの状態に保存し、新しく古くなったターンの分だけ追記する（毎ターン全体を作り直さない）。
+"""
+
+import os
+import re
+from typing import List
+
+from google.genai import types
+
+from .logging_config import get_logger
+from .metrics import observe_prompt
+
+logger = get_logger(__name__)
+
+# セッションの状態のキー
+SUMMARY_KEY = "history_summary"
+SUMMARIZED_TURNS_KEY = "history_summarized_turns"
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?])|\n")
+
+
+def _content_text(content: types.Content) -> str:
+    return "".join(part.text or "" for part in content.parts or [] if not getattr(part, "thought", False))
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    sentence = next((s.strip() for s in _SENTENCE_END.split(text) if s.strip()), "")
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars] + "…"
+
+
+def split_turns(contents: List[types.Content]) -> List[List[types.Content]]:
+    """
+    ユーザーのテキスト発言ごとにターンに分ける
+
+    関数呼び出しの結果（function_response）はユーザー側の Content だが、ターンの区切りにはしない。
+    """
+    turns: List[List[types.Content]] = []
+    for content in contents:
+        starts_turn = content.role == "user" and any(part.text for part in content.parts or [])
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+class ConversationHistoryManager:
+    """
+    直近のターンをそのまま残し、古いターンを要約に畳み込む before_model_callback
+
+    Args:
+        agent_name: メトリクスのラベル
+        keep_turns: そのまま送る直近のターン数（現在のターンは含まない）
+        max_summary_chars: 要約の最大文字数（超えた分は古い行から捨てる）
+        max_line_chars: 要約1行の発言ごとの最大文字数
+    """
+
+    def __init__(self, agent_name: str, keep_turns: int = 6, max_summary_chars: int = 1200, max_line_chars: int = 60):
+        self.agent_name = agent_name
+        self.keep_turns = keep_turns
+        self.max_summary_chars = max_summary_chars
+        self.max_line_chars = max_line_chars
+
+    def summarize_turn(self, turn: List[types.Content]) -> str:
+        user_text = next((_content_text(c) for c in turn if c.role == "user" and _content_text(c)), "")
+        model_text = next((_content_text(c) for c in turn if c.role == "model" and _content_text(c)), "")
+        line = f"子ども: {_first_sentence(user_text, self.max_line_chars)}"
+        if model_text:
+            line += f" / うさぎ: {_first_sentence(model_text, self.max_line_chars)}"
+        return line
+
+    def _fold(self, summary: str, turns: List[List[types.Content]]) -> str:
+        lines = summary.splitlines() if summary else []
+        lines.extend(self.summarize_turn(turn) for turn in turns)
+        # 上限を超えたら古い行から捨てる
+        while lines and sum(len(line) + 1 for line in lines) > self.max_summary_chars:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def __call__(self, callback_context, llm_request) -> None:
+        turns = split_turns(llm_request.contents)
+        # 最後のターンは今回の発言（とツール呼び出し）
+        old_turns = turns[:-(self.keep_turns + 1)] if len(turns) > self.keep_turns + 1 else []
+
+        if old_turns:
+            state = callback_context.state
+            summarized = state.get(SUMMARIZED_TURNS_KEY, 0)
+            summary = state.get(SUMMARY_KEY, "")
+            if summarized > len(old_turns):
+                # 履歴が短くなった（別のセッションの状態を引き継いだなど）場合は作り直す
+                summarized, summary = 0, ""
+            if summarized < len(old_turns):
+                summary = self._fold(summary, old_turns[summarized:])
+                state[SUMMARY_KEY] = summary
+                state[SUMMARIZED_TURNS_KEY] = len(old_turns)
+
+            llm_request.contents = [content for turn in turns[len(old_turns):] for content in turn]
+            llm_request.append_instructions([f"【これまでの会話の要約（古い順）】\n{summary}"])
+            logger.debug("🗂️ 古い会話を要約", agent=self.agent_name, summarized_turns=len(old_turns), summary_chars=len(summary))
+
+        system_instruction = llm_request.config.system_instruction if llm_request.config else None
+        prompt_chars = len(system_instruction) if isinstance(system_instruction, str) else 0
+        prompt_chars += sum(len(_content_text(content)) for content in llm_request.contents)
+        observe_prompt(self.agent_name, prompt_chars, len(turns))
+        return None
+
+
+def create_history_manager(agent_name: str) -> ConversationHistoryManager:
+    """
+    環境変数から作成
+
+    HISTORY_KEEP_TURNS: そのまま送る直近のターン数（デフォルト: 6）
+    HISTORY_SUMMARY_MAX_CHARS: 要約の最大文字数（デフォルト: 1200）
+    """
+    return ConversationHistoryManager(
+        agent_name,
+        keep_turns=int(os.environ.get("HISTORY_KEEP_TURNS", 6)),
+        max_summary_chars=int(os.environ.get("HISTORY_SUMMARY_MAX_CHARS", 1200)),
+    )
+
+
+__all__ = ["ConversationHistoryManager", "create_history_manager", "split_turns"]
@@ -0,0 +1,192 @@
+"""
+構造化ログ - structlog によるレベル付き・サンプリング付きのログ出力
+リクエストごとの文脈（session_id, page）を contextvars で自動付与し、画像などのバイナリは出力しない
+
+環境変数:
+    LOG_LEVEL: 出力するレベル（デフォルト: INFO）
+    LOG_FORMAT: "json"（Cloud Logging向け）または "console"（デフォルト: Cloud Run上では json）
+    LOG_SAMPLE_RATE: INFO以下のログを出力する割合 0.0〜1.0（デフォルト: 1.0、WARNING以上は常に出力）
+    LOG_MAX_FIELD_CHARS: 文字列フィールドの最大長（デフォルト: 500）
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator
+
+import structlog
+from structlog.contextvars import bind_contextvars, bound_contextvars, clear_contextvars
+
+_configured = False
+
+# Cloud Logging の severity に合わせる
+_SEVERITY = {
+    "debug": "DEBUG",
+    "info": "INFO",
+    "warning": "WARNING",
+    "error": "ERROR",
+    "critical": "CRITICAL",
+    "exception": "ERROR",
+}
+
+# そのまま出力してよい型（ログ1行ごとに通るので先に判定する）
+_SCALARS = (int, float, bool)
+
+
+
+def _summarize(value: Any, max_chars: int) -> Any:
+    """バイナリはサイズだけに、長い文字列は切り詰める"""
+    if value is None or type(value) in _SCALARS:
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > max_chars:
+        return f"{value[:max_chars]}...(+{len(value) - max_chars} chars)"
+    if isinstance(value, dict):
+        return {k: _summarize(v, max_chars) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_summarize(v, max_chars) for v in value]
+    return value
+
+
+def _redact_payloads(max_chars: int):
+    def processor(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        # ほとんどの値はそのまま出力するので、変える値だけを書き換える（辞書は作り直さない）
+        for key, value in event_dict.items():
+            value_type = type(value)
+            if value_type is str:
+                if len(value) > max_chars:
+                    event_dict[key] = _summarize(value, max_chars)
+                continue
+            if value is None or value_type in _SCALARS or key == "exc_info":
+                continue
+            summarized = _summarize(value, max_chars)
+            if summarized is not value:
+                event_dict[key] = summarized
+        return event_dict
+
+    return processor
+
+
+def _sample(rate: float):
+    def processor(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        if method_name in ("debug", "info") and random.random() >= rate:
+            raise structlog.DropEvent
+        return event_dict
+
+    return processor
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    return repr(value)
+
+
+def _json_dumps() -> Callable[[Dict[str, Any]], str]:
+    """orjson があれば使い、なければ標準の json（エンコーダーは毎回作らず使い回す）"""
+    encoder = json.JSONEncoder(ensure_ascii=False, default=_json_default)
+    try:
+        import orjson
+    except ImportError:
+        return encoder.encode
+
+    option = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def dumps(event_dict: Dict[str, Any]) -> str:
+        try:
+            return orjson.dumps(event_dict, default=_json_default, option=option).decode("utf-8")
+        except TypeError:
+            # orjson が扱えない値（64bitを超える整数など）は標準の json で出力する
+            return encoder.encode(event_dict)
+
+    return dumps
+
+
+def _cloud_logging_renderer():
+    """
+    Cloud Logging 向けのJSON1行にするプロセッサー
+
+    message・severity・timestamp の付与と例外の整形、シリアライズを1つのプロセッサーで行う
+    （INFOのログ1行あたりのプロセッサー呼び出しを減らすため）。
+    """
+    dumps = _json_dumps()
+
+    def processor(logger, method_name: str, event_dict: Dict[str, Any]) -> str:
+        if "exc_info" in event_dict:
+            event_dict = structlog.processors.format_exc_info(logger, method_name, event_dict)
+        event_dict["message"] = event_dict.pop("event", "")
+        event_dict["severity"] = _SEVERITY.get(method_name, method_name.upper())
+        event_dict["timestamp"] = datetime.now(timezone.utc)
+        return dumps(event_dict)
+
+    return processor
+
+
+def configure_logging(force: bool = False) -> None:
+    """structlog をプロセスで一度だけ設定する"""
+    global _configured
+    if _configured and not force:
+        return
+
+    level = logging.getLevelName(os.environ.get("LOG_LEVEL", "INFO").upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    sample_rate = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+    max_chars = int(os.environ.get("LOG_MAX_FIELD_CHARS", 500))
+    log_format = os.environ.get("LOG_FORMAT", "json" if os.environ.get("K_SERVICE") else "console")
+
+    processors = [
+        structlog.contextvars.merge_contextvars,
+    ]
+    if sample_rate < 1.0:
+        processors.append(_sample(sample_rate))
+    processors.append(_redact_payloads(max_chars))
+    if log_format == "json":
+        processors.append(_cloud_logging_renderer())
+    else:
+        processors += [
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
+            structlog.processors.add_log_level,
+            structlog.dev.ConsoleRenderer(colors=False),
+        ]
+
+    structlog.configure(
+        processors=processors,
+        # レベル未満のログはメソッド自体が何もしない（プロセッサーも出力も通らない）。
+        # ただしキーワード引数は呼び出し時に評価されるので、重い値は isEnabledFor で囲むこと
+        wrapper_class=structlog.make_filtering_bound_logger(level),
+        logger_factory=structlog.PrintLoggerFactory(sys.stdout),
+        cache_logger_on_first_use=True,
+    )
+    _configured = True
+
+
+def get_logger(name: str = None):
+    """
+    ロガーを取得
+
+    実際の設定は最初にログを出した時点のものが使われるので、モジュールの読み込み時に呼んでよい
+    （環境変数を読み込んだ後に configure_logging() を呼ぶこと）。
+    """
+    return structlog.get_logger(name) if name else structlog.get_logger()
+
+
+@contextmanager
+def log_context(**context: Any) -> Iterator[None]:
+    """ブロック内のログに session_id・page などを付与する"""
+    with bound_contextvars(**context):
+        yield
+
+
+__all__ = [
+    "configure_logging",
+    "get_logger",
+    "log_context",
+    "bind_contextvars",
+    "clear_contextvars",
+]
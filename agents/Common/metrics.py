@@ -0,0 +1,155 @@
+"""
+メトリクス - パイプラインの各段階の所要時間・結果をPrometheus形式で公開する
+/metrics から取得し、SLOの設定やインスタンス数の見積もりに使う
+
+段階（stage ラベル）:
+    story_generation: runner.run_async による物語テキストの生成
+    image_job: 画像生成ジョブ全体（待ち行列・キャッシュ確認・アップロードを含む）
+    gemini_image: Gemini の画像生成呼び出し
+    reference_download: 参照画像の取得
+    storage_upload: ストレージへのアップロード
+    tts_synthesis: ページ音声の合成
+    next_page_wait: next_page で画像の完成を待った時間
+    agent_first_token: /agent/{agent_name}?stream=true で最初のテキストを送るまでの時間
+
+エージェントのプロンプト（agent ラベル）:
+    mimamori_agent_prompt_chars: モデルに送ったプロンプトの文字数（システム指示を含む）
+    mimamori_agent_history_turns: セッションの会話のターン数（要約に畳み込んだ分を含む）
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from .tracing import span
+
+# 数十ミリ秒（キャッシュヒット）から数十秒（画像生成）までを1つのバケット列で扱う
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 15, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "mimamori_stage_duration_seconds",
+    "パイプラインの各段階の所要時間",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_TOTAL = Counter(
+    "mimamori_stage_total",
+    "パイプラインの各段階の実行回数（outcome: success, error, failed, timeout, rejected など）",
+    ["stage", "outcome"],
+)
+
+PROMPT_CHARS = Histogram(
+    "mimamori_agent_prompt_chars",
+    "モデルに送ったプロンプトの文字数（1回のモデル呼び出しごと）",
+    ["agent"],
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000),
+)
+HISTORY_TURNS = Histogram(
+    "mimamori_agent_history_turns",
+    "モデル呼び出し時のセッションの会話のターン数",
+    ["agent"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+
+# コールバックの戻り値: 数値、または ラベル値 → 数値
+CallbackValue = Union[float, Dict[str, float]]
+
+
+def observe_stage(stage: str, seconds: float, outcome: str = "success") -> None:
+    """段階の所要時間と結果を記録する"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    STAGE_TOTAL.labels(stage, outcome).inc()
+
+
+def observe_prompt(agent: str, chars: int, turns: int) -> None:
+    """モデル呼び出し1回分のプロンプトの大きさを記録する"""
+    PROMPT_CHARS.labels(agent).observe(chars)
+    HISTORY_TURNS.labels(agent).observe(turns)
+
+
+@contextmanager
+def track_stage(stage: str, **attributes: Any) -> Iterator[None]:
+    """
+    ブロックの所要時間を記録する（例外で抜けた場合は outcome=error）
+
+    同じ名前のトレースのスパンも作る。
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with span(stage, **attributes):
+            yield
+        outcome = "success"
+    finally:
+        observe_stage(stage, time.perf_counter() - start, outcome)
+
+
+class _CallbackCollector:
+    """取得時にコールバックを呼んで値を集める（セッション数・待ち行列の長さなど）"""
+
+    def __init__(self):
+        self._metrics: List[Tuple[str, str, Callable[[], CallbackValue], Optional[str], str]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, documentation: str, callback: Callable[[], CallbackValue],
+            label: Optional[str], kind: str) -> None:
+        with self._lock:
+            self._metrics = [m for m in self._metrics if m[0] != name]
+            self._metrics.append((name, documentation, callback, label, kind))
+
+    def collect(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        for name, documentation, callback, label, kind in metrics:
+            family_type = CounterMetricFamily if kind == "counter" else GaugeMetricFamily
+            family = family_type(name, documentation, labels=[label] if label else None)
+            try:
+                value = callback()
+            except Exception:
+                # 1つのコールバックの失敗で /metrics 全体を失敗させない
+                continue
+            if label:
+                for label_value, number in value.items():
+                    family.add_metric([str(label_value)], number)
+            else:
+                family.add_metric([], value)
+            yield family
+
+
+_callbacks = _CallbackCollector()
+REGISTRY.register(_callbacks)
+
+
+def register_gauge(name: str, documentation: str, callback: Callable[[], CallbackValue],
+                   label: Optional[str] = None) -> None:
+    """
+    取得時に callback() の値を返すゲージを登録する
+
+    label を指定した場合、callback() は {ラベル値: 数値} を返す。同じ名前で登録し直すと置き換わる。
+    """
+    _callbacks.add(name, documentation, callback, label, "gauge")
+
+
+def register_counter(name: str, documentation: str, callback: Callable[[], CallbackValue],
+                     label: Optional[str] = None) -> None:
+    """既存の累計カウンター（スケジューラーの stats() など）をカウンターとして公開する"""
+    _callbacks.add(name, documentation, callback, label, "counter")
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """(本文, Content-Type) を返す"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+__all__ = [
+    "observe_prompt",
+    "observe_stage",
+    "track_stage",
+    "register_gauge",
+    "register_counter",
+    "render_metrics",
+]
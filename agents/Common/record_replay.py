@@ -0,0 +1,364 @@
+"""
+記録・再生モード - Gemini（ADK Runner・画像生成）と読み上げ合成の応答をディスクに記録し、同じ入力で再生する
+実際の通信の大きさ・待ち時間のまま、APIを呼ばずにベンチマークやプロファイリングを行う
+
+    record: 実際に呼び出し、応答と所要時間をカセットとして保存する
+    replay: カセットから応答を返す（記録時の待ち時間 × RECORD_REPLAY_LATENCY_SCALE だけ待つ）
+
+環境変数:
+    RECORD_REPLAY_MODE: "off"、"record"、"replay"（デフォルト: off）
+    RECORD_REPLAY_DIR: カセットの保存先（デフォルト: tmp/mimamori-cassettes）
+    RECORD_REPLAY_LATENCY_SCALE: 再生時の待ち時間の倍率（デフォルト: 1.0、0で待たない）
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(LookupError):
+    """再生モードで、入力に対応するカセットがない"""
+
+
+class CassetteStore:
+    """
+    種類（runner / image / tts）と入力のハッシュごとに1つのJSONファイルとして保存する
+
+    カセットの形式: {"kind", "request", "latency", "frames": [{"offset": 秒, "payload": ...}]}
+    ストリームは要素ごとに開始からの経過時間（offset）を持ち、再生時もその間隔で返す。
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, request: Dict[str, Any]) -> str:
+        raw = json.dumps({"kind": kind, **request}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.root, kind, f"{key}.json")
+
+    def save(self, kind: str, request: Dict[str, Any], frames: List[Dict[str, Any]], latency: float) -> None:
+        path = self._path(kind, self.key(kind, request))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cassette = {"kind": kind, "request": request, "latency": latency, "frames": frames}
+        # 同時に同じ入力を記録しても壊れたファイルが残らないよう、書き終えてから置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.recorded += 1
+
+    def load(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        path = self._path(kind, self.key(kind, request))
+        try:
+            with open(path, encoding="utf-8") as f:
+                cassette = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            raise CassetteMissError(f"カセットがありません: {kind} {request}") from None
+        with self._lock:
+            self.replayed += 1
+        return cassette
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"recorded": self.recorded, "replayed": self.replayed, "misses": self.misses}
+
+
+def _encode_bytes(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _decode_bytes(data: str) -> bytes:
+    return base64.b64decode(data)
+
+
+def _content_text(content: Any) -> str:
+    """ADKに渡すメッセージ（types.Content）のテキスト部分"""
+    parts = getattr(content, "parts", None) or []
+    return "".join(getattr(part, "text", None) or "" for part in parts)
+
+
+class RecordReplayRunner:
+    """
+    InMemoryRunner の run / run_async を記録・再生する
+
+    セッション管理（session_service）はそのまま元の Runner を使う。
+    カセットのキーはアプリ名・メッセージのテキスト・ストリーミングモードと、同じセッションでの
+    ターン番号・それまでのメッセージのハッシュ（会話の途中で同じ発言をしても別の応答として記録する）。
+    再生時は応答がセッションに追加されないため、履歴はセッションではなくこのクラスで数える。
+    """
+
+    def __init__(self, runner, store: CassetteStore, mode: str, latency_scale: float = 1.0,
+                 max_tracked_sessions: int = 10000):
+        self._runner = runner
+        self._store = store
+        self._mode = mode
+        self._latency_scale = latency_scale
+        self._max_tracked_sessions = max_tracked_sessions
+        # (user_id, session_id) → (次のターン番号, それまでのメッセージのハッシュ)。古い順に並ぶ
+        self._history: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._history_lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._runner, name)
+
+    def _request(self, user_id: str, session_id: str, new_message, run_config=None) -> Dict[str, Any]:
+        message = _content_text(new_message)
+        with self._history_lock:
+            turn, history = self._history.pop((user_id, session_id), (0, ""))
+            digest = hashlib.sha256(f"{history}\x1f{message}".encode("utf-8")).hexdigest()
+            self._history[(user_id, session_id)] = (turn + 1, digest)
+            while len(self._history) > self._max_tracked_sessions:
+                self._history.popitem(last=False)
+        streaming_mode = getattr(getattr(run_config, "streaming_mode", None), "value", None)
+        return {
+            "app_name": self._runner.app_name,
+            "message": message,
+            "streaming_mode": streaming_mode,
+            "turn": turn,
+            "history": history,
+        }
+
+    @staticmethod
+    def _dump_event(event) -> Dict[str, Any]:
+        return event.model_dump(mode="json", exclude_none=True)
+
+    @staticmethod
+    def _load_event(payload: Dict[str, Any]):
+        from google.adk.events import Event
+
+        return Event.model_validate(payload)
+
+    async def run_async(self, *, user_id: str, session_id: str, new_message, run_config=None, **kwargs) -> AsyncIterator[Any]:
+        request = self._request(user_id, session_id, new_message, run_config)
+        if self._mode == "replay":
+            cassette = self._store.load("runner", request)
+            start = time.monotonic()
+            for frame in cassette["frames"]:
+                delay = frame["offset"] * self._latency_scale - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield self._load_event(frame["payload"])
+            return
+
+        frames = []
+        start = time.monotonic()
+        if run_config is not None:
+            kwargs["run_config"] = run_config
+        async for event in self._runner.run_async(
+            user_id=user_id, session_id=session_id, new_message=new_message, **kwargs
+        ):
+            frames.append({"offset": time.monotonic() - start, "payload": self._dump_event(event)})
+            yield event
+        self._store.save("runner", request, frames, time.monotonic() - start)
+
+    def run(self, *, user_id: str, session_id: str, new_message, run_config=None, **kwargs) -> Iterator[Any]:
+        request = self._request(user_id, session_id, new_message, run_config)
+        if self._mode == "replay":
+            cassette = self._store.load("runner", request)
+            start = time.monotonic()
+            for frame in cassette["frames"]:
+                delay = frame["offset"] * self._latency_scale - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+                yield self._load_event(frame["payload"])
+            return
+
+        frames = []
+        start = time.monotonic()
+        if run_config is not None:
+            kwargs["run_config"] = run_config
+        for event in self._runner.run(
+            user_id=user_id, session_id=session_id, new_message=new_message, **kwargs
+        ):
+            frames.append({"offset": time.monotonic() - start, "payload": self._dump_event(event)})
+            yield event
+        self._store.save("runner", request, frames, time.monotonic() - start)
+
+
+def _contents_request(model_name: str, contents: Any) -> Dict[str, Any]:
+    """generate_content の入力をキーにできる形にする（画像は内容のハッシュ）"""
+    items = contents if isinstance(contents, list) else [contents]
+    normalized = []
+    for item in items:
+        if isinstance(item, str):
+            normalized.append(item)
+        elif hasattr(item, "tobytes"):
+            # PIL.Image
+            normalized.append({"image": hashlib.sha256(item.tobytes()).hexdigest(), "size": list(item.size)})
+        else:
+            normalized.append(repr(item))
+    return {"model": model_name, "contents": normalized}
+
+
+def _dump_response(response) -> Dict[str, Any]:
+    candidates = []
+    for candidate in getattr(response, "candidates", None) or []:
+        parts = []
+        for part in candidate.content.parts:
+            inline_data = getattr(part, "inline_data", None)
+            if inline_data and inline_data.data:
+                parts.append({"inline_data": {"mime_type": inline_data.mime_type, "data": _encode_bytes(inline_data.data)}})
+            elif getattr(part, "text", None):
+                parts.append({"text": part.text})
+        candidates.append({"parts": parts})
+    return {"candidates": candidates, "prompt_feedback": str(getattr(response, "prompt_feedback", "") or "")}
+
+
+def _load_response(payload: Dict[str, Any]) -> SimpleNamespace:
+    """generate_content の応答のうち、呼び出し側が参照する属性だけを持つオブジェクト"""
+    candidates = []
+    for candidate in payload["candidates"]:
+        parts = []
+        for part in candidate["parts"]:
+            inline_data = part.get("inline_data")
+            parts.append(SimpleNamespace(
+                text=part.get("text", ""),
+                inline_data=SimpleNamespace(
+                    mime_type=inline_data["mime_type"], data=_decode_bytes(inline_data["data"])
+                ) if inline_data else None,
+            ))
+        candidates.append(SimpleNamespace(content=SimpleNamespace(parts=parts)))
+    return SimpleNamespace(candidates=candidates, prompt_feedback=payload.get("prompt_feedback"))
+
+
+class RecordReplayModel:
+    """genai.GenerativeModel の generate_content / generate_content_async を記録・再生する"""
+
+    def __init__(self, model, model_name: str, store: CassetteStore, mode: str, latency_scale: float = 1.0):
+        self._model = model
+        self._model_name = model_name
+        self._store = store
+        self._mode = mode
+        self._latency_scale = latency_scale
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._model, name)
+
+    def generate_content(self, contents, **kwargs):
+        request = _contents_request(self._model_name, contents)
+        if self._mode == "replay":
+            cassette = self._store.load("image", request)
+            time.sleep(cassette["latency"] * self._latency_scale)
+            return _load_response(cassette["frames"][0]["payload"])
+
+        start = time.monotonic()
+        response = self._model.generate_content(contents, **kwargs)
+        latency = time.monotonic() - start
+        self._store.save("image", request, [{"offset": latency, "payload": _dump_response(response)}], latency)
+        return response
+
+    async def generate_content_async(self, contents, **kwargs):
+        request = _contents_request(self._model_name, contents)
+        if self._mode == "replay":
+            cassette = self._store.load("image", request)
+            await asyncio.sleep(cassette["latency"] * self._latency_scale)
+            return _load_response(cassette["frames"][0]["payload"])
+
+        start = time.monotonic()
+        response = await self._model.generate_content_async(contents, **kwargs)
+        latency = time.monotonic() - start
+        self._store.save("image", request, [{"offset": latency, "payload": _dump_response(response)}], latency)
+        return response
+
+
+def _record_replay_synthesize(synthesize: Callable[[str, str], bytes], store: CassetteStore, mode: str,
+                              latency_scale: float) -> Callable[[str, str], bytes]:
+    def wrapper(text: str, language: str) -> bytes:
+        request = {"text": text, "language": language}
+        if mode == "replay":
+            cassette = store.load("tts", request)
+            time.sleep(cassette["latency"] * latency_scale)
+            return _decode_bytes(cassette["frames"][0]["payload"])
+
+        start = time.monotonic()
+        data = synthesize(text, language)
+        latency = time.monotonic() - start
+        store.save("tts", request, [{"offset": latency, "payload": _encode_bytes(data)}], latency)
+        return data
+
+    return wrapper
+
+
+_store: Optional[CassetteStore] = None
+_store_lock = threading.Lock()
+
+
+def record_replay_mode() -> str:
+    mode = os.environ.get("RECORD_REPLAY_MODE", "off").lower()
+    return mode if mode in MODES else "off"
+
+
+def _latency_scale() -> float:
+    return float(os.environ.get("RECORD_REPLAY_LATENCY_SCALE", 1.0))
+
+
+def get_cassette_store() -> CassetteStore:
+    """プロセス共通のカセット置き場（初回呼び出し時に RECORD_REPLAY_DIR から作成）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CassetteStore(os.environ.get("RECORD_REPLAY_DIR", "tmp/mimamori-cassettes"))
+    return _store
+
+
+def wrap_runner(runner):
+    """記録・再生モードなら Runner を包む（off ならそのまま返す）"""
+    mode = record_replay_mode()
+    if mode == "off":
+        return runner
+    logger.info("📼 Runnerの記録・再生", mode=mode, app_name=runner.app_name)
+    return RecordReplayRunner(runner, get_cassette_store(), mode, _latency_scale())
+
+
+def wrap_model(model, model_name: str):
+    """記録・再生モードなら GenerativeModel を包む（off ならそのまま返す）"""
+    mode = record_replay_mode()
+    if mode == "off":
+        return model
+    return RecordReplayModel(model, model_name, get_cassette_store(), mode, _latency_scale())
+
+
+def wrap_synthesize(synthesize: Callable[[str, str], bytes]) -> Callable[[str, str], bytes]:
+    """記録・再生モードなら読み上げ合成の関数を包む（off ならそのまま返す）"""
+    mode = record_replay_mode()
+    if mode == "off":
+        return synthesize
+    return _record_replay_synthesize(synthesize, get_cassette_store(), mode, _latency_scale())
+
+
+__all__ = [
+    "CassetteMissError",
+    "CassetteStore",
+    "RecordReplayModel",
+    "RecordReplayRunner",
+    "get_cassette_store",
+    "record_replay_mode",
+    "wrap_model",
+    "wrap_runner",
+    "wrap_synthesize",
+]
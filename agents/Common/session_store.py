@@ -0,0 +1,306 @@
+"""
+セッションストア - 読み聞かせセッションのデータを保存する差し替え可能なストア
+メモリ上のLRU+TTL実装と、複数ワーカー・複数インスタンスで共有できるRedis実装を提供
+"""
+
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+SessionData = Dict[str, Any]
+
+
+class SessionStore:
+    """
+    セッションストアのインターフェース
+
+    get() は保存内容のコピーを返すため、変更は set() / update() で書き戻すこと。
+    shared がTrueのストアは他のワーカーと共有されるため、プロセス内の通知が届かない更新がある。
+    async関数からは *_async() を使う（ネットワーク越しのストアでもイベントループを止めない）。
+    """
+
+    shared = False
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        raise NotImplementedError
+
+    def set(self, session_id: str, data: SessionData) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def update(self, session_id: str, mutate: Callable[[SessionData], None]) -> Optional[SessionData]:
+        """
+        セッションデータを読み込み、mutate で変更して書き戻す（他の書き込みと競合しない）
+
+        Returns:
+            変更後のデータ（セッションがなければNone）
+        """
+        raise NotImplementedError
+
+    def keys(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.keys())
+
+    # メモリ上のストアはすぐに終わるので、そのまま呼び出す
+    async def get_async(self, session_id: str) -> Optional[SessionData]:
+        return self.get(session_id)
+
+    async def set_async(self, session_id: str, data: SessionData) -> None:
+        self.set(session_id, data)
+
+    async def delete_async(self, session_id: str) -> None:
+        self.delete(session_id)
+
+    async def update_async(self, session_id: str, mutate: Callable[[SessionData], None]) -> Optional[SessionData]:
+        return self.update(session_id, mutate)
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    プロセス内のLRU+TTLセッションストア
+
+    最終アクセスからttl秒経過したセッションと、max_sessionsを超えた古いセッションを破棄する。
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl: float = 3600,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        with self._lock:
+            data, expired = self._touch(session_id)
+            data = copy.deepcopy(data) if data is not None else None
+        self._notify_evicted(expired)
+        return data
+
+    def set(self, session_id: str, data: SessionData) -> None:
+        evicted = []
+        with self._lock:
+            self._data[session_id] = (time.monotonic() + self.ttl, copy.deepcopy(data))
+            self._data.move_to_end(session_id)
+            evicted = self._evict()
+        self._notify_evicted(evicted)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            removed = self._data.pop(session_id, None)
+        if removed is not None:
+            self._notify_evicted([session_id])
+
+    def update(self, session_id: str, mutate: Callable[[SessionData], None]) -> Optional[SessionData]:
+        with self._lock:
+            data, expired = self._touch(session_id)
+            if data is not None:
+                mutate(data)
+                data = copy.deepcopy(data)
+        self._notify_evicted(expired)
+        return data
+
+    def keys(self) -> Iterator[str]:
+        with self._lock:
+            evicted = self._evict()
+            keys = list(self._data.keys())
+        self._notify_evicted(evicted)
+        return iter(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            evicted = self._evict()
+            size = len(self._data)
+        self._notify_evicted(evicted)
+        return size
+
+    def _touch(self, session_id: str) -> tuple:
+        """
+        アクセスのたびに有効期限を延長し、LRUの末尾へ移動する
+
+        Returns:
+            (データ（期限切れ・未登録ならNone）, 期限切れで破棄したセッションIDのリスト)
+        """
+        entry = self._data.get(session_id)
+        if entry is None:
+            return None, []
+        expires_at, data = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            del self._data[session_id]
+            return None, [session_id]
+        self._data[session_id] = (now + self.ttl, data)
+        self._data.move_to_end(session_id)
+        return data, []
+
+    def _evict(self) -> list:
+        # 先頭ほど最終アクセスが古い（＝期限切れが早い）ので、先頭から順に確認する
+        evicted = []
+        now = time.monotonic()
+        while self._data:
+            session_id, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now and len(self._data) <= self.max_sessions:
+                break
+            self._data.popitem(last=False)
+            evicted.append(session_id)
+        return evicted
+
+    def _notify_evicted(self, session_ids: list) -> None:
+        if not self.on_evict:
+            return
+        for session_id in session_ids:
+            try:
+                self.on_evict(session_id)
+            except Exception as e:
+                logger.warning("⚠️ セッション破棄通知エラー", session_id=session_id, error=str(e))
+
+
+def _decode_page_keys(obj: Dict[str, Any]) -> Dict[Any, Any]:
+    # JSONではキーが文字列になるため、ページ番号（数字のキー）をintに戻す
+    return {int(k) if isinstance(k, str) and k.isdigit() else k: v for k, v in obj.items()}
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Redisプロトコルのセッションストア（redis-py互換クライアントを渡す）
+
+    キーごとにTTLを設定し、アクセスのたびに延長する。
+    update() は WATCH/MULTI による楽観ロックで他ワーカーの書き込みと競合しない。
+    *_async() は同期版をスレッドで実行する（Redisの往復でイベントループを止めない）。
+    __len__ は全キーを SCAN するので、リクエストやメトリクスの取得のたびに呼ばないこと。
+    on_evict は delete() で呼ばれる。Redis側のTTLで消えたキーには通知できないため、
+    プロセス内の付随データはセッションの破棄に頼らず後始末すること。
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        client,
+        ttl: float = 3600,
+        prefix: str = "mimamori:session:",
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.on_evict = on_evict
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    @staticmethod
+    def _dumps(data: SessionData) -> str:
+        return json.dumps(data, ensure_ascii=False)
+
+    @staticmethod
+    def _loads(raw) -> SessionData:
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        return json.loads(raw, object_hook=_decode_page_keys)
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        key = self._key(session_id)
+        raw = self.client.get(key)
+        if raw is None:
+            return None
+        self.client.expire(key, self.ttl)
+        return self._loads(raw)
+
+    def set(self, session_id: str, data: SessionData) -> None:
+        self.client.set(self._key(session_id), self._dumps(data), ex=self.ttl)
+
+    def delete(self, session_id: str) -> None:
+        if self.client.delete(self._key(session_id)):
+            self._notify_evicted(session_id)
+
+    def _notify_evicted(self, session_id: str) -> None:
+        if not self.on_evict:
+            return
+        try:
+            self.on_evict(session_id)
+        except Exception as e:
+            logger.warning("⚠️ セッション破棄通知エラー", session_id=session_id, error=str(e))
+
+    def update(self, session_id: str, mutate: Callable[[SessionData], None]) -> Optional[SessionData]:
+        from redis.exceptions import WatchError
+
+        key = self._key(session_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if raw is None:
+                        pipe.unwatch()
+                        return None
+                    data = self._loads(raw)
+                    mutate(data)
+                    pipe.multi()
+                    pipe.set(key, self._dumps(data), ex=self.ttl)
+                    pipe.execute()
+                    return data
+                except WatchError:
+                    # 他のワーカーが同時に更新したので読み直す
+                    continue
+
+    async def get_async(self, session_id: str) -> Optional[SessionData]:
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def set_async(self, session_id: str, data: SessionData) -> None:
+        await asyncio.to_thread(self.set, session_id, data)
+
+    async def delete_async(self, session_id: str) -> None:
+        await asyncio.to_thread(self.delete, session_id)
+
+    async def update_async(self, session_id: str, mutate: Callable[[SessionData], None]) -> Optional[SessionData]:
+        return await asyncio.to_thread(self.update, session_id, mutate)
+
+    def keys(self) -> Iterator[str]:
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            if isinstance(key, bytes):
+                key = key.decode("utf-8")
+            yield key[len(self.prefix):]
+
+
+def create_session_store(on_evict: Optional[Callable[[str], None]] = None) -> SessionStore:
+    """
+    環境変数からセッションストアを作成
+
+    SESSION_STORE_URL: redis:// で始まるURLを指定するとRedisを使用（未指定ならメモリ）
+    SESSION_TTL_SECONDS: 最終アクセスからの有効期限（デフォルト: 3600秒）
+    SESSION_MAX_ENTRIES: メモリストアの最大セッション数（デフォルト: 1000）
+    """
+    ttl = float(os.environ.get("SESSION_TTL_SECONDS", 3600))
+    url = os.environ.get("SESSION_STORE_URL")
+    if url:
+        import redis
+
+        logger.info("💾 Redisセッションストアを使用", ttl=ttl)
+        return RedisSessionStore(redis.Redis.from_url(url), ttl=ttl, on_evict=on_evict)
+    max_sessions = int(os.environ.get("SESSION_MAX_ENTRIES", 1000))
+    logger.info("💾 メモリセッションストアを使用", max_sessions=max_sessions, ttl=ttl)
+    return InMemorySessionStore(max_sessions=max_sessions, ttl=ttl, on_evict=on_evict)
+
+
+__all__ = ["SessionStore", "InMemorySessionStore", "RedisSessionStore", "create_session_store"]
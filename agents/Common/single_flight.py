@@ -0,0 +1,184 @@
+"""
+シングルフライト - 同じ入力で同時に走っている生成処理を1つにまとめる
+ダブルクリックや同じお話の同時リクエストで、LLM・画像生成・音声合成を二重に実行しないようにする
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import unicodedata
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_registry: List["SingleFlight"] = []
+_registry_lock = threading.Lock()
+
+
+def normalize_key(*parts: Any) -> str:
+    """全角・半角や空白の違いを吸収したキーを作る"""
+    normalized = []
+    for part in parts:
+        text = unicodedata.normalize("NFKC", str(part))
+        normalized.append(" ".join(text.split()).lower())
+    return "\x1f".join(normalized)
+
+
+class _StreamFlight:
+    """1つのストリームの結果を、後から参加した購読者にも最初から配る"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+    async def publish(self, item: Any) -> None:
+        async with self.changed:
+            self.items.append(item)
+            self.changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None) -> None:
+        async with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: index < len(self.items) or self.done)
+                batch = self.items[index:]
+                finished = self.done
+            index += len(batch)
+            for item in batch:
+                yield item
+            if finished and index >= len(self.items):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """
+    キーごとに実行中の処理を1つに制限し、同じキーの呼び出しは実行中の結果を待つ
+
+    - do(): 通常の関数（スレッドから呼ぶ）
+    - do_async(): async関数。呼び出し元がキャンセルされても、待っている他の呼び出しには影響しない
+    - stream(): async ジェネレーター。後から参加した呼び出しにも最初の要素から配る
+
+    処理が終わるとキーは解放される（結果のキャッシュはしない）。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "coalesced": 0, "failures": 0}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _join(self, key: str):
+        """(future, 自分が実行役かどうか) を返す"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            self._counters["leaders"] += 1
+            return future, True
+
+    def _settle(self, key: str, future: concurrent.futures.Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+            if error is not None:
+                self._counters["failures"] += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[..., Any], *args) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            logger.debug("🔗 実行中の処理に合流", flight=self.name, key=key[:16])
+            return future.result()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[..., Any], *args) -> Any:
+        future, leader = self._join(key)
+        if leader:
+            # 実行役の呼び出し元がキャンセルされても処理は続け、合流した呼び出しに結果を届ける
+            task = asyncio.ensure_future(fn(*args))
+            self._tasks.add(task)
+
+            def on_done(t: asyncio.Task):
+                self._tasks.discard(t)
+                if t.cancelled():
+                    self._settle(key, future, error=asyncio.CancelledError())
+                elif t.exception() is not None:
+                    self._settle(key, future, error=t.exception())
+                else:
+                    self._settle(key, future, t.result())
+
+            task.add_done_callback(on_done)
+        else:
+            logger.debug("🔗 実行中の処理に合流", flight=self.name, key=key[:16])
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """factory() が返すジェネレーターを1回だけ実行し、その要素を全ての呼び出し元に配る"""
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is not None:
+                self._counters["coalesced"] += 1
+            else:
+                flight = _StreamFlight()
+                self._streams[key] = flight
+                self._counters["leaders"] += 1
+                task = asyncio.ensure_future(self._pump(key, flight, factory()))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        async for item in flight.subscribe():
+            yield item
+
+    async def _pump(self, key: str, flight: _StreamFlight, source: AsyncIterator[Any]) -> None:
+        error = None
+        try:
+            async for item in source:
+                await flight.publish(item)
+        except BaseException as e:
+            error = e
+            with self._lock:
+                self._counters["failures"] += 1
+        finally:
+            # 終了後に来た呼び出しは新しく実行する
+            with self._lock:
+                self._streams.pop(key, None)
+            await flight.finish(error)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, "in_flight": len(self._calls) + len(self._streams)}
+
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """全てのシングルフライトのカウンター"""
+    with _registry_lock:
+        return {flight.name: flight.stats() for flight in _registry}
+
+
+__all__ = ["SingleFlight", "normalize_key", "single_flight_stats"]
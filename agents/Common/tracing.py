@@ -0,0 +1,227 @@
+"""
+トレース - 1つの物語（開始 → 物語生成 → 画像ジョブ → アップロード → 音声）の処理を1本のトレースにまとめる
+OpenTelemetry（google-adk の依存）を使うので、ADK自身のスパン（invocation, call_llm など）も同じトレースに入る
+
+トレースIDはHTTPリクエストの traceparent または X-Cloud-Trace-Context ヘッダーから引き継ぎ、
+なければ新しく作る。現在のスパンは contextvars で保持されるため、asyncio のタスク・
+asyncio.to_thread・BackgroundTasks には自動で引き継がれる。自前のスレッドプールに渡す場合は bind() を使う。
+
+環境変数:
+    TRACE_EXPORTER: "file"（JSON Lines）、"cloud"（Cloud Trace）、"console"、"none"（デフォルト: none）
+    TRACE_EXPORT_FILE: file のときの出力先（デフォルト: tmp/mimamori-traces.jsonl）
+"""
+
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import NonRecordingSpan, SpanContext, Status, StatusCode, TraceFlags
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+from .logging_config import bind_contextvars, get_logger
+
+logger = get_logger(__name__)
+
+_tracer = trace.get_tracer("mimamori")
+_propagator = TraceContextTextMapPropagator()
+_configured = False
+
+# X-Cloud-Trace-Context: TRACE_ID/SPAN_ID;o=TRACE_TRUE（SPAN_IDは10進数）
+_CLOUD_TRACE_RE = re.compile(r"^([0-9a-fA-F]{32})(?:/(\d+))?(?:;o=(\d))?")
+
+
+class JsonFileSpanExporter(SpanExporter):
+    """
+    終了したスパンを1行1スパンのJSONで追記する（テスト・ローカルでのクリティカルパス確認用）
+
+    フィールド名は OTLP JSON に合わせる（traceId, spanId, parentSpanId, startTimeUnixNano ...）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def to_dict(span: ReadableSpan) -> Dict[str, Any]:
+        return {
+            "traceId": format(span.context.trace_id, "032x"),
+            "spanId": format(span.context.span_id, "016x"),
+            "parentSpanId": format(span.parent.span_id, "016x") if span.parent else "",
+            "name": span.name,
+            "startTimeUnixNano": span.start_time,
+            "endTimeUnixNano": span.end_time,
+            "attributes": dict(span.attributes or {}),
+            "status": {"code": span.status.status_code.name, "message": span.status.description or ""},
+        }
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(self.to_dict(span), ensure_ascii=False) + "\n" for span in spans)
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning("⚠️ トレースの書き込みに失敗", error=str(e))
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _create_exporter(kind: str) -> Optional[SpanExporter]:
+    if kind == "file":
+        return JsonFileSpanExporter(os.environ.get("TRACE_EXPORT_FILE", "tmp/mimamori-traces.jsonl"))
+    if kind == "cloud":
+        from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+
+        return CloudTraceSpanExporter()
+    if kind == "console":
+        return ConsoleSpanExporter()
+    return None
+
+
+def configure_tracing(exporter: Optional[SpanExporter] = None, force: bool = False) -> None:
+    """
+    トレースの出力先を設定する（exporter 省略時は TRACE_EXPORTER から作成）
+
+    出力先がない場合もトレースIDは発行する（ログと X-Trace-Id での突き合わせ用）。
+    プロセスで一度だけ呼ぶ（OpenTelemetry の TracerProvider は置き換えられない）。
+    """
+    global _configured
+    if _configured and not force:
+        return
+    exporter = exporter or _create_exporter(os.environ.get("TRACE_EXPORTER", "none").lower())
+    provider = TracerProvider()
+    if exporter is not None:
+        # エクスポートは別スレッドでまとめて行い、リクエストの処理を待たせない
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        logger.info("🧭 トレース出力を設定", exporter=type(exporter).__name__)
+    trace.set_tracer_provider(provider)
+    _configured = True
+
+
+def extract_context(headers: Dict[str, str]):
+    """traceparent / X-Cloud-Trace-Context ヘッダーから親のトレースを取り出す（なければ None）"""
+    if "traceparent" in headers:
+        return _propagator.extract(headers)
+    match = _CLOUD_TRACE_RE.match(headers.get("x-cloud-trace-context", ""))
+    if not match:
+        return None
+    trace_id, span_id, sampled = match.groups()
+    parent = SpanContext(
+        trace_id=int(trace_id, 16),
+        span_id=int(span_id or 0) or 1,
+        is_remote=True,
+        trace_flags=TraceFlags(TraceFlags.SAMPLED if sampled == "1" else TraceFlags.DEFAULT),
+    )
+    return trace.set_span_in_context(NonRecordingSpan(parent))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[trace.Span]:
+    """現在のスパンの子スパンを作り、ブロックの間は現在のスパンにする（例外はスパンに記録される）"""
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def start_span(name: str, **attributes: Any) -> trace.Span:
+    """
+    現在のスパンの子スパンを作るが、現在のスパンにはしない（end() は呼び出し側で行う）
+
+    async ジェネレーターのように yield をまたぐ処理で使う。
+    """
+    return _tracer.start_span(name, attributes=attributes)
+
+
+def end_span(current: trace.Span, error: Optional[BaseException] = None) -> None:
+    """start_span() のスパンを終了する"""
+    if error is not None:
+        current.record_exception(error)
+        current.set_status(Status(StatusCode.ERROR, str(error)))
+    current.end()
+
+
+def current_trace_id() -> Optional[str]:
+    context = trace.get_current_span().get_span_context()
+    return format(context.trace_id, "032x") if context.is_valid else None
+
+
+def bind(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    現在のトレース（とログの文脈）で fn を実行する関数を返す
+
+    自前のスレッドやスレッドプールに処理を渡すときに使う。
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # 同じ関数が複数のスレッドで同時に呼ばれてもよいよう、呼び出しごとにコピーする
+        return context.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+class TracingMiddleware:
+    """
+    HTTPリクエストごとにルートスパンを作るASGIミドルウェア
+
+    SSE・音声ストリーミングはレスポンスを送り終えるまでを1つのスパンにする。
+    トレースIDはログにも付け、レスポンスの X-Trace-Id ヘッダーで返す。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        with _tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=extract_context(headers),
+            kind=trace.SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        ) as current:
+            trace_id = current_trace_id()
+            if trace_id:
+                bind_contextvars(trace_id=trace_id)
+
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    current.set_attribute("http.status_code", message["status"])
+                    if trace_id:
+                        message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+
+__all__ = [
+    "JsonFileSpanExporter",
+    "TracingMiddleware",
+    "bind",
+    "configure_tracing",
+    "current_trace_id",
+    "end_span",
+    "extract_context",
+    "span",
+    "start_span",
+]
@@ -0,0 +1,130 @@
+"""
+音声キャッシュ - (テキスト, 言語) のハッシュで合成済みの読み上げ音声を引くコンテンツアドレス型キャッシュ
+同じページの再生でgTTSの合成とアップロードを繰り返さないようにする
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from agents.Common.logging_config import get_logger
+
+from .storage_backend import get_storage_backend
+from .url_index import UrlIndexLog
+
+logger = get_logger(__name__)
+
+# 音声を保存するディレクトリ（ストレージバックエンド内）
+AUDIO_PREFIX = "story-audio"
+
+# 合成エンジン（変わったらキーも変わるようにする）
+TTS_ENGINE = "gtts"
+
+
+def audio_cache_key(text: str, language: str, slow: bool = False) -> str:
+    """読み上げの入力からキャッシュキー（SHA-256）を作る"""
+    payload = json.dumps({"engine": TTS_ENGINE, "text": text, "language": language, "slow": slow}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def audio_object_path(key: str) -> str:
+    return f"{AUDIO_PREFIX}/{key}.mp3"
+
+
+class AudioCache:
+    """
+    キー → 公開URL のLRUキャッシュ（追記専用のインデックスファイルに永続化）
+
+    インデックスになければストレージバックエンドに同名のオブジェクトがあるか確認する。
+    """
+
+    def __init__(self, index_path: Optional[str] = None, max_entries: int = 4096, check_backend: bool = True):
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self.check_backend = check_backend
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "backend_hits": 0, "misses": 0, "stores": 0}
+        self._index: Optional[UrlIndexLog] = None
+        if index_path:
+            self._index = UrlIndexLog(index_path, max_entries)
+            self._entries = self._index.load()
+
+    def lookup(self, key: str) -> Optional[str]:
+        """合成済みなら公開URLを返す（なければNone）"""
+        with self._lock:
+            url = self._entries.get(key)
+            if url is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return url
+
+        if self.check_backend:
+            backend = get_storage_backend()
+            path = audio_object_path(key)
+            try:
+                if backend.exists(path):
+                    url = backend.public_url(path)
+                    self._remember(key, url, "backend_hits")
+                    return url
+            except Exception as e:
+                logger.warning("⚠️ 音声キャッシュのバックエンド確認に失敗", error=str(e))
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def remember(self, key: str, url: str) -> None:
+        """アップロードした音声をキャッシュに登録する"""
+        self._remember(key, url, "stores")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["backend_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def _remember(self, key: str, url: str, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+            self._entries[key] = url
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self._index is not None:
+            # インデックス全体は書き直さず1行追記する（ときどき圧縮する時だけ全件を書き出す）
+            self._index.append(key, url, self._snapshot)
+
+    def _snapshot(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._entries)
+
+
+def _create_audio_cache() -> AudioCache:
+    """
+    環境変数から音声キャッシュを作成
+
+    AUDIO_CACHE_INDEX: インデックスファイルのパス（"off" で永続化しない、デフォルト: 一時ディレクトリ）
+    AUDIO_CACHE_MAX_ENTRIES: 保持する件数（デフォルト: 4096）
+    AUDIO_CACHE_CHECK_BACKEND: "0" でバックエンドへの存在確認を省く
+    """
+    index_path = os.environ.get(
+        "AUDIO_CACHE_INDEX", os.path.join(tempfile.gettempdir(), "mimamori-audio-cache", "index.log")
+    )
+    return AudioCache(
+        index_path=None if index_path == "off" else index_path,
+        max_entries=int(os.environ.get("AUDIO_CACHE_MAX_ENTRIES", 4096)),
+        check_backend=os.environ.get("AUDIO_CACHE_CHECK_BACKEND", "1") != "0",
+    )
+
+
+audio_cache = _create_audio_cache()
+
+__all__ = ["AudioCache", "audio_cache", "audio_cache_key", "audio_object_path"]
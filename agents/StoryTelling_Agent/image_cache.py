@@ -0,0 +1,199 @@
+"""
+画像キャッシュ - (モデル, プロンプト, 参照画像) のハッシュで生成済み画像を引くコンテンツアドレス型キャッシュ
+同じ入力でのGemini呼び出しを省き、オブジェクト名もハッシュにして同時生成での上書きを防ぐ
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from agents.Common.logging_config import get_logger
+
+from .storage_backend import get_storage_backend
+from .url_index import UrlIndexLog
+
+logger = get_logger(__name__)
+
+# 画像を保存するディレクトリ（ストレージバックエンド内）
+IMAGE_PREFIX = "story-images"
+
+# ハッシュ名のオブジェクトは内容が変わらないので長期キャッシュできる
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def image_cache_key(model: str, prompt: str, reference_hash: Optional[str] = None) -> str:
+    """画像生成の入力からキャッシュキー（SHA-256）を作る"""
+    payload = json.dumps({"model": model, "prompt": prompt, "reference": reference_hash}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def image_object_path(key: str) -> str:
+    return f"{IMAGE_PREFIX}/{key}.png"
+
+
+class ContentAddressedImageCache:
+    """
+    メモリ → ディスク → ストレージバックエンド の順に生成済み画像を探すキャッシュ
+
+    - メモリ: キー → 公開URL のLRU
+    - ディスク: キー → 公開URL の追記専用インデックス（再起動後も有効。画像そのものはバックエンドにある）
+    - バックエンド: story-images/{キー}.png が存在すればそのURLを使う（check_backend=True の場合のみ。
+      未生成の入力では毎回の問い合わせが無駄になるため、デフォルトでは行わない）
+    """
+
+    def __init__(
+        self,
+        memory_entries: int = 1024,
+        disk_dir: Optional[str] = None,
+        disk_max_entries: int = 65536,
+        check_backend: bool = False,
+    ):
+        self.memory_entries = memory_entries
+        self.disk_dir = disk_dir
+        self.check_backend = check_backend
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._disk: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "backend_hits": 0, "misses": 0, "stores": 0}
+        self._index: Optional[UrlIndexLog] = None
+        if disk_dir:
+            self._index = UrlIndexLog(os.path.join(disk_dir, "index.log"), disk_max_entries)
+            self._disk = self._index.load()
+
+    def lookup(self, key: str) -> Optional[str]:
+        """生成済みなら公開URLを返す（なければNone）"""
+        url = self._memory_lookup(key) or self._disk_lookup(key)
+        if url is not None:
+            return url
+
+        if self.check_backend:
+            backend = get_storage_backend()
+            path = image_object_path(key)
+            try:
+                if backend.exists(path):
+                    url = backend.public_url(path)
+                    self._remember_url(key, url, "backend_hits")
+                    return url
+            except Exception as e:
+                logger.warning("⚠️ 画像キャッシュのバックエンド確認に失敗", error=str(e))
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    async def lookup_async(self, key: str) -> Optional[str]:
+        """lookup() のasync版（バックエンドへの存在確認はスレッドを使わずに行う）"""
+        url = self._memory_lookup(key) or self._disk_lookup(key)
+        if url is not None:
+            return url
+
+        if self.check_backend:
+            backend = get_storage_backend()
+            path = image_object_path(key)
+            try:
+                if await backend.exists_async(path):
+                    url = backend.public_url(path)
+                    self._remember_url(key, url, "backend_hits")
+                    return url
+            except Exception as e:
+                logger.warning("⚠️ 画像キャッシュのバックエンド確認に失敗", error=str(e))
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def remember(self, key: str, url: str) -> None:
+        """アップロードした画像のURLをキャッシュに登録する（インデックスへの追記は1行だけ）"""
+        self._remember_url(key, url, "stores")
+        self._disk_put(key, url)
+
+    async def remember_async(self, key: str, url: str) -> None:
+        """remember() のasync版（インデックスへの追記・ときどきの圧縮はスレッドで行う）"""
+        self._remember_url(key, url, "stores")
+        if self._index is not None:
+            await asyncio.to_thread(self._disk_put, key, url)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = sum(self._counters[name] for name in ("memory_hits", "disk_hits", "backend_hits", "misses"))
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk),
+            }
+
+    def _memory_lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            url = self._memory.get(key)
+            if url is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+            return url
+
+    def _remember_url(self, key: str, url: str, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+            self._memory[key] = url
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            url = self._disk.get(key)
+            if url is None:
+                return None
+            self._disk.move_to_end(key)
+        self._remember_url(key, url, "disk_hits")
+        return url
+
+    def _disk_put(self, key: str, url: str) -> None:
+        if self._index is None:
+            return
+        with self._lock:
+            self._disk[key] = url
+            self._disk.move_to_end(key)
+            while len(self._disk) > self._index.max_entries:
+                self._disk.popitem(last=False)
+        self._index.append(key, url, self._disk_snapshot)
+
+    def _disk_snapshot(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._disk)
+
+
+def _create_image_cache() -> ContentAddressedImageCache:
+    """
+    環境変数から画像キャッシュを作成
+
+    IMAGE_CACHE_DIR: ディスク層（インデックス）の保存先（"off" で無効、デフォルト: 一時ディレクトリ）
+    IMAGE_CACHE_DISK_ENTRIES: ディスク層に残す件数（デフォルト: 65536）
+    IMAGE_CACHE_CHECK_BACKEND: "1" でキャッシュにない入力もバックエンドに存在確認する（デフォルト: 確認しない）
+    """
+    disk_dir = os.environ.get("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "mimamori-image-cache"))
+    return ContentAddressedImageCache(
+        disk_dir=None if disk_dir == "off" else disk_dir,
+        disk_max_entries=int(os.environ.get("IMAGE_CACHE_DISK_ENTRIES", 65536)),
+        check_backend=os.environ.get("IMAGE_CACHE_CHECK_BACKEND", "0") == "1",
+    )
+
+
+image_cache = _create_image_cache()
+
+__all__ = [
+    "ContentAddressedImageCache",
+    "image_cache",
+    "image_cache_key",
+    "content_hash",
+    "image_object_path",
+    "IMMUTABLE_CACHE_CONTROL",
+]
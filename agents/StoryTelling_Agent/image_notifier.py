@@ -0,0 +1,163 @@
+"""
+画像完成通知 - 画像生成ジョブの完了をセッション単位でプッシュ配信
+スリープによるポーリングの代わりに、アップロード完了の瞬間に待機側を起こす
+
+通知は同じプロセス内にしか届かない。セッションストアを複数ワーカーで共有する場合は、
+wait() に check と poll_interval を渡し、他のワーカーで完成した画像をストアから拾う。
+"""
+
+import asyncio
+import inspect
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from agents.Common.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class ImageNotifier:
+    """
+    (session_id, page) ごとの asyncio.Event と、SSE購読者ごとのキューを管理する
+
+    publish() はイベントループ外のスレッド（BackgroundTasksのスレッドプール等）からも呼び出せる。
+    Event は待機中の wait() がある間だけ保持し、最後の待機が終わったら破棄する。
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # (session_id, page) → [Event, 待機中の数]
+        self._events: Dict[Tuple[str, int], List] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._lock = threading.Lock()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """通知を配送するイベントループを登録する"""
+        self._loop = loop
+
+    def publish(self, session_id: str, page_num: int, image_url: Optional[str]) -> None:
+        """
+        ページ画像の完成（失敗時はNone）を通知する
+
+        Args:
+            session_id: セッションID
+            page_num: ページ番号
+            image_url: 画像URL（生成失敗時はNone）
+        """
+        loop = self._loop
+        if loop is None:
+            logger.warning("⚠️ 通知先のイベントループが未登録です", session_id=session_id, page=page_num)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(session_id, page_num, image_url)
+        else:
+            loop.call_soon_threadsafe(self._deliver, session_id, page_num, image_url)
+
+    async def wait(
+        self,
+        session_id: str,
+        page_num: int,
+        timeout: float,
+        check: Optional[Callable[[], Union[bool, Awaitable[bool]]]] = None,
+        poll_interval: Optional[float] = None,
+    ) -> bool:
+        """
+        ページ画像の通知を待つ
+
+        Args:
+            session_id: セッションID
+            page_num: ページ番号
+            timeout: 最大待機秒数
+            check: 画像が完成済み（失敗を含む）ならTrueを返す関数（async関数でもよい）。待機の登録直後に呼び、
+                通知より先に完成していた場合の取りこぼしを防ぐ
+            poll_interval: 指定すると、この間隔で check を呼び直す（他のワーカーでの完成を拾う）
+
+        Returns:
+            タイムアウト前に通知が届いた（または check がTrueを返した）場合True
+        """
+        loop = self._ensure_loop()
+        key = (session_id, page_num)
+        event = self._acquire(key)
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                if check is not None:
+                    settled = check()
+                    if inspect.isawaitable(settled):
+                        settled = await settled
+                    if settled:
+                        return True
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, poll_interval or remaining))
+                    return True
+                except asyncio.TimeoutError:
+                    continue
+        finally:
+            self._release(key, event)
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        """セッションの画像完成通知を受け取るキューを登録する（使い終わったら unsubscribe）"""
+        self._ensure_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(session_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(session_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(session_id, None)
+
+    def discard(self, session_id: str) -> None:
+        """セッション終了時に待機中の wait() を起こし、待機用イベントを破棄する"""
+        with self._lock:
+            for key in [key for key in self._events if key[0] == session_id]:
+                self._events.pop(key)[0].set()
+
+    def pending_waits(self) -> int:
+        """待機中の (session_id, page) の数"""
+        with self._lock:
+            return len(self._events)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        return self._loop
+
+    def _acquire(self, key: Tuple[str, int]) -> asyncio.Event:
+        with self._lock:
+            entry = self._events.get(key)
+            if entry is None:
+                entry = self._events[key] = [asyncio.Event(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _release(self, key: Tuple[str, int], event: asyncio.Event) -> None:
+        with self._lock:
+            entry = self._events.get(key)
+            if entry is None or entry[0] is not event:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._events[key]
+
+    def _deliver(self, session_id: str, page_num: int, image_url: Optional[str]) -> None:
+        # 待機中の wait() だけを起こす（通知後に始まった wait() は check で完成済みを確認する）
+        with self._lock:
+            entry = self._events.get((session_id, page_num))
+        if entry is not None:
+            entry[0].set()
+        message = {"page": page_num, "image_url": image_url}
+        for queue in list(self._subscribers.get(session_id, ())):
+            queue.put_nowait(message)
+
+
+__all__ = ["ImageNotifier"]
@@ -0,0 +1,232 @@
+"""
+画像生成スケジューラー - プロセス全体で共有する上限付きのワーカープール
+呼び出しごとにスレッドを作らず、同時実行数・待ち行列・期限を一か所で管理する
+async関数のジョブ（run_coroutine）はスレッドを使わず、イベントループ上でセマフォで同時実行数を制限する
+スレッドプールとasync関数のジョブは件数・上限・カウンターを別々に持つ（片方が混んでも、もう片方は拒否しない）
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class SchedulerFullError(Exception):
+    """待ち行列が満杯で新しいジョブを受け付けられない"""
+
+
+class ImageGenerationScheduler:
+    """
+    画像生成ジョブ用の共有スケジューラー
+
+    - 同時実行数は max_workers まで、待ち行列は max_queue まで（超えた分は即座に拒否）
+    - 期限を過ぎたジョブは実行せずに破棄し、呼び出し側は期限で必ず戻る
+      （実行中のスレッドの終了を待たない）
+    - async関数のジョブは同時実行 max_concurrent、待機 max_async_queue まで。
+      待機中のジョブはスレッドを占有しないので、待ち行列を大きくできる
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32, default_timeout: float = 60,
+                 max_concurrent: int = 16, max_async_queue: int = 1000):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+        self.max_concurrent = max_concurrent
+        self.max_async_queue = max_async_queue
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="image-gen"
+        )
+        self._lock = threading.Lock()
+        # スレッドプールのジョブ
+        self._queued = 0
+        self._in_flight = 0
+        self._counters = dict.fromkeys(("submitted", "completed", "failed", "timeouts", "rejected", "expired"), 0)
+        # async関数のジョブ
+        self._async_queued = 0
+        self._async_in_flight = 0
+        self._async_counters = dict.fromkeys(self._counters, 0)
+
+    def submit(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None) -> concurrent.futures.Future:
+        """
+        ジョブを投入する
+
+        Raises:
+            SchedulerFullError: 待ち行列が満杯の場合
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else self.default_timeout)
+        started = threading.Event()
+
+        def run():
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+            started.set()
+            try:
+                if time.monotonic() >= deadline:
+                    # 待ち行列にいる間に期限切れ。呼び出し側はすでに戻っている
+                    self._count("expired")
+                    raise TimeoutError("待ち行列で期限切れになりました")
+                result = fn(*args)
+                self._count("completed")
+                return result
+            except TimeoutError:
+                raise
+            except Exception:
+                self._count("failed")
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+        with self._lock:
+            if self._queued + self._in_flight >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise SchedulerFullError(
+                    f"画像生成の待ち行列が満杯です（実行中{self._in_flight}件、待機中{self._queued}件）"
+                )
+            self._queued += 1
+            self._counters["submitted"] += 1
+
+        # ログの文脈（session_id, page など）をワーカースレッドに引き継ぐ
+        future = self._executor.submit(contextvars.copy_context().run, run)
+
+        def on_done(f: concurrent.futures.Future):
+            # 開始前にキャンセルされたジョブは run() を通らないので、ここで待ち行列から外す
+            if f.cancelled() and not started.is_set():
+                with self._lock:
+                    self._queued -= 1
+
+        future.add_done_callback(on_done)
+        return future
+
+    def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        """
+        ジョブを投入して結果を待つ（期限を過ぎたら TimeoutError）
+
+        期限切れ時は待機中ならキャンセルし、実行中ならスレッドの終了を待たずに戻る。
+        """
+        timeout = timeout if timeout is not None else self.default_timeout
+        future = self.submit(fn, *args, timeout=timeout)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self._count("timeouts")
+            raise
+
+    async def run_async(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        """run() のasync版。イベントループのスレッドをブロックしない"""
+        timeout = timeout if timeout is not None else self.default_timeout
+        future = self.submit(fn, *args, timeout=timeout)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self._count("timeouts")
+            raise
+
+    async def run_coroutine(self, fn: Callable[..., Awaitable[Any]], *args, timeout: Optional[float] = None) -> Any:
+        """
+        async関数のジョブを実行して結果を返す（期限を過ぎたらキャンセルして TimeoutError）
+
+        Raises:
+            SchedulerFullError: 待ち行列が満杯の場合
+        """
+        timeout = timeout if timeout is not None else self.default_timeout
+        with self._lock:
+            if self._async_queued + self._async_in_flight >= self.max_concurrent + self.max_async_queue:
+                self._async_counters["rejected"] += 1
+                raise SchedulerFullError(
+                    f"画像生成の待ち行列が満杯です（実行中{self._async_in_flight}件、待機中{self._async_queued}件）"
+                )
+            self._async_queued += 1
+            self._async_counters["submitted"] += 1
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        started = False
+
+        async def run():
+            nonlocal started
+            async with self._semaphore:
+                with self._lock:
+                    self._async_queued -= 1
+                    self._async_in_flight += 1
+                started = True
+                try:
+                    result = await fn(*args)
+                    self._count("completed", self._async_counters)
+                    return result
+                except Exception:
+                    self._count("failed", self._async_counters)
+                    raise
+                finally:
+                    with self._lock:
+                        self._async_in_flight -= 1
+
+        try:
+            return await asyncio.wait_for(run(), timeout=timeout)
+        except asyncio.TimeoutError:
+            # スレッドと違い、実行中のジョブもここでキャンセルされる
+            self._count("timeouts", self._async_counters)
+            if not started:
+                self._count("expired", self._async_counters)
+            raise
+        finally:
+            if not started:
+                with self._lock:
+                    self._async_queued -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """待ち行列の長さ・実行中の件数・累計カウンター（async関数のジョブは async_ で始まるキー）"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "max_concurrent": self.max_concurrent,
+                "max_async_queue": self.max_async_queue,
+                "queue_depth": self._queued,
+                "in_flight": self._in_flight,
+                **self._counters,
+                "async_queue_depth": self._async_queued,
+                "async_in_flight": self._async_in_flight,
+                **{f"async_{name}": value for name, value in self._async_counters.items()},
+            }
+
+    def _count(self, name: str, counters: Optional[Dict[str, int]] = None) -> None:
+        with self._lock:
+            (self._counters if counters is None else counters)[name] += 1
+
+
+_scheduler: Optional[ImageGenerationScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_image_scheduler() -> ImageGenerationScheduler:
+    """
+    プロセス共通のスケジューラーを取得（初回呼び出し時に環境変数から作成）
+
+    IMAGE_MAX_WORKERS: 同時に実行する画像生成の数（デフォルト: 4）
+    IMAGE_MAX_QUEUE: 実行待ちにできるジョブの数（デフォルト: 32）
+    IMAGE_TIMEOUT_SECONDS: 1ジョブの期限（デフォルト: 60秒）
+    IMAGE_MAX_CONCURRENT: async関数のジョブを同時に実行する数（デフォルト: 16）
+    IMAGE_MAX_ASYNC_QUEUE: async関数のジョブを待機させられる数（デフォルト: 1000）
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ImageGenerationScheduler(
+                    max_workers=int(os.environ.get("IMAGE_MAX_WORKERS", 4)),
+                    max_queue=int(os.environ.get("IMAGE_MAX_QUEUE", 32)),
+                    default_timeout=float(os.environ.get("IMAGE_TIMEOUT_SECONDS", 60)),
+                    max_concurrent=int(os.environ.get("IMAGE_MAX_CONCURRENT", 16)),
+                    max_async_queue=int(os.environ.get("IMAGE_MAX_ASYNC_QUEUE", 1000)),
+                )
+    return _scheduler
+
+
+__all__ = ["ImageGenerationScheduler", "SchedulerFullError", "get_image_scheduler"]
@@ -0,0 +1,102 @@
+"""
+参照画像キャッシュ - このプロセスでアップロードした画像を公開URLで引けるように保持
+P2/P3 の参照画像付き生成で、直前にアップロードした画像の再ダウンロードとデコードを省く
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+
+class ReferenceImageCache:
+    """
+    公開URL → (元のバイト列, デコード済みのPIL画像) のLRUキャッシュ
+
+    デコードは最初に画像が必要になった時に一度だけ行う。
+    返すPIL画像は共有オブジェクトなので、呼び出し側で変更しないこと。
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 64):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, url: str, data: bytes) -> None:
+        """アップロード直後の画像を登録する"""
+        if not url or not data:
+            return
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if old is not None:
+                self._size -= old["size"]
+            self._entries[url] = {"data": data, "image": None, "size": len(data)}
+            self._size += len(data)
+            self._evict()
+
+    def get_bytes(self, url: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._lookup(url)
+            return entry["data"] if entry else None
+
+    def get_image(self, url: str) -> Optional[Image.Image]:
+        """デコード済みの画像を返す（未登録ならNone）"""
+        with self._lock:
+            entry = self._lookup(url)
+            if entry is None:
+                return None
+            if entry["image"] is not None:
+                return entry["image"]
+            data = entry["data"]
+        # デコードはロックの外で行う
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry["image"] is None:
+                entry["image"] = image
+                # デコード後のピクセルデータもメモリ上限に含める
+                decoded_size = image.width * image.height * len(image.getbands())
+                entry["size"] += decoded_size
+                self._size += decoded_size
+                self._evict()
+        return image
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(url)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(url)
+        return entry
+
+    def _evict(self) -> None:
+        while self._entries and (self._size > self.max_bytes or len(self._entries) > self.max_entries):
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry["size"]
+
+
+# プロセス共通のキャッシュ（REFERENCE_CACHE_MAX_MB で上限を変更可能）
+reference_image_cache = ReferenceImageCache(
+    max_bytes=int(float(os.environ.get("REFERENCE_CACHE_MAX_MB", 64)) * 1024 * 1024)
+)
+
+__all__ = ["ReferenceImageCache", "reference_image_cache"]
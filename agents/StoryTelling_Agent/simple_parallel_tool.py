@@ -1,19 +1,45 @@
 """
 シンプル並行処理ツール - 安定した1つのツールで画像生成
 ADKの複数ツール問題を回避した実装
+
+同期版（ADKツール用）は共有スケジューラーのワーカースレッドで実行する。
+async版（開始時のパイプライン・次ページの画像生成用）は Gemini の async API・httpx・
+async のアップロードでイベントループ上だけで処理し、待機中のジョブがスレッドを占有しない。
 """
 
+import asyncio
 import os
+import threading
 import time
-import concurrent.futures
-from typing import Dict, Any
+import traceback
+from typing import Dict, Any, Optional
 from google.adk.tools import FunctionTool
 import google.generativeai as genai
-from google.cloud import storage
 import requests
 from PIL import Image
 import io
 import base64
+from .image_cache import IMMUTABLE_CACHE_CONTROL, content_hash, image_cache, image_cache_key, image_object_path
+from .image_scheduler import SchedulerFullError, get_image_scheduler
+from agents.Common.logging_config import get_logger
+from agents.Common.metrics import observe_stage, track_stage
+from agents.Common.record_replay import wrap_model
+from agents.Common.tracing import span
+from agents.Common.single_flight import SingleFlight
+from .reference_cache import reference_image_cache
+from .storage_backend import get_async_http_client, read_url, read_url_async, upload_bytes, upload_bytes_async
+
+logger = get_logger(__name__)
+
+# 画像生成モデル（キャッシュキーにも含める）
+IMAGE_MODEL = 'gemini-2.5-flash-image-preview'
+
+# 同じプロンプト・参照画像で同時に来た生成リクエストを1回の生成にまとめる
+_image_flights = SingleFlight("image_generation")
+
+# genai.configure() は作成済みのクライアント（gRPCチャネル）を捨てるので、APIキーが変わった時だけ呼ぶ
+_configured_api_key: Optional[str] = None
+_configure_lock = threading.Lock()
 
 # グローバル変数で画像結果を保存
 _last_image_result = None
@@ -35,6 +61,183 @@ def clear_last_image_result():
     global _last_image_result
     _last_image_result = None
 
+def _failure(message: str) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "message": message,
+        "images": []
+    }
+
+def _configure_genai() -> Optional[Dict[str, Any]]:
+    """Google AI API設定（APIキーがなければエラー結果を返す。設定済みのキーなら何もしない）"""
+    global _configured_api_key
+    api_key = os.environ.get('GOOGLE_API_KEY')
+    if not api_key:
+        return _failure("GOOGLE_API_KEY環境変数が設定されていません")
+    if api_key != _configured_api_key:
+        with _configure_lock:
+            if api_key != _configured_api_key:
+                genai.configure(api_key=api_key)
+                _configured_api_key = api_key
+    return None
+
+def _image_model():
+    # RECORD_REPLAY_MODE が設定されていれば、応答を記録・再生するモデルに包む
+    return wrap_model(genai.GenerativeModel(IMAGE_MODEL), IMAGE_MODEL)
+
+def _image_result(cloud_url: str, image_prompt: str, message: str, description: str) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "message": message,
+        "images": [{
+            "id": 1,
+            "prompt": image_prompt[:100] + "...",
+            "file_path": None, # ローカルパスは保存しないのでNone
+            "cloud_url": cloud_url,
+            "description": description,
+            "mime_type": "image/png"
+        }]
+    }
+
+def _single_image_prompt(story_content: str) -> str:
+    """ストーリー内容から画像生成プロンプトを作成"""
+    return f"""Create a colorful children's book illustration based on this story:
+
+{story_content}
+
+Style requirements:
+- Cute children's picture book art style
+- Bright, warm, and cheerful colors
+- Friendly and safe atmosphere
+- Perfect for ages 3-8
+- Happy ending scene
+- No scary or violent content
+- Do not include any text or letters in the image
+
+Create a heartwarming final scene that shows the happy conclusion of this story."""
+
+def _reference_image_prompt(story_content: str) -> str:
+    """参照画像付き生成のプロンプトを作成"""
+    return f"""Create a colorful children's book illustration for the continuation of this story, maintaining the same art style and characters as the reference image:
+
+Story continuation:
+{story_content}
+
+Style requirements:
+- Maintain the exact same art style, colors, and character designs as the reference image
+- Keep the same visual consistency and atmosphere
+- Create a natural continuation of the story scene
+- Bright, warm, and cheerful children's book style
+- Do not include any text or letters in the image
+"""
+
+def _remember_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # グローバル変数に結果を保存
+    global _last_image_result
+    _last_image_result = result
+    return result
+
+def _error_result(label: str, e: Exception) -> Dict[str, Any]:
+    error_details = traceback.format_exc()
+    logger.error(f"❌ {label}", error=str(e), error_details=error_details)
+    return {
+        "success": False,
+        "message": f"{label}: {str(e)}",
+        "error_details": error_details,
+        "images": []
+    }
+
+def _image_data_from_response(response) -> bytes:
+    """Gemini の応答から画像データを取り出す（取り出せなければ ValueError）"""
+    # 応答オブジェクトのreprは画像データを含むので出力しない
+    if not response:
+        raise ValueError("画像生成レスポンスが空です")
+    
+    logger.debug("📊 Gemini API応答", candidates=len(response.candidates) if response.candidates else 0)
+    
+    if not response.candidates:
+        # 安全性フィルターなどによってブロックされた場合のメッセージを追加
+        logger.warning("⚠️ 応答に候補が含まれていません（安全性フィルターによるブロックの可能性）",
+                       prompt_feedback=str(response.prompt_feedback))
+        raise ValueError("画像生成レスポンスにcandidatesがありません")
+    
+    candidate = response.candidates[0]
+    
+    if not candidate.content:
+        raise ValueError("candidateにcontentがありません")
+    
+    if not candidate.content.parts:
+        raise ValueError("candidateにpartsがありません")
+    
+    # 画像データを抽出
+    image_data = None
+    for part in candidate.content.parts:
+        if hasattr(part, 'inline_data') and part.inline_data:
+            image_data = part.inline_data.data
+            break
+    logger.debug("🔍 parts検索完了", parts=len(candidate.content.parts), found_image=bool(image_data))
+    
+    if not image_data:
+        raise ValueError("画像データが生成されませんでした")
+    
+    logger.debug("🖼️ 画像データ抽出完了", image_bytes=len(image_data))
+    return image_data
+
+def _job_outcome(result: Dict[str, Any]) -> str:
+    return "success" if result.get("success") else "failed"
+
+def _run_scheduled(fn, *args) -> Dict[str, Any]:
+    """共有スケジューラーで画像生成を実行し、期限で必ず戻る"""
+    # 待ち行列・生成・アップロードをまとめて1つのスパンにする（ワーカースレッドにも引き継がれる）
+    with span("image_job") as job_span:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = get_image_scheduler().run(fn, *args)
+            outcome = _job_outcome(result)
+            logger.debug("✅ 並行画像生成完了")
+            return _remember_result(result)
+        except SchedulerFullError as e:
+            outcome = "rejected"
+            logger.warning("🚦 画像生成の受付を拒否", reason=str(e))
+            return _failure(str(e))
+        except TimeoutError:
+            outcome = "timeout"
+            logger.warning("⏰ 画像生成タイムアウト", timeout=get_image_scheduler().default_timeout)
+            return _failure("画像生成がタイムアウトしました")
+        except Exception as e:
+            logger.error("❌ 並行処理エラー", error=str(e))
+            return _failure(f"並行処理エラー: {str(e)}")
+        finally:
+            job_span.set_attribute("outcome", outcome)
+            observe_stage("image_job", time.perf_counter() - start, outcome)
+
+async def _run_scheduled_async(fn, *args) -> Dict[str, Any]:
+    """_run_scheduled のasync版（fn はasync関数。スレッドを使わずに実行する）"""
+    # 待ち行列・生成・アップロードをまとめて1つのスパンにする
+    with span("image_job") as job_span:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await get_image_scheduler().run_coroutine(fn, *args)
+            outcome = _job_outcome(result)
+            logger.debug("✅ 並行画像生成完了")
+            return _remember_result(result)
+        except SchedulerFullError as e:
+            outcome = "rejected"
+            logger.warning("🚦 画像生成の受付を拒否", reason=str(e))
+            return _failure(str(e))
+        except (TimeoutError, asyncio.TimeoutError):
+            outcome = "timeout"
+            logger.warning("⏰ 画像生成タイムアウト", timeout=get_image_scheduler().default_timeout)
+            return _failure("画像生成がタイムアウトしました")
+        except Exception as e:
+            logger.error("❌ 並行処理エラー", error=str(e))
+            return _failure(f"並行処理エラー: {str(e)}")
+        finally:
+            job_span.set_attribute("outcome", outcome)
+            observe_stage("image_job", time.perf_counter() - start, outcome)
+
 def generate_story_image_parallel(story_content: str, image_type: str) -> Dict[str, Any]:
     """
     ストーリー内容に基づいて画像を並行生成
@@ -46,58 +249,21 @@ def generate_story_image_parallel(story_content: str, image_type: str) -> Dict[s
     Returns:
         画像生成結果
     """
-    try:
-        print(f"🎨 画像生成開始: {story_content[:50]}...")
-        
-        # Google AI API設定
-        api_key = os.environ.get('GOOGLE_API_KEY')
-        if not api_key:
-            return {
-                "success": False,
-                "message": "GOOGLE_API_KEY環境変数が設定されていません",
-                "images": []
-            }
-        
-        genai.configure(api_key=api_key)
-        
-        # ThreadPoolExecutorを使った並行処理
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            # 画像生成タスクを並行実行
-            future = executor.submit(_generate_single_image, story_content, image_type)
-            
-            try:
-                # 最大60秒でタイムアウト
-                result = future.result(timeout=60)
-                print(f"✅ 並行画像生成完了!")
-                
-                # グローバル変数に結果を保存
-                global _last_image_result
-                _last_image_result = result
-                
-                return result
-                
-            except concurrent.futures.TimeoutError:
-                print(f"⏰ 画像生成タイムアウト（60秒）")
-                return {
-                    "success": False,
-                    "message": "画像生成がタイムアウトしました",
-                    "images": []
-                }
-            except Exception as e:
-                print(f"❌ 並行処理エラー: {e}")
-                return {
-                    "success": False,
-                    "message": f"並行処理エラー: {str(e)}",
-                    "images": []
-                }
-                
-    except Exception as e:
-        print(f"❌ ツール実行エラー: {e}")
-        return {
-            "success": False,
-            "message": f"ツール実行エラー: {str(e)}",
-            "images": []
-        }
+    logger.info("🎨 画像生成開始", image_type=image_type, story_chars=len(story_content))
+    error = _configure_genai()
+    if error:
+        return error
+    flight_key = image_cache_key(IMAGE_MODEL, _single_image_prompt(story_content))
+    return _image_flights.do(flight_key, _run_scheduled, _generate_single_image, story_content, image_type)
+
+async def generate_story_image_parallel_async(story_content: str, image_type: str) -> Dict[str, Any]:
+    """generate_story_image_parallel のasync版"""
+    logger.info("🎨 画像生成開始", image_type=image_type, story_chars=len(story_content))
+    error = _configure_genai()
+    if error:
+        return error
+    flight_key = image_cache_key(IMAGE_MODEL, _single_image_prompt(story_content))
+    return await _image_flights.do_async(flight_key, _run_scheduled_async, _generate_single_image_async, story_content, image_type)
 
 def generate_story_image_with_reference(story_content: str, reference_image_url: str, image_type: str) -> Dict[str, Any]:
     """
@@ -111,59 +277,25 @@ def generate_story_image_with_reference(story_content: str, reference_image_url:
     Returns:
         画像生成結果
     """
-    try:
-        print(f"🎨 参照画像付き画像生成開始: {story_content[:50]}...")
-        print(f"🖼️ 参照画像URL: {reference_image_url}")
-        
-        # Google AI API設定
-        api_key = os.environ.get('GOOGLE_API_KEY')
-        if not api_key:
-            return {
-                "success": False,
-                "message": "GOOGLE_API_KEY環境変数が設定されていません",
-                "images": []
-            }
-        
-        genai.configure(api_key=api_key)
-        
-        # ThreadPoolExecutorを使った並行処理
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            # 画像生成タスクを並行実行
-            future = executor.submit(_generate_image_with_reference, story_content, reference_image_url, image_type)
-            
-            try:
-                # 最大60秒でタイムアウト
-                result = future.result(timeout=60)
-                print(f"✅ 参照画像付き並行画像生成完了!")
-                
-                # グローバル変数に結果を保存
-                global _last_image_result
-                _last_image_result = result
-                
-                return result
-                
-            except concurrent.futures.TimeoutError:
-                print(f"⏰ 画像生成タイムアウト（60秒）")
-                return {
-                    "success": False,
-                    "message": "画像生成がタイムアウトしました",
-                    "images": []
-                }
-            except Exception as e:
-                print(f"❌ 並行処理エラー: {e}")
-                return {
-                    "success": False,
-                    "message": f"並行処理エラー: {str(e)}",
-                    "images": []
-                }
-                
-    except Exception as e:
-        print(f"❌ ツール実行エラー: {e}")
-        return {
-            "success": False,
-            "message": f"ツール実行エラー: {str(e)}",
-            "images": []
-        }
+    logger.info("🎨 参照画像付き画像生成開始", image_type=image_type, story_chars=len(story_content), reference_image_url=reference_image_url)
+    error = _configure_genai()
+    if error:
+        return error
+    flight_key = image_cache_key(IMAGE_MODEL, _reference_image_prompt(story_content), reference_image_url)
+    return _image_flights.do(
+        flight_key, _run_scheduled, _generate_image_with_reference, story_content, reference_image_url, image_type
+    )
+
+async def generate_story_image_with_reference_async(story_content: str, reference_image_url: str, image_type: str) -> Dict[str, Any]:
+    """generate_story_image_with_reference のasync版"""
+    logger.info("🎨 参照画像付き画像生成開始", image_type=image_type, story_chars=len(story_content), reference_image_url=reference_image_url)
+    error = _configure_genai()
+    if error:
+        return error
+    flight_key = image_cache_key(IMAGE_MODEL, _reference_image_prompt(story_content), reference_image_url)
+    return await _image_flights.do_async(
+        flight_key, _run_scheduled_async, _generate_image_with_reference_async, story_content, reference_image_url, image_type
+    )
 
 def _generate_single_image(story_content: str, image_type: str) -> Dict[str, Any]:
     """
@@ -177,259 +309,232 @@ def _generate_single_image(story_content: str, image_type: str) -> Dict[str, Any
         画像生成結果
     """
     try:
-        # Gemini 2.5 Flash Image Previewモデル
-        model = genai.GenerativeModel('gemini-2.5-flash-image-preview')
-        
         # 画像生成プロンプト
-        image_prompt = f"""Create a colorful children's book illustration based on this story:
-
-{story_content}
-
-Style requirements:
-- Cute children's picture book art style
-- Bright, warm, and cheerful colors
-- Friendly and safe atmosphere
-- Perfect for ages 3-8
-- Happy ending scene
-- No scary or violent content
-- Do not include any text or letters in the image
-
-Create a heartwarming final scene that shows the happy conclusion of this story."""
+        image_prompt = _single_image_prompt(story_content)
+        
+        # プロンプト全文はDEBUGのときだけ（レベル未満なら整形もしない）
+        logger.debug("📝 画像プロンプト生成完了", prompt=image_prompt)
         
-        print(f"📝 画像プロンプト生成完了")
-        print(f"📋 生成されたプロンプト:")
-        print(f"---")
-        print(image_prompt)
-        print(f"---")
+        # 同じプロンプトで生成済みならモデルを呼ばずに再利用する
+        cache_key = image_cache_key(IMAGE_MODEL, image_prompt)
+        cached_url = image_cache.lookup(cache_key)
+        if cached_url:
+            logger.info("⚡ 画像キャッシュヒット", image_url=cached_url)
+            return _image_result(cached_url, image_prompt, "1個の画像をキャッシュから取得しました", "ストーリーのハッピーエンドシーン")
+        
+        # Gemini 2.5 Flash Image Previewモデル
+        model = _image_model()
         
         # 画像生成実行
-        print(f"🎨 Gemini API呼び出し開始...")
-        response = model.generate_content(image_prompt)
-        print(f"📋 Gemini API応答: {response}")
-        
-        if not response:
-            raise ValueError("画像生成レスポンスが空です")
-        
-        print(f"📊 レスポンス詳細:")
-        print(f"  - candidates: {response.candidates}")
-        print(f"  - candidates数: {len(response.candidates) if response.candidates else 0}")
-        
-        if not response.candidates:
-            raise ValueError("画像生成レスポンスにcandidatesがありません")
-        
-        candidate = response.candidates[0]
-        print(f"📊 最初のcandidate:")
-        print(f"  - content: {candidate.content}")
-        print(f"  - parts: {candidate.content.parts if candidate.content else 'None'}")
-        
-        if not candidate.content:
-            raise ValueError("candidateにcontentがありません")
-        
-        if not candidate.content.parts:
-            raise ValueError("candidateにpartsがありません")
-        
-        # 画像データを抽出
-        image_data = None
-        print(f"🔍 partsの詳細検索:")
-        for i, part in enumerate(candidate.content.parts):
-            print(f"  - part[{i}]: {part}")
-            print(f"    - hasattr(inline_data): {hasattr(part, 'inline_data')}")
-            if hasattr(part, 'inline_data'):
-                print(f"    - inline_data: {part.inline_data}")
-                if part.inline_data:
-                    print(f"    - inline_data.data: {len(part.inline_data.data) if part.inline_data.data else 'None'} bytes")
-                    image_data = part.inline_data.data
-                    break
-        
-        if not image_data:
-            raise ValueError("画像データが生成されませんでした")
-        
-        print(f"🖼️ 画像データ抽出完了: {len(image_data)} bytes")
-        
-        # Cloud Storage アップロード（ファイル名をここで生成）
-        timestamp = int(time.time())
-        file_name = f"story_parallel_{timestamp}.png"
-        cloud_url = _upload_to_cloud_storage(file_name, image_data)
-        
-        result = {
-            "success": True,
-            "message": "1個の画像を並行生成しました",
-            "images": [{
-                "id": 1,
-                "prompt": image_prompt[:100] + "...",
-                "file_path": None, # ローカルパスは保存しないのでNone
-                "cloud_url": cloud_url,
-                "description": "ストーリーのハッピーエンドシーン",
-                "mime_type": "image/png"
-            }]
-        }
-        
-        print(f"✅ 画像生成完了: 1個")
-        print(f"📋 結果: {result}")
+        logger.debug("🎨 Gemini API呼び出し開始")
+        # HTTPリクエスト自体にも期限を設定し、タイムアウト後にワーカースレッドが残り続けないようにする
+        with track_stage("gemini_image"):
+            response = model.generate_content(
+                image_prompt, request_options={"timeout": get_image_scheduler().default_timeout}
+            )
+        image_data = _image_data_from_response(response)
+        
+        # Cloud Storage アップロード（オブジェクト名はキャッシュキー）
+        cloud_url = _upload_to_cloud_storage(cache_key, image_data)
+        
+        result = _image_result(cloud_url, image_prompt, "1個の画像を並行生成しました", "ストーリーのハッピーエンドシーン")
+        
+        logger.info("✅ 画像生成完了", image_url=cloud_url)
         
         return result
         
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ 画像生成エラー: {e}")
-        print(f"📋 エラー詳細:\n{error_details}")
-        return {
-            "success": False,
-            "message": f"画像生成エラー: {str(e)}",
-            "error_details": error_details,
-            "images": []
-        }
+        return _error_result("画像生成エラー", e)
+
+async def _generate_single_image_async(story_content: str, image_type: str) -> Dict[str, Any]:
+    """_generate_single_image のasync版"""
+    try:
+        image_prompt = _single_image_prompt(story_content)
+        logger.debug("📝 画像プロンプト生成完了", prompt=image_prompt)
+        
+        cache_key = image_cache_key(IMAGE_MODEL, image_prompt)
+        cached_url = await image_cache.lookup_async(cache_key)
+        if cached_url:
+            logger.info("⚡ 画像キャッシュヒット", image_url=cached_url)
+            return _image_result(cached_url, image_prompt, "1個の画像をキャッシュから取得しました", "ストーリーのハッピーエンドシーン")
+        
+        model = _image_model()
+        logger.debug("🎨 Gemini API呼び出し開始")
+        with track_stage("gemini_image"):
+            response = await model.generate_content_async(
+                image_prompt, request_options={"timeout": get_image_scheduler().default_timeout}
+            )
+        image_data = _image_data_from_response(response)
+        
+        cloud_url = await _upload_to_cloud_storage_async(cache_key, image_data)
+        result = _image_result(cloud_url, image_prompt, "1個の画像を並行生成しました", "ストーリーのハッピーエンドシーン")
+        logger.info("✅ 画像生成完了", image_url=cloud_url)
+        return result
+        
+    except Exception as e:
+        return _error_result("画像生成エラー", e)
 
 def _generate_image_with_reference(story_content: str, reference_image_url: str, image_type: str) -> Dict[str, Any]:
     """
     参照画像を使用した画像生成の内部実装
     """
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash-image-preview')
+        image_prompt = _reference_image_prompt(story_content)
         
-        # 参照画像をダウンロード
-        print(f"📥 参照画像をダウンロード中: {reference_image_url}")
-        response = requests.get(reference_image_url)
-        response.raise_for_status() # エラーがあればここで例外を発生させる
-        
-        reference_image_data = response.content
-        print(f"📥 参照画像ダウンロード完了: {len(reference_image_data)} bytes")
-
-        # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
-        # 修正箇所：ダウンロードした画像データをPIL.Imageオブジェクトに変換
-        pil_image = Image.open(io.BytesIO(reference_image_data))
-        # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
+        logger.debug("📝 参照画像付きプロンプト生成完了", prompt=image_prompt)
         
-        image_prompt = f"""Create a colorful children's book illustration for the continuation of this story, maintaining the same art style and characters as the reference image:
-
-Story continuation:
-{story_content}
-
-Style requirements:
-- Maintain the exact same art style, colors, and character designs as the reference image
-- Keep the same visual consistency and atmosphere
-- Create a natural continuation of the story scene
-- Bright, warm, and cheerful children's book style
-- Do not include any text or letters in the image
-"""
+        # 参照画像の内容もキーに含める（同じURLでも中身が違えば別の画像）
+        reference_image_data = _load_reference_bytes(reference_image_url)
+        cache_key = image_cache_key(IMAGE_MODEL, image_prompt, content_hash(reference_image_data))
+        cached_url = image_cache.lookup(cache_key)
+        if cached_url:
+            logger.info("⚡ 画像キャッシュヒット", image_url=cached_url)
+            return _image_result(cached_url, image_prompt, "1個の参照画像付き画像をキャッシュから取得しました", "参照画像を基にしたストーリー続編シーン")
         
-        print(f"📝 参照画像付きプロンプト生成完了")
+        model = _image_model()
+        pil_image = _load_reference_image(reference_image_url)
         
         # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
         # 修正箇所：テキストとPIL.Imageオブジェクトをリストで渡す
-        print(f"🎨 Gemini API呼び出し開始（参照画像付き）...")
-        response = model.generate_content([image_prompt, pil_image])
+        logger.debug("🎨 Gemini API呼び出し開始（参照画像付き）")
+        with track_stage("gemini_image"):
+            response = model.generate_content(
+                [image_prompt, pil_image], request_options={"timeout": get_image_scheduler().default_timeout}
+            )
         # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
 
-        print(f"📋 Gemini API応答: {response}")
-        
-        if not response.candidates:
-            # 安全性フィルターなどによってブロックされた場合のメッセージを追加
-            print(f"⚠️ 応答に候補が含まれていません。安全性フィルターによってブロックされた可能性があります。")
-            print(f"   詳細: {response.prompt_feedback}")
-            raise ValueError("画像生成レスポンスにcandidatesがありません")
-        
-        # 画像データを抽出
-        image_data = None
-        for part in response.candidates[0].content.parts:
-            if part.inline_data:
-                image_data = part.inline_data.data
-                break
-        
-        if not image_data:
-            raise ValueError("画像データが生成されませんでした")
-        
-        print(f"🖼️ 画像データ抽出完了: {len(image_data)} bytes")
-        
-        # Cloud Storage アップロード（ファイル名をここで生成）
-        timestamp = int(time.time())
-        file_name = f"story_reference_{timestamp}.png"
-        cloud_url = _upload_to_cloud_storage(file_name, image_data)
-        
-        result = {
-            "success": True,
-            "message": "1個の参照画像付き画像を生成しました",
-            "images": [{
-                "id": 1,
-                "prompt": image_prompt[:100] + "...",
-                "file_path": None,
-                "cloud_url": cloud_url,
-                "description": "参照画像を基にしたストーリー続編シーン",
-                "mime_type": "image/png"
-            }]
-        }
-        
-        print(f"✅ 参照画像付き画像生成完了: 1個")
-        print(f"📋 結果: {result}")
+        image_data = _image_data_from_response(response)
+        
+        # Cloud Storage アップロード（オブジェクト名はキャッシュキー）
+        cloud_url = _upload_to_cloud_storage(cache_key, image_data)
+        
+        result = _image_result(cloud_url, image_prompt, "1個の参照画像付き画像を生成しました", "参照画像を基にしたストーリー続編シーン")
+        
+        logger.info("✅ 参照画像付き画像生成完了", image_url=cloud_url)
         
         return result
         
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ 参照画像付き画像生成エラー: {e}")
-        print(f"📋 エラー詳細:\n{error_details}")
-        return {
-            "success": False,
-            "message": f"参照画像付き画像生成エラー: {str(e)}",
-            "error_details": error_details,
-            "images": []
-        }
-
-def _upload_to_cloud_storage(file_name: str, image_data: bytes) -> str:
-    """Cloud Storageへのアップロード"""
+        return _error_result("参照画像付き画像生成エラー", e)
+
+async def _generate_image_with_reference_async(story_content: str, reference_image_url: str, image_type: str) -> Dict[str, Any]:
+    """_generate_image_with_reference のasync版"""
     try:
-        # 認証設定 - Cloud Run環境での認証ファイルパスを修正
-        if os.path.exists("/app/service-account-key.json"):
-            credentials_path = "/app/service-account-key.json"
-        elif os.path.exists("service-account-key.json"):
-            credentials_path = os.path.join(os.getcwd(), "service-account-key.json")
-        else:
-            # 環境変数からBase64エンコードされた認証情報を使用
-            credentials_base64 = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_BASE64')
-            if credentials_base64:
-                import base64
-                import tempfile
-                
-                # Base64デコードして一時ファイルに保存
-                credentials_json = base64.b64decode(credentials_base64).decode('utf-8')
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                    f.write(credentials_json)
-                    credentials_path = f.name
-                print(f"🔑 一時的な認証ファイルを作成: {credentials_path}")
-            else:
-                # デフォルトの認証方法を使用（Cloud Run環境での自動認証）
-                print("🔑 Cloud Run環境での自動認証を使用")
-                credentials_path = None
-        
-        if credentials_path:
-            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
-        else:
-            # Cloud Run環境での自動認証を使用する場合、環境変数をクリア
-            if 'GOOGLE_APPLICATION_CREDENTIALS' in os.environ:
-                del os.environ['GOOGLE_APPLICATION_CREDENTIALS']
-        
-        # Cloud Storage クライアント
-        client = storage.Client()
-        bucket_name = "childstory-ggl-research-3db4311e"
-        bucket = client.bucket(bucket_name)
-        
-        # ユニークなブロブ名
-        blob_name = f"story-images/{file_name}"
-        blob = bucket.blob(blob_name)
-        
-        # アップロード実行
-        blob.upload_from_string(image_data, content_type='image/png')
-        blob.make_public()
-        
-        public_url = f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
-        print(f"☁️ Cloud Storage アップロード完了: {public_url}")
+        image_prompt = _reference_image_prompt(story_content)
+        logger.debug("📝 参照画像付きプロンプト生成完了", prompt=image_prompt)
+        
+        reference_image_data = await _load_reference_bytes_async(reference_image_url)
+        cache_key = image_cache_key(IMAGE_MODEL, image_prompt, content_hash(reference_image_data))
+        cached_url = await image_cache.lookup_async(cache_key)
+        if cached_url:
+            logger.info("⚡ 画像キャッシュヒット", image_url=cached_url)
+            return _image_result(cached_url, image_prompt, "1個の参照画像付き画像をキャッシュから取得しました", "参照画像を基にしたストーリー続編シーン")
+        
+        model = _image_model()
+        # デコードはCPU処理なので短時間だけスレッドで行う（ダウンロード済みのデータを使う）
+        pil_image = await asyncio.to_thread(_decode_reference_image, reference_image_url, reference_image_data)
+        
+        logger.debug("🎨 Gemini API呼び出し開始（参照画像付き）")
+        with track_stage("gemini_image"):
+            response = await model.generate_content_async(
+                [image_prompt, pil_image], request_options={"timeout": get_image_scheduler().default_timeout}
+            )
+        image_data = _image_data_from_response(response)
+        
+        cloud_url = await _upload_to_cloud_storage_async(cache_key, image_data)
+        result = _image_result(cloud_url, image_prompt, "1個の参照画像付き画像を生成しました", "参照画像を基にしたストーリー続編シーン")
+        logger.info("✅ 参照画像付き画像生成完了", image_url=cloud_url)
+        return result
         
+    except Exception as e:
+        return _error_result("参照画像付き画像生成エラー", e)
+
+def _load_reference_image(reference_image_url: str) -> Image.Image:
+    """
+    参照画像をPIL.Imageとして取得
+    
+    このプロセスでアップロードした画像はキャッシュから返し、ダウンロードとデコードを省く
+    """
+    pil_image = reference_image_cache.get_image(reference_image_url)
+    if pil_image is not None:
+        return pil_image
+    
+    # ダウンロードした画像データをPIL.Imageオブジェクトに変換（次回以降はキャッシュを使う）
+    reference_image_data = _load_reference_bytes(reference_image_url)
+    return _decode_reference_image(reference_image_url, reference_image_data)
+
+def _decode_reference_image(reference_image_url: str, reference_image_data: bytes) -> Image.Image:
+    return reference_image_cache.get_image(reference_image_url) or Image.open(io.BytesIO(reference_image_data))
+
+def _load_reference_bytes(reference_image_url: str) -> bytes:
+    """参照画像のバイト列を取得（キャッシュ → 自分のバックエンド → HTTP の順）"""
+    reference_image_data = reference_image_cache.get_bytes(reference_image_url)
+    if reference_image_data is not None:
+        logger.debug("⚡ 参照画像キャッシュヒット", reference_image_url=reference_image_url)
+        return reference_image_data
+    
+    with track_stage("reference_download"):
+        # 自分のバックエンドのURLならHTTPを経由せずに読み込む
+        reference_image_data = read_url(reference_image_url)
+        if reference_image_data is None:
+            logger.info("📥 参照画像をダウンロード中", reference_image_url=reference_image_url)
+            response = requests.get(reference_image_url, timeout=30)
+            response.raise_for_status() # エラーがあればここで例外を発生させる
+            reference_image_data = response.content
+    logger.debug("📥 参照画像取得完了", image_bytes=len(reference_image_data))
+    
+    reference_image_cache.put(reference_image_url, reference_image_data)
+    return reference_image_data
+
+async def _load_reference_bytes_async(reference_image_url: str) -> bytes:
+    """_load_reference_bytes のasync版（HTTPは共有の httpx.AsyncClient を使う）"""
+    reference_image_data = reference_image_cache.get_bytes(reference_image_url)
+    if reference_image_data is not None:
+        logger.debug("⚡ 参照画像キャッシュヒット", reference_image_url=reference_image_url)
+        return reference_image_data
+    
+    with track_stage("reference_download"):
+        reference_image_data = await read_url_async(reference_image_url)
+        if reference_image_data is None:
+            logger.info("📥 参照画像をダウンロード中", reference_image_url=reference_image_url)
+            response = await get_async_http_client().get(reference_image_url, timeout=30, follow_redirects=True)
+            response.raise_for_status()
+            reference_image_data = response.content
+    logger.debug("📥 参照画像取得完了", image_bytes=len(reference_image_data))
+    
+    reference_image_cache.put(reference_image_url, reference_image_data)
+    return reference_image_data
+
+def _upload_to_cloud_storage(cache_key: str, image_data: bytes) -> str:
+    """Cloud Storageへのアップロード（共有クライアントを使用）"""
+    try:
+        # 内容のハッシュで命名するので、同時に生成しても上書きし合わない
+        blob_name = image_object_path(cache_key)
+        public_url = upload_bytes(blob_name, image_data, content_type='image/png', cache_control=IMMUTABLE_CACHE_CONTROL)
+        # 次のページの参照画像として使うので、アップロードしたデータを保持しておく
+        reference_image_cache.put(public_url, image_data)
+        image_cache.remember(cache_key, public_url)
+        logger.debug("☁️ Cloud Storage アップロード完了", image_url=public_url)
+        
+        return public_url
+        
+    except Exception as e:
+        logger.error("❌ Cloud Storage エラー", error=str(e))
+        return None
+
+async def _upload_to_cloud_storage_async(cache_key: str, image_data: bytes) -> str:
+    """_upload_to_cloud_storage のasync版"""
+    try:
+        blob_name = image_object_path(cache_key)
+        public_url = await upload_bytes_async(blob_name, image_data, content_type='image/png', cache_control=IMMUTABLE_CACHE_CONTROL)
+        reference_image_cache.put(public_url, image_data)
+        await image_cache.remember_async(cache_key, public_url)
+        logger.debug("☁️ Cloud Storage アップロード完了", image_url=public_url)
         return public_url
         
     except Exception as e:
-        print(f"❌ Cloud Storage エラー: {e}")
+        # httpx の接続エラーなどはメッセージが空のことがあるので型名も残す
+        logger.error("❌ Cloud Storage エラー", error=str(e) or type(e).__name__)
         return None
 
 # ADK用ツール
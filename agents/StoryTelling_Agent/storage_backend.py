@@ -0,0 +1,526 @@
+"""
+ストレージバックエンド - 画像・音声の保存先を差し替え可能にする共通インターフェース
+Cloud Storage（共有クライアント）とローカルディスクの実装を提供する
+認証情報の解決とクライアント作成はプロセスで一度だけ行い、HTTP接続をプールして再利用する
+async版（upload_async など）はスレッドを使わず、共有の httpx.AsyncClient で JSON API を直接呼ぶ
+"""
+
+import asyncio
+import base64
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+import requests
+from google.cloud import storage
+
+from agents.Common.logging_config import get_logger
+from agents.Common.metrics import track_stage
+
+logger = get_logger(__name__)
+
+# 画像・音声を保存するバケット（STORAGE_BUCKET で上書き可能）
+DEFAULT_BUCKET_NAME = "childstory-ggl-research-3db4311e"
+
+_STORAGE_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+_client: Optional[storage.Client] = None
+_bucket: Optional[storage.Bucket] = None
+_credentials = None
+_client_lock = threading.Lock()
+
+# async版で使う共有クライアント（作成したイベントループでのみ使える）
+_async_http_client: Optional[httpx.AsyncClient] = None
+_async_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_http_client_lock = threading.Lock()
+# 閉じている途中の古いクライアント（完了前に回収されないよう保持）
+_async_close_tasks = set()
+
+
+def _resolve_credentials() -> Tuple[object, Optional[str]]:
+    """
+    認証情報を解決する（一時ファイルや環境変数の書き換えは行わない）
+
+    優先順: サービスアカウントキーファイル → GOOGLE_APPLICATION_CREDENTIALS_BASE64 → デフォルト認証
+    """
+    from google.oauth2 import service_account
+
+    # 認証設定 - Cloud Run環境での認証ファイルパスも確認
+    for path in ("/app/service-account-key.json", os.path.join(os.getcwd(), "service-account-key.json")):
+        if os.path.exists(path):
+            logger.info("🔑 サービスアカウントキーを使用", path=path)
+            credentials = service_account.Credentials.from_service_account_file(path, scopes=_STORAGE_SCOPES)
+            return credentials, credentials.project_id
+
+    credentials_base64 = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_BASE64')
+    if credentials_base64:
+        # Base64デコードしたキーをメモリ上で読み込む
+        info = json.loads(base64.b64decode(credentials_base64).decode('utf-8'))
+        logger.info("🔑 Base64エンコードされた認証情報を使用")
+        credentials = service_account.Credentials.from_service_account_info(info, scopes=_STORAGE_SCOPES)
+        return credentials, credentials.project_id
+
+    # デフォルトの認証方法を使用（Cloud Run環境での自動認証）
+    import google.auth
+
+    logger.info("🔑 Cloud Run環境での自動認証を使用")
+    return google.auth.default(scopes=_STORAGE_SCOPES)
+
+
+def _create_client() -> storage.Client:
+    global _credentials
+    emulator_host = os.environ.get("STORAGE_EMULATOR_HOST")
+    if emulator_host:
+        # ローカルのフェイクGCSサーバー（ベンチマーク・オフライン実行用）
+        from google.auth.credentials import AnonymousCredentials
+
+        logger.info("☁️ Cloud Storage エミュレーターを使用", emulator_host=emulator_host)
+        _credentials = AnonymousCredentials()
+        return storage.Client(
+            project=os.environ.get("GOOGLE_CLOUD_PROJECT", "local"), credentials=_credentials
+        )
+
+    from google.auth.transport.requests import AuthorizedSession
+
+    credentials, project = _resolve_credentials()
+    _credentials = credentials
+    # 並行アップロードで接続を使い回せるよう、プールサイズを広げたセッションを共有する
+    pool_size = int(os.environ.get("STORAGE_POOL_SIZE", 16))
+    session = AuthorizedSession(credentials)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    return storage.Client(project=project, credentials=credentials, _http=session)
+
+
+def get_storage_client() -> storage.Client:
+    """プロセス共通のCloud Storageクライアント（初回呼び出し時に作成）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    現在のイベントループで共有する httpx.AsyncClient（Cloud Storage・参照画像のダウンロード用）
+
+    STORAGE_POOL_SIZE: 接続プールの大きさ（同期クライアントと共通、デフォルト: 16）
+
+    別のイベントループから呼ばれた場合は作り直し、古いクライアントは作成したループで閉じる。
+    """
+    global _async_http_client, _async_http_client_loop
+    loop = asyncio.get_running_loop()
+    old_client, old_loop = None, None
+    with _async_http_client_lock:
+        if _async_http_client is None or _async_http_client_loop is not loop:
+            old_client, old_loop = _async_http_client, _async_http_client_loop
+            pool_size = int(os.environ.get("STORAGE_POOL_SIZE", 16))
+            _async_http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+            _async_http_client_loop = loop
+        client = _async_http_client
+    if old_client is not None:
+        _close_async_http_client(old_client, old_loop)
+    return client
+
+
+def _close_async_http_client(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """作成したイベントループでクライアントを閉じる（ループが終了済みなら参照を外すだけ）"""
+    if loop is None or loop.is_closed():
+        logger.debug("🔌 終了済みのイベントループのHTTPクライアントを破棄")
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        task = loop.create_task(client.aclose())
+        _async_close_tasks.add(task)
+        task.add_done_callback(_async_close_tasks.discard)
+    elif loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    elif running is None:
+        loop.run_until_complete(client.aclose())
+    else:
+        logger.debug("🔌 停止中のイベントループのHTTPクライアントを破棄")
+
+
+async def close_async_http_client() -> None:
+    """共有の httpx.AsyncClient を閉じる（アプリの終了時に呼ぶ）"""
+    global _async_http_client, _async_http_client_loop
+    with _async_http_client_lock:
+        client, loop = _async_http_client, _async_http_client_loop
+        _async_http_client = None
+        _async_http_client_loop = None
+    if client is None:
+        return
+    if loop is asyncio.get_running_loop():
+        await client.aclose()
+    else:
+        _close_async_http_client(client, loop)
+
+
+async def warm_up_async_storage() -> None:
+    """
+    async版のアップロードで初回だけかかる準備（クライアントの作成・認証情報の解決）を先に済ませる
+
+    起動時に呼ぶと、最初のリクエストでイベントループが止まったり遅れたりしない。
+    """
+    get_async_http_client()
+    if isinstance(get_storage_backend(), GCSStorageBackend):
+        await _auth_headers()
+
+
+def _refresh_credentials() -> None:
+    from google.auth.transport.requests import Request
+
+    with _client_lock:
+        if not _credentials.valid:
+            _credentials.refresh(Request())
+
+
+async def _auth_headers() -> Dict[str, str]:
+    """共有クライアントと同じ認証情報のヘッダー（期限切れのときだけスレッドで更新する）"""
+    if _client is None or _credentials is None:
+        # 初回のみ認証情報の解決（メタデータサーバーへの問い合わせなど）をスレッドで行う
+        await asyncio.to_thread(get_storage_client)
+    headers: Dict[str, str] = {}
+    if os.environ.get("STORAGE_EMULATOR_HOST"):
+        return headers
+    if not _credentials.valid:
+        await asyncio.to_thread(_refresh_credentials)
+    _credentials.apply(headers)
+    return headers
+
+
+def bucket_name() -> str:
+    return os.environ.get("STORAGE_BUCKET", DEFAULT_BUCKET_NAME)
+
+
+def get_bucket() -> storage.Bucket:
+    global _bucket
+    if _bucket is None:
+        _bucket = get_storage_client().bucket(bucket_name())
+    return _bucket
+
+
+def reset_storage_client() -> None:
+    """共有クライアント（async版を含む）・認証情報・バックエンドを破棄する（認証情報の切り替え・ベンチマーク用）"""
+    global _client, _bucket, _backend, _credentials, _async_http_client, _async_http_client_loop
+    with _client_lock:
+        _client = None
+        _bucket = None
+        _backend = None
+        _credentials = None
+    with _async_http_client_lock:
+        client, loop = _async_http_client, _async_http_client_loop
+        _async_http_client = None
+        _async_http_client_loop = None
+    if client is not None:
+        _close_async_http_client(client, loop)
+
+
+def _default_cache_control() -> str:
+    return os.environ.get("STORAGE_CACHE_CONTROL", "public, max-age=86400")
+
+
+class StorageBackend:
+    """
+    画像・音声の保存先のインターフェース
+
+    path はバックエンド内のオブジェクト名（例: "story-images/xxx.png"）。
+    """
+
+    def upload(self, path: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        """データを保存して公開URLを返す"""
+        raise NotImplementedError
+
+    async def upload_async(self, path: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        """upload() のasync版"""
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        raise NotImplementedError
+
+    async def exists_async(self, path: str) -> bool:
+        """exists() のasync版（デフォルトはスレッドで実行）"""
+        return await asyncio.to_thread(self.exists, path)
+
+    def read(self, path: str) -> Optional[bytes]:
+        """保存済みデータを読み込む（なければNone）"""
+        raise NotImplementedError
+
+    async def read_async(self, path: str) -> Optional[bytes]:
+        """read() のasync版（デフォルトはスレッドで実行）"""
+        return await asyncio.to_thread(self.read, path)
+
+    def public_url(self, path: str) -> str:
+        raise NotImplementedError
+
+    def path_for_url(self, url: str) -> Optional[str]:
+        """このバックエンドの公開URLならオブジェクト名を返す"""
+        return None
+
+
+class GCSStorageBackend(StorageBackend):
+    """
+    Cloud Storage バックエンド
+
+    公開ACL（predefinedAcl=publicRead）と Cache-Control をアップロードと同じリクエストで設定し、
+    make_public() の追加リクエストを省く。
+    """
+
+    def __init__(self, bucket: Optional[str] = None):
+        self._bucket_name = bucket
+
+    @property
+    def bucket_name(self) -> str:
+        return self._bucket_name or bucket_name()
+
+    def _bucket(self) -> storage.Bucket:
+        if self._bucket_name:
+            return get_storage_client().bucket(self._bucket_name)
+        return get_bucket()
+
+    def upload(self, path: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        blob = self._bucket().blob(path)
+        blob.cache_control = cache_control or _default_cache_control()
+        blob.upload_from_string(data, content_type=content_type, predefined_acl="publicRead")
+        return self.public_url(path)
+
+    async def upload_async(self, path: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        # メタデータと本体を1つの multipart リクエストで送る（upload_from_string と同じ形式）
+        metadata = {"name": path, "contentType": content_type, "cacheControl": cache_control or _default_cache_control()}
+        boundary = uuid.uuid4().hex
+        body = b"".join([
+            f"--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n".encode(),
+            json.dumps(metadata).encode(),
+            f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\n\r\n".encode(),
+            data,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ])
+        headers = await _auth_headers()
+        headers["Content-Type"] = f'multipart/related; boundary="{boundary}"'
+        response = await get_async_http_client().post(
+            f"{self._api_base()}/upload/storage/v1/b/{self.bucket_name}/o",
+            params={"uploadType": "multipart", "predefinedAcl": "publicRead"},
+            content=body,
+            headers=headers,
+        )
+        response.raise_for_status()
+        return self.public_url(path)
+
+    def exists(self, path: str) -> bool:
+        return self._bucket().blob(path).exists()
+
+    async def exists_async(self, path: str) -> bool:
+        response = await get_async_http_client().get(
+            f"{self._api_base()}/storage/v1/b/{self.bucket_name}/o/{quote(path, safe='')}",
+            params={"fields": "name"},
+            headers=await _auth_headers(),
+        )
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    @staticmethod
+    def _api_base() -> str:
+        emulator_host = os.environ.get("STORAGE_EMULATOR_HOST")
+        return emulator_host.rstrip("/") if emulator_host else "https://storage.googleapis.com"
+
+    def read(self, path: str) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self._bucket().blob(path).download_as_bytes()
+        except NotFound:
+            return None
+
+    def public_url(self, path: str) -> str:
+        emulator_host = os.environ.get("STORAGE_EMULATOR_HOST")
+        if emulator_host:
+            return f"{emulator_host.rstrip('/')}/{self.bucket_name}/{path}"
+        return f"https://storage.googleapis.com/{self.bucket_name}/{path}"
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    ローカルディスクのバックエンド（オフライン実行・ベンチマーク用）
+
+    ファイルは root 以下に保存し、FastAPIアプリが url_prefix で配信する。
+    """
+
+    def __init__(self, root: str, url_prefix: str = "/media"):
+        self.root = os.path.abspath(root)
+        self.url_prefix = "/" + url_prefix.strip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _full_path(self, path: str) -> str:
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if not full_path.startswith(self.root + os.sep):
+            raise ValueError(f"不正なパスです: {path}")
+        return full_path
+
+    def upload(self, path: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        full_path = self._full_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # 書きかけのファイルが配信されないよう、一時ファイルに書いてから置き換える
+        tmp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+        return self.public_url(path)
+
+    async def upload_async(self, path: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+        import aiofiles
+        import aiofiles.os
+
+        full_path = self._full_path(path)
+        await aiofiles.os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        tmp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+        await aiofiles.os.replace(tmp_path, full_path)
+        return self.public_url(path)
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(self._full_path(path))
+
+    async def exists_async(self, path: str) -> bool:
+        import aiofiles.os
+
+        return await aiofiles.os.path.exists(self._full_path(path))
+
+    def read(self, path: str) -> Optional[bytes]:
+        full_path = self._full_path(path)
+        if not os.path.exists(full_path):
+            return None
+        with open(full_path, "rb") as f:
+            return f.read()
+
+    async def read_async(self, path: str) -> Optional[bytes]:
+        import aiofiles
+
+        try:
+            async with aiofiles.open(self._full_path(path), "rb") as f:
+                return await f.read()
+        except FileNotFoundError:
+            return None
+
+    def public_url(self, path: str) -> str:
+        return f"{self.url_prefix}/{path}"
+
+    def path_for_url(self, url: str) -> Optional[str]:
+        prefix = self.url_prefix + "/"
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """
+    プロセス共通のストレージバックエンドを取得
+
+    STORAGE_BACKEND: "gcs"（デフォルト）または "local"
+    LOCAL_STORAGE_DIR: local の保存先ディレクトリ（デフォルト: ./local_storage）
+    LOCAL_STORAGE_URL_PREFIX: local の配信パス（デフォルト: /media）
+    """
+    global _backend
+    if _backend is None:
+        with _client_lock:
+            if _backend is None:
+                kind = os.environ.get("STORAGE_BACKEND", "gcs").lower()
+                if kind == "local":
+                    _backend = LocalStorageBackend(
+                        os.environ.get("LOCAL_STORAGE_DIR", "local_storage"),
+                        os.environ.get("LOCAL_STORAGE_URL_PREFIX", "/media"),
+                    )
+                    logger.info("💾 ローカルストレージを使用", root=str(_backend.root), url_prefix=_backend.url_prefix)
+                else:
+                    _backend = GCSStorageBackend()
+    return _backend
+
+
+def set_storage_backend(backend: Optional[StorageBackend]) -> None:
+    """ストレージバックエンドを差し替える（ベンチマーク・オフライン実行用）"""
+    global _backend
+    _backend = backend
+
+
+def public_url(blob_name: str) -> str:
+    return get_storage_backend().public_url(blob_name)
+
+
+def upload_bytes(blob_name: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+    """
+    バイト列をアップロードして公開URLを返す
+
+    Args:
+        blob_name: バケット内のオブジェクト名
+        data: アップロードするデータ
+        content_type: MIMEタイプ
+        cache_control: Cache-Control（省略時は STORAGE_CACHE_CONTROL）
+
+    Returns:
+        公開URL
+    """
+    with track_stage("storage_upload"):
+        return get_storage_backend().upload(blob_name, data, content_type, cache_control)
+
+
+async def upload_bytes_async(blob_name: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> str:
+    """upload_bytes() のasync版"""
+    with track_stage("storage_upload"):
+        return await get_storage_backend().upload_async(blob_name, data, content_type, cache_control)
+
+
+def upload_file(blob_name: str, file_path: str, content_type: Optional[str] = None) -> str:
+    """ローカルファイルをアップロードして公開URLを返す"""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return upload_bytes(blob_name, data, content_type or "application/octet-stream")
+
+
+def read_url(url: str) -> Optional[bytes]:
+    """このプロセスのバックエンドのURLなら、HTTPを経由せずに直接読み込む"""
+    path = get_storage_backend().path_for_url(url)
+    return get_storage_backend().read(path) if path else None
+
+
+async def read_url_async(url: str) -> Optional[bytes]:
+    """read_url() のasync版"""
+    path = get_storage_backend().path_for_url(url)
+    return await get_storage_backend().read_async(path) if path else None
+
+
+__all__ = [
+    "DEFAULT_BUCKET_NAME",
+    "StorageBackend",
+    "GCSStorageBackend",
+    "LocalStorageBackend",
+    "get_storage_backend",
+    "set_storage_backend",
+    "bucket_name",
+    "get_storage_client",
+    "get_bucket",
+    "reset_storage_client",
+    "public_url",
+    "upload_bytes",
+    "upload_bytes_async",
+    "upload_file",
+    "read_url",
+    "read_url_async",
+    "get_async_http_client",
+    "close_async_http_client",
+    "warm_up_async_storage",
+]
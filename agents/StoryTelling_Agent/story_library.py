@@ -0,0 +1,259 @@
+"""
+お話ライブラリ - トップページのお話の種類ごとに、事前に生成した物語（テキスト・画像・音声）を保持する
+start_story はライブラリにある種類なら即座に返し、なければ従来どおりその場で生成する
+
+ライブラリの作成（CLI）:
+    python -m agents.StoryTelling_Agent.story_library --variants 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from agents.Common.logging_config import configure_logging, get_logger
+from agents.Common.record_replay import wrap_runner
+
+from .storage_backend import get_storage_backend
+from .story_stream import PageImagePipeline, StoryPageParser, iter_story_text
+
+logger = get_logger(__name__)
+
+# story_top.html で選べるお話の種類
+LIBRARY_TOPICS = ["動物のお話", "冒険のお話", "おひめさまのお話"]
+
+# ストレージバックエンド内のマニフェスト
+MANIFEST_PATH = "story-library/manifest.json"
+
+StoryEntry = Dict[str, Any]
+
+
+def _decode_page_keys(obj: Dict[str, Any]) -> Dict[Any, Any]:
+    # JSONではキーが文字列になるため、ページ番号（数字のキー）をintに戻す
+    return {int(k) if isinstance(k, str) and k.isdigit() else k: v for k, v in obj.items()}
+
+
+class StoryLibrary:
+    """
+    お話の種類 → 事前生成した物語のリスト
+
+    同じ種類が続けて選ばれても同じ物語にならないよう、順番に払い出す（ローテーション）。
+    マニフェストは refresh_interval 秒ごとにストレージから読み直す（CLIや他インスタンスの更新を反映）。
+    """
+
+    def __init__(self, manifest_path: str = MANIFEST_PATH, refresh_interval: float = 300):
+        self.manifest_path = manifest_path
+        self.refresh_interval = refresh_interval
+        self._topics: Dict[str, List[StoryEntry]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> int:
+        """ストレージからマニフェストを読み込み、物語の数を返す"""
+        try:
+            raw = get_storage_backend().read(self.manifest_path)
+        except Exception as e:
+            logger.warning("⚠️ お話ライブラリを読み込めません", error=str(e))
+            raw = None
+        with self._lock:
+            self._loaded_at = time.monotonic()
+            if raw is None:
+                return sum(len(entries) for entries in self._topics.values())
+            manifest = json.loads(raw, object_hook=_decode_page_keys)
+            self._topics = manifest.get("topics", {})
+            count = sum(len(entries) for entries in self._topics.values())
+        logger.info("📚 お話ライブラリ読み込み", stories=count)
+        return count
+
+    def needs_refresh(self) -> bool:
+        return time.monotonic() - self._loaded_at >= self.refresh_interval
+
+    def pick(self, topic: str) -> Optional[StoryEntry]:
+        """お話の種類に対応する物語を順番に1つ返す（なければNone）"""
+        with self._lock:
+            entries = self._topics.get(topic)
+            if not entries:
+                self.misses += 1
+                return None
+            cursor = self._cursor.get(topic, 0)
+            self._cursor[topic] = cursor + 1
+            self.hits += 1
+            return entries[cursor % len(entries)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "topics": {topic: len(entries) for topic, entries in self._topics.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "loaded_seconds_ago": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            }
+
+    def snapshot(self) -> Dict[str, List[StoryEntry]]:
+        with self._lock:
+            return {topic: list(entries) for topic, entries in self._topics.items()}
+
+    def save(self, topics: Dict[str, List[StoryEntry]]) -> None:
+        """マニフェストをストレージに書き込み、このプロセスのライブラリも更新する"""
+        manifest = {"version": 1, "generated_at": time.time(), "topics": topics}
+        get_storage_backend().upload(
+            self.manifest_path,
+            json.dumps(manifest, ensure_ascii=False).encode("utf-8"),
+            "application/json",
+            cache_control="no-cache",
+        )
+        with self._lock:
+            self._topics = topics
+            self._loaded_at = time.monotonic()
+
+
+async def generate_library_story(runner, topic: str, language: str = "ja") -> Optional[StoryEntry]:
+    """
+    1話分の物語をテキスト・画像・音声まで生成する
+
+    ページが1つも取れなかった場合は None（失敗した物語はライブラリに入れない）
+    """
+    from google.genai.types import Part, UserContent
+
+    from .tts_tool import generate_story_audio
+
+    session = await runner.session_service.create_session(app_name=runner.app_name, user_id="story_library")
+    parser = StoryPageParser()
+    pages: Dict[int, str] = {}
+    pipeline = PageImagePipeline()
+    content = UserContent(parts=[Part(text=topic)])
+    try:
+        async for chunk in iter_story_text(runner, session.user_id, session.id, content):
+            for page_num, text in parser.feed(chunk):
+                pages[page_num] = text
+                pipeline.page_closed(page_num, text)
+        for page_num, text in parser.close():
+            pages[page_num] = text
+            pipeline.page_closed(page_num, text)
+    finally:
+        pipeline.close()
+        await runner.session_service.delete_session(
+            app_name=runner.app_name, user_id=session.user_id, session_id=session.id
+        )
+    if 1 not in pages:
+        logger.warning("⚠️ お話ライブラリの物語を生成できませんでした", topic=topic)
+        return None
+
+    audio_results = await asyncio.gather(
+        *(asyncio.to_thread(generate_story_audio, pages[page_num], language) for page_num in sorted(pages))
+    )
+    audio_urls = {
+        page_num: result["audio"]["cloud_url"] if result.get("success") else None
+        for page_num, result in zip(sorted(pages), audio_results)
+    }
+    image_urls = {page_num: await pipeline.wait(page_num) for page_num in sorted(pages)}
+
+    logger.info("✅ お話ライブラリの物語を生成しました", topic=topic, pages=len(pages))
+    return {
+        "id": uuid.uuid4().hex,
+        "topic": topic,
+        "created_at": time.time(),
+        "story_pages": pages,
+        "image_urls": image_urls,
+        "audio_urls": audio_urls,
+    }
+
+
+async def refresh_library(library: StoryLibrary, runner, topics: List[str], variants: int, per_topic: int) -> int:
+    """
+    各お話の種類について新しい物語を per_topic 話ずつ生成し、古いものから入れ替える
+
+    Returns:
+        追加した物語の数
+    """
+    await asyncio.to_thread(library.load)
+    current = library.snapshot()
+    added = 0
+    for topic in topics:
+        entries = current.get(topic, [])
+        for _ in range(per_topic):
+            entry = await generate_library_story(runner, topic)
+            if entry is None:
+                continue
+            entries.append(entry)
+            added += 1
+        # 新しい順に variants 話だけ残す
+        current[topic] = sorted(entries, key=lambda e: e["created_at"])[-variants:]
+    await asyncio.to_thread(library.save, current)
+    logger.info("📚 お話ライブラリ更新", added=added)
+    return added
+
+
+async def run_refresh_loop(library: StoryLibrary, runner) -> None:
+    """
+    マニフェストを定期的に読み直し、LIBRARY_REFRESH_SECONDS が設定されていれば物語も定期的に入れ替える
+
+    LIBRARY_REFRESH_SECONDS: 物語を1話ずつ入れ替える間隔（デフォルト: 0 = 入れ替えない）
+    LIBRARY_VARIANTS: お話の種類ごとに保持する物語の数（デフォルト: 3）
+    """
+    regenerate_interval = float(os.environ.get("LIBRARY_REFRESH_SECONDS", 0))
+    variants = int(os.environ.get("LIBRARY_VARIANTS", 3))
+    last_regenerated = time.monotonic()
+    while True:
+        await asyncio.sleep(min(library.refresh_interval, regenerate_interval or library.refresh_interval))
+        try:
+            if regenerate_interval and time.monotonic() - last_regenerated >= regenerate_interval:
+                last_regenerated = time.monotonic()
+                await refresh_library(library, runner, LIBRARY_TOPICS, variants, per_topic=1)
+            elif library.needs_refresh():
+                await asyncio.to_thread(library.load)
+        except Exception as e:
+            logger.error("❌ お話ライブラリ更新エラー", error=str(e))
+
+
+def create_story_library() -> StoryLibrary:
+    """
+    環境変数からお話ライブラリを作成
+
+    LIBRARY_MANIFEST: マニフェストのパス（デフォルト: story-library/manifest.json）
+    LIBRARY_RELOAD_SECONDS: マニフェストを読み直す間隔（デフォルト: 300秒）
+    """
+    return StoryLibrary(
+        manifest_path=os.environ.get("LIBRARY_MANIFEST", MANIFEST_PATH),
+        refresh_interval=float(os.environ.get("LIBRARY_RELOAD_SECONDS", 300)),
+    )
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="お話ライブラリを事前生成してストレージに保存します")
+    parser.add_argument("--topics", nargs="+", default=LIBRARY_TOPICS, help="生成するお話の種類")
+    parser.add_argument("--variants", type=int, default=int(os.environ.get("LIBRARY_VARIANTS", 3)),
+                        help="お話の種類ごとに保持する物語の数")
+    parser.add_argument("--per-topic", type=int, default=None,
+                        help="今回生成する物語の数（省略時は --variants と同じ数）")
+    args = parser.parse_args()
+    configure_logging()
+
+    from google.adk.runners import InMemoryRunner
+
+    from .agent import root_agent
+
+    runner = wrap_runner(InMemoryRunner(agent=root_agent))
+    library = create_story_library()
+    await refresh_library(library, runner, args.topics, args.variants, args.per_topic or args.variants)
+
+
+__all__ = [
+    "LIBRARY_TOPICS",
+    "StoryLibrary",
+    "create_story_library",
+    "generate_library_story",
+    "refresh_library",
+    "run_refresh_loop",
+]
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,220 @@
+"""
+ストーリーストリーミング - ADKの非同期イベントAPIで物語テキストを逐次取得
+[PAGE_N] ブロックが閉じた時点でページ単位に切り出してクライアントへ届ける
+"""
+
+import asyncio
+import inspect
+import json
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from google.adk.agents.run_config import RunConfig, StreamingMode
+
+from agents.Common.logging_config import bind_contextvars, get_logger
+from agents.Common.tracing import span
+
+logger = get_logger(__name__)
+
+# [PAGE_X] 区切り文字
+PAGE_MARKER_RE = re.compile(r'\[PAGE_(\d+)\]')
+
+# 3ページ構成の絵本
+MAX_STORY_PAGES = 3
+
+
+class StoryPageParser:
+    """
+    トークンストリームを受け取り、完成したページを順に返すパーサー
+
+    [PAGE_N] の次の区切り文字が現れた時点でページNが確定する。
+    最終ページは close() でストリーム終了時に確定する。
+    """
+
+    def __init__(self, max_pages: int = MAX_STORY_PAGES):
+        self.max_pages = max_pages
+        self._buffer = ""
+        self._scan_pos = 0
+        self._current_page: Optional[int] = None
+        self._current_start = 0
+        self._emitted = set()
+
+    def feed(self, chunk: str) -> List[Tuple[int, str]]:
+        """
+        テキスト断片を追加し、新たに確定したページを返す
+
+        Args:
+            chunk: ストリームから届いたテキスト断片
+
+        Returns:
+            (ページ番号, テキスト) のリスト
+        """
+        if not chunk:
+            return []
+        self._buffer += chunk
+        completed = []
+        for match in PAGE_MARKER_RE.finditer(self._buffer, self._scan_pos):
+            page = self._finish_current(match.start())
+            if page:
+                completed.append(page)
+            self._current_page = int(match.group(1))
+            self._current_start = match.end()
+            self._scan_pos = match.end()
+        # 区切り文字が途中で切れている可能性があるので、最後の "[" 以降は再走査する
+        tail = self._buffer.rfind("[", self._scan_pos)
+        self._scan_pos = tail if tail != -1 else len(self._buffer)
+        return completed
+
+    def close(self) -> List[Tuple[int, str]]:
+        """ストリーム終了時に最終ページを確定して返す"""
+        page = self._finish_current(len(self._buffer))
+        self._current_page = None
+        return [page] if page else []
+
+    @property
+    def text(self) -> str:
+        """これまでに受け取った全文"""
+        return self._buffer
+
+    def _finish_current(self, end: int) -> Optional[Tuple[int, str]]:
+        page_num = self._current_page
+        if page_num is None or page_num in self._emitted:
+            return None
+        self._emitted.add(page_num)
+        if page_num > self.max_pages:
+            logger.warning("⚠️ ページ数の上限を超えたページを無視", page=page_num, max_pages=self.max_pages)
+            return None
+        return page_num, self._buffer[self._current_start:end].strip()
+
+
+class PageImagePipeline:
+    """
+    ページが確定した瞬間に、そのページの画像生成ジョブを開始するパイプライン
+
+    P1は通常生成、P2以降は前ページの画像を参照画像として生成する。
+    テキスト生成と画像生成を重ねることで、画像の待ち時間をテキストの待ち時間に吸収する。
+    生成関数はasync関数でも通常の関数（スレッドで実行）でもよい。on_image もasync関数でよい。
+    """
+
+    def __init__(
+        self,
+        generate_image: Optional[Callable[..., Dict[str, Any]]] = None,
+        generate_image_with_reference: Optional[Callable[..., Dict[str, Any]]] = None,
+        on_image: Optional[Callable[[int, Optional[str]], Union[None, Awaitable[None]]]] = None,
+        on_finished: Optional[Callable[[], None]] = None,
+    ):
+        if generate_image is None or generate_image_with_reference is None:
+            from .simple_parallel_tool import (
+                generate_story_image_parallel_async,
+                generate_story_image_with_reference_async,
+            )
+            generate_image = generate_image or generate_story_image_parallel_async
+            generate_image_with_reference = generate_image_with_reference or generate_story_image_with_reference_async
+        self._generate_image = generate_image
+        self._generate_image_with_reference = generate_image_with_reference
+        self._on_image = on_image
+        self._on_finished = on_finished
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._closed = False
+
+    def page_closed(self, page_num: int, text: str) -> None:
+        """ページ確定時に呼び出し、画像生成ジョブを登録する"""
+        if page_num in self._tasks:
+            return
+        previous = self._tasks.get(page_num - 1)
+        self._tasks[page_num] = asyncio.create_task(self._run(page_num, text, previous))
+
+    async def wait(self, page_num: int) -> Optional[str]:
+        """指定ページの画像URLを待つ（ジョブがなければNone）"""
+        task = self._tasks.get(page_num)
+        if task is None:
+            return None
+        return await asyncio.shield(task)
+
+    def pending_pages(self) -> List[int]:
+        """生成中のページ番号"""
+        return [page_num for page_num, task in self._tasks.items() if not task.done()]
+
+    def close(self) -> None:
+        """これ以上ページが追加されないことを通知する"""
+        self._closed = True
+        self._maybe_finish()
+
+    def _maybe_finish(self, running_page: Optional[int] = None) -> None:
+        # 実行中の自分自身を除いて全ジョブが完了していれば終了通知
+        if not self._closed or not self._on_finished:
+            return
+        if all(task.done() for page_num, task in self._tasks.items() if page_num != running_page):
+            self._on_finished()
+            self._on_finished = None
+
+    @staticmethod
+    async def _call(fn: Callable[..., Any], *args) -> Dict[str, Any]:
+        if asyncio.iscoroutinefunction(fn):
+            return await fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def _run(self, page_num: int, text: str, previous: Optional[asyncio.Task]) -> Optional[str]:
+        image_url = None
+        # このタスク（と画像生成のスレッド）のログにページ番号を付ける
+        bind_contextvars(page=page_num)
+        with span("page_image", page=page_num):
+            try:
+                # 前ページの画像を参照画像として使い、絵のタッチを揃える
+                reference_image_url = await asyncio.shield(previous) if previous else None
+                if reference_image_url:
+                    result = await self._call(
+                        self._generate_image_with_reference, text, reference_image_url, f"p{page_num}_with_ref"
+                    )
+                else:
+                    result = await self._call(self._generate_image, text, f"p{page_num}")
+                if result and result.get("success"):
+                    image_url = result["images"][0].get("cloud_url")
+                    logger.info("✅ ページ画像生成完了", image_url=image_url)
+                else:
+                    logger.warning("❌ ページ画像生成失敗")
+            except Exception as e:
+                logger.error("❌ ページ画像生成エラー", error=str(e))
+        if self._on_image:
+            try:
+                saved = self._on_image(page_num, image_url)
+                if inspect.isawaitable(saved):
+                    await saved
+            except Exception as e:
+                logger.error("❌ ページ画像の保存エラー", error=str(e))
+        self._maybe_finish(page_num)
+        return image_url
+
+
+async def iter_story_text(runner, user_id: str, session_id: str, new_message) -> AsyncIterator[str]:
+    """
+    runner.run_async をSSEモードで実行し、テキストの差分を順に返す
+
+    SSEモードでは partial=True の差分イベントの後に全文をまとめたイベントが届くため、
+    差分を受け取った後の集約イベントは読み飛ばす。
+    """
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE)
+    received_partial = False
+    async for event in runner.run_async(
+        user_id=user_id, session_id=session_id, new_message=new_message, run_config=run_config
+    ):
+        content = getattr(event, 'content', None)
+        if not content or not content.parts:
+            continue
+        if getattr(event, 'partial', False):
+            received_partial = True
+        elif received_partial:
+            # 差分として受信済みの内容をまとめた最終イベント
+            received_partial = False
+            continue
+        for part in content.parts:
+            if getattr(part, 'text', None):
+                yield part.text
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Server-Sent Events 形式の1メッセージを組み立てる"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+__all__ = ["StoryPageParser", "PageImagePipeline", "iter_story_text", "format_sse", "MAX_STORY_PAGES"]
@@ -0,0 +1,131 @@
+"""
+文単位の並列読み上げ合成 - ページのテキストを文に分けて並列に合成し、順番どおりにMP3をつなげる
+gTTSの待ち時間は文字数に比例するため、最初の文だけ先に返せば音が鳴り始めるまでの時間が短くなる
+"""
+
+import asyncio
+import contextvars
+import io
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, List, Optional
+
+from agents.Common.record_replay import wrap_synthesize
+
+# 文末とみなす文字と、その内側では文を区切らない括弧
+SENTENCE_ENDINGS = "。！？!?"
+OPEN_BRACKETS = "「『（("
+CLOSE_BRACKETS = "」』）)"
+
+# (テキスト, 言語) → MP3のバイト列
+SynthesizeFn = Callable[[str, str], bytes]
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    テキストを文末（。！？）で分割する
+
+    「こんにちは！」と言いました。のように括弧の内側の文末では区切らない。空白だけの断片は除く。
+    """
+    sentences = []
+    current = []
+    depth = 0
+    for i, char in enumerate(text):
+        current.append(char)
+        if char in OPEN_BRACKETS:
+            depth += 1
+        elif char in CLOSE_BRACKETS:
+            depth = max(depth - 1, 0)
+        elif char in SENTENCE_ENDINGS and depth == 0:
+            # 「！？」のように文末が続く場合はまとめて1文にする
+            if i + 1 < len(text) and text[i + 1] in SENTENCE_ENDINGS:
+                continue
+            sentences.append("".join(current))
+            current = []
+    sentences.append("".join(current))
+    return [s.strip() for s in sentences if s.strip()]
+
+
+def gtts_synthesize(text: str, language: str) -> bytes:
+    """gTTSでメモリ上に合成する"""
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=language, slow=False).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+class SentenceChunkedSynthesizer:
+    """
+    文ごとの合成を共有の上限付きプールで並列に実行する
+
+    MP3はフレームの連続なので、文ごとの結果を順番どおりにつなげれば1つの音声として再生できる。
+    """
+
+    def __init__(self, synthesize: Optional[SynthesizeFn] = None, max_workers: int = 4):
+        # RECORD_REPLAY_MODE が設定されていれば、gTTSの出力を記録・再生する
+        self.synthesize_chunk = synthesize or wrap_synthesize(gtts_synthesize)
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+
+    def _submit(self, text: str, language: str) -> List[Future]:
+        sentences = split_sentences(text) or [text]
+        # ログの文脈（session_id, page など）をワーカースレッドに引き継ぐ
+        return [
+            self._executor.submit(contextvars.copy_context().run, self.synthesize_chunk, sentence, language)
+            for sentence in sentences
+        ]
+
+    def synthesize(self, text: str, language: str = "ja") -> bytes:
+        """全文を合成して1つのMP3として返す"""
+        futures = self._submit(text, language)
+        try:
+            return b"".join(f.result() for f in futures)
+        finally:
+            for f in futures:
+                f.cancel()
+
+    async def stream(self, text: str, language: str = "ja") -> AsyncIterator[bytes]:
+        """文ごとのMP3を順番どおりに返す（先頭の文はできた時点ですぐ返す）"""
+        futures = self._submit(text, language)
+        try:
+            for f in futures:
+                yield await asyncio.wrap_future(f)
+        finally:
+            # 途中で切断された場合は、まだ始まっていない文の合成を取り消す
+            for f in futures:
+                f.cancel()
+
+
+_synthesizer: Optional[SentenceChunkedSynthesizer] = None
+_synthesizer_lock = threading.Lock()
+
+
+def get_tts_synthesizer() -> SentenceChunkedSynthesizer:
+    """
+    プロセス共通の合成器を取得（初回呼び出し時に環境変数から作成）
+
+    TTS_MAX_WORKERS: 同時に合成する文の数（デフォルト: 4）
+    """
+    global _synthesizer
+    if _synthesizer is None:
+        with _synthesizer_lock:
+            if _synthesizer is None:
+                _synthesizer = SentenceChunkedSynthesizer(max_workers=int(os.environ.get("TTS_MAX_WORKERS", 4)))
+    return _synthesizer
+
+
+def set_tts_synthesizer(synthesizer: Optional[SentenceChunkedSynthesizer]) -> None:
+    """合成器を差し替える（ベンチマーク・オフライン実行用）"""
+    global _synthesizer
+    _synthesizer = synthesizer
+
+
+__all__ = [
+    "SentenceChunkedSynthesizer",
+    "split_sentences",
+    "gtts_synthesize",
+    "get_tts_synthesizer",
+    "set_tts_synthesizer",
+]
@@ -2,17 +2,31 @@
 Text-to-Speech ツール - ストーリーの音声読み上げ機能
 """
 
-import os
+import asyncio
 import time
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any
 from google.adk.tools import FunctionTool
-from gtts import gTTS
-from google.cloud import storage
+from .audio_cache import audio_cache, audio_cache_key, audio_object_path
+from .image_cache import IMMUTABLE_CACHE_CONTROL
+from .storage_backend import upload_bytes
+from .tts_stream import get_tts_synthesizer
+from agents.Common.logging_config import get_logger
+from agents.Common.metrics import observe_stage, track_stage
+from agents.Common.tracing import end_span, start_span
+from agents.Common.single_flight import SingleFlight
+
+logger = get_logger(__name__)
+
+# 同じテキストの同時リクエストは1回の合成にまとめる
+_audio_flights = SingleFlight("tts")
+_audio_stream_flights = SingleFlight("tts_stream")
 
 def generate_story_audio(story_text: str, language: str = "ja") -> Dict[str, Any]:
     """
     ストーリーテキストを音声に変換
     
+    同じテキスト・言語で合成済みなら、合成とアップロードを省いて既存のURLを返す
+    
     Args:
         story_text: 読み上げるストーリーテキスト
         language: 言語コード（デフォルト: "ja"）
@@ -21,47 +35,28 @@ def generate_story_audio(story_text: str, language: str = "ja") -> Dict[str, Any
         音声生成結果
     """
     try:
-        print(f"🎤 音声生成開始: {story_text[:50]}...")
-        
-        # gTTSで音声生成
-        tts = gTTS(text=story_text, lang=language, slow=False)
+        logger.info("🎤 音声生成開始", text_chars=len(story_text), language=language)
         
-        # タイムスタンプ付きのファイル名を生成
-        timestamp = int(time.time())
-        file_name = f"story_audio_{timestamp}.mp3"
+        # ファイル名は内容のハッシュ（同時リクエストでも衝突しない）
+        cache_key = audio_cache_key(story_text, language)
+        file_name = f"{cache_key}.mp3"
         
-        # 一時的にローカルに保存（メモリから直接アップロードはgTTSでは困難）
-        tts.save(file_name)
+        cloud_url = audio_cache.lookup(cache_key)
+        if cloud_url:
+            logger.info("⚡ 音声キャッシュヒット", audio_url=cloud_url)
+            return _audio_result(file_name, cloud_url, story_text, language, "音声ファイルをキャッシュから取得しました")
         
-        print(f"💾 音声ファイル保存完了: {file_name}")
+        cloud_url = _audio_flights.do(cache_key, _synthesize_and_upload, cache_key, story_text, language)
         
-        # Cloud Storageにアップロード
-        cloud_url = _upload_audio_to_cloud_storage(file_name)
-        
-        # ローカルファイルを削除（Cloud Storageアップロード成功時のみ）
-        if cloud_url and os.path.exists(file_name):
-            os.remove(file_name)
-            print(f"🗑️ ローカルファイル削除: {file_name}")
-        
-        result = {
-            "success": True,
-            "message": "音声ファイルを生成しました",
-            "audio": {
-                "file_name": file_name,
-                "cloud_url": cloud_url,
-                "language": language,
-                "duration_estimate": len(story_text) * 0.1  # 概算の再生時間（秒）
-            }
-        }
+        result = _audio_result(file_name, cloud_url, story_text, language, "音声ファイルを生成しました")
         
-        print(f"✅ 音声生成完了: {cloud_url}")
+        logger.info("✅ 音声生成完了", audio_url=cloud_url)
         return result
         
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        print(f"❌ 音声生成エラー: {e}")
-        print(f"📋 エラー詳細:\n{error_details}")
+        logger.error("❌ 音声生成エラー", error=str(e), error_details=error_details)
         return {
             "success": False,
             "message": f"音声生成エラー: {str(e)}",
@@ -69,60 +64,80 @@ def generate_story_audio(story_text: str, language: str = "ja") -> Dict[str, Any
             "audio": None
         }
 
-def _upload_audio_to_cloud_storage(file_name: str) -> str:
-    """音声ファイルをCloud Storageにアップロード"""
+def _synthesize_and_upload(cache_key: str, story_text: str, language: str) -> str:
+    # 文ごとに並列でメモリ上に合成し、順番どおりにつなげる
+    with track_stage("tts_synthesis"):
+        audio_data = get_tts_synthesizer().synthesize(story_text, language)
+    
+    logger.debug("💾 音声データ生成完了", audio_bytes=len(audio_data))
+    
+    # Cloud Storageにアップロード
+    return _upload_audio_to_cloud_storage(cache_key, audio_data)
+
+def stream_story_audio(story_text: str, language: str = "ja") -> AsyncIterator[bytes]:
+    """
+    合成しながらMP3のチャンクを返す（StreamingResponse用）
+    
+    同じテキストを同時に再生する場合は合成を1回にまとめ、同じチャンクを配る。
+    最後まで合成できた音声は、応答を待たせずにバックグラウンドでストレージに保存する
+    """
+    cache_key = audio_cache_key(story_text, language)
+    return _audio_stream_flights.stream(cache_key, lambda: _synthesize_stream(cache_key, story_text, language))
+
+async def _synthesize_stream(cache_key: str, story_text: str, language: str) -> AsyncIterator[bytes]:
+    audio_data = bytearray()
+    logger.info("🎤 音声ストリーミング開始", text_chars=len(story_text), language=language)
+    start = time.perf_counter()
+    # yield をまたぐので、現在のスパンにはせずに終了時に閉じる
+    synthesis_span = start_span("tts_synthesis", text_chars=len(story_text))
     try:
-        # 認証設定 - Cloud Run環境での認証ファイルパスを修正
-        if os.path.exists("/app/service-account-key.json"):
-            credentials_path = "/app/service-account-key.json"
-        elif os.path.exists("service-account-key.json"):
-            credentials_path = os.path.join(os.getcwd(), "service-account-key.json")
-        else:
-            # 環境変数からBase64エンコードされた認証情報を使用
-            credentials_base64 = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_BASE64')
-            if credentials_base64:
-                import base64
-                import tempfile
-                
-                # Base64デコードして一時ファイルに保存
-                credentials_json = base64.b64decode(credentials_base64).decode('utf-8')
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                    f.write(credentials_json)
-                    credentials_path = f.name
-                print(f"🔑 一時的な認証ファイルを作成: {credentials_path}")
-            else:
-                # デフォルトの認証方法を使用（Cloud Run環境での自動認証）
-                print("🔑 Cloud Run環境での自動認証を使用")
-                credentials_path = None
-        
-        if credentials_path:
-            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
-        else:
-            # Cloud Run環境での自動認証を使用する場合、環境変数をクリア
-            if 'GOOGLE_APPLICATION_CREDENTIALS' in os.environ:
-                del os.environ['GOOGLE_APPLICATION_CREDENTIALS']
-        
-        # Cloud Storage クライアント
-        from google.cloud import storage
-        client = storage.Client()
-        bucket_name = "childstory-ggl-research-3db4311e"
-        bucket = client.bucket(bucket_name)
-        
-        # ユニークなブロブ名
-        blob_name = f"story-audio/{file_name}"
-        blob = bucket.blob(blob_name)
-        
-        # ファイルをアップロード
-        blob.upload_from_filename(file_name)
-        blob.make_public()
-        
-        public_url = f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
-        print(f"☁️ Cloud Storage アップロード完了: {public_url}")
+        # 文ごとに並列で合成し、先頭の文ができた時点で返し始める
+        async for chunk in get_tts_synthesizer().stream(story_text, language):
+            audio_data.extend(chunk)
+            yield chunk
+    except BaseException as e:
+        end_span(synthesis_span, e)
+        raise
+    end_span(synthesis_span)
+    observe_stage("tts_synthesis", time.perf_counter() - start)
+    logger.info("✅ 音声ストリーミング完了", audio_bytes=len(audio_data))
+    _persist_in_background(cache_key, bytes(audio_data))
+
+# 保存中のタスク（完了前にガベージコレクトされないよう参照を保持）
+_persist_tasks = set()
+
+def _persist_in_background(cache_key: str, audio_data: bytes) -> None:
+    task = asyncio.get_running_loop().create_task(
+        asyncio.to_thread(_upload_audio_to_cloud_storage, cache_key, audio_data)
+    )
+    _persist_tasks.add(task)
+    task.add_done_callback(_persist_tasks.discard)
+
+def _audio_result(file_name: str, cloud_url: str, story_text: str, language: str, message: str) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "message": message,
+        "audio": {
+            "file_name": file_name,
+            "cloud_url": cloud_url,
+            "language": language,
+            "duration_estimate": len(story_text) * 0.1  # 概算の再生時間（秒）
+        }
+    }
+
+def _upload_audio_to_cloud_storage(cache_key: str, audio_data: bytes) -> str:
+    """音声データをCloud Storageにアップロード（共有クライアントを使用）"""
+    try:
+        # 内容のハッシュで命名したオブジェクトは変わらないので長期キャッシュさせる
+        blob_name = audio_object_path(cache_key)
+        public_url = upload_bytes(blob_name, audio_data, content_type='audio/mpeg', cache_control=IMMUTABLE_CACHE_CONTROL)
+        audio_cache.remember(cache_key, public_url)
+        logger.debug("☁️ Cloud Storage アップロード完了", audio_url=public_url)
         
         return public_url
         
     except Exception as e:
-        print(f"❌ Cloud Storage エラー: {e}")
+        logger.error("❌ Cloud Storage エラー", error=str(e))
         return None
 
 
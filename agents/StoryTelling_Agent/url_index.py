@@ -0,0 +1,94 @@
+"""
+URLインデックス - キャッシュキー → 公開URL を追記専用のログファイルに永続化する
+登録のたびにインデックス全体を書き直さず、1行追記するだけにする
+
+ファイル形式: 1行に "キー\tURL"。同じキーは後の行が優先される。
+行数が保持件数の compact_ratio 倍を超えたら、現在の内容だけを書き出して置き換える。
+複数のワーカーで同じファイルに追記しても行は混ざらない（圧縮の直後に他のワーカーが追記した分は失われることがある）。
+"""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from agents.Common.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class UrlIndexLog:
+    """
+    キー → URL の追記専用ログ
+
+    Args:
+        path: ログファイルのパス
+        max_entries: 読み込み時・圧縮時に残す件数（新しい順）
+        compact_ratio: 行数がこの倍数を超えたら圧縮する
+    """
+
+    def __init__(self, path: str, max_entries: int, compact_ratio: float = 2.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.compact_ratio = compact_ratio
+        self._lines = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self) -> "OrderedDict[str, str]":
+        """ログを読み込み、古い順に並んだ キー → URL を返す"""
+        entries: "OrderedDict[str, str]" = OrderedDict()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    key, sep, url = line.rstrip("\n").partition("\t")
+                    if not sep or not url:
+                        # 書きかけで終わった行は読み飛ばす
+                        continue
+                    entries.pop(key, None)
+                    entries[key] = url
+                    self._lines += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("⚠️ URLインデックスを読み込めません", path=self.path, error=str(e))
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return entries
+
+    def append(self, key: str, url: str, snapshot: Callable[[], Dict[str, str]]) -> None:
+        """
+        1件追記する
+
+        Args:
+            snapshot: 現在の全件（追記する1件を含む）を返す関数。圧縮する時だけ呼ばれる
+        """
+        try:
+            with self._lock:
+                if self._lines >= self.max_entries * self.compact_ratio:
+                    self._compact(snapshot())
+                    return
+                if self._file is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    # 行バッファなので、1行ずつ1回の書き込みになる
+                    self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._file.write(f"{key}\t{url}\n")
+                self._lines += 1
+        except OSError as e:
+            logger.warning("⚠️ URLインデックスの書き込みに失敗", path=self.path, error=str(e))
+
+    def _compact(self, entries: Dict[str, str]) -> None:
+        index_dir = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(index_dir, exist_ok=True)
+        # 書きかけのログを読まないよう、一時ファイルに書いてから置き換える
+        with tempfile.NamedTemporaryFile("w", dir=index_dir, suffix=".tmp", delete=False, encoding="utf-8") as f:
+            f.writelines(f"{key}\t{url}\n" for key, url in entries.items())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.replace(f.name, self.path)
+        self._lines = len(entries)
+
+
+__all__ = ["UrlIndexLog"]
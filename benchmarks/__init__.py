@@ -0,0 +1,3 @@
+"""
+オフラインベンチマーク - 実APIのクォータを消費せずに処理時間を計測する
+"""
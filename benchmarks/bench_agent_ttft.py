@@ -0,0 +1,125 @@
+"""
+会話エージェントの最初の文字までの時間 - /agent/child_care の通常応答とSSE（stream=true）を比べる
+
+Runner をレイテンシを指定できるフェイク（FakeChatRunner）に差し替えて実際のアプリを起動し、
+通常応答は全文が返るまで、SSEは最初の delta と done までの時間を計る。
+最後に、最初の delta を受け取った直後に切断し、実行が止まる（cancelled に数えられる）ことを確認する。
+
+実行方法:
+    python -m benchmarks.bench_agent_ttft --requests 20 --concurrency 4 --first-token-latency 0.8
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.fakes import FakeChatRunner
+
+AGENT_URL = "/agent/child_care"
+
+
+def percentiles(values: List[float]) -> str:
+    ordered = sorted(values)
+    quantiles = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return f"p50={quantiles[49] * 1000:.0f}ms p95={quantiles[94] * 1000:.0f}ms"
+
+
+async def request_blocking(client: httpx.AsyncClient) -> float:
+    start = time.perf_counter()
+    response = await client.get(AGENT_URL, params={"input": "あそぼう"})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def request_stream(client: httpx.AsyncClient) -> tuple:
+    """(最初の delta まで, done まで) の秒数"""
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream("GET", AGENT_URL, params={"input": "あそぼう", "stream": "true"}) as response:
+        async for line in response.aiter_lines():
+            if line == "event: delta" and first_token is None:
+                first_token = time.perf_counter() - start
+            elif line == "event: done":
+                break
+    return first_token, time.perf_counter() - start
+
+
+async def run_concurrently(count: int, concurrency: int, make_request) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            return await make_request()
+
+    return await asyncio.gather(*(limited() for _ in range(count)))
+
+
+async def disconnect_after_first_token(client: httpx.AsyncClient, runner: FakeChatRunner) -> bool:
+    """最初の delta を受け取ったら切断し、実行がキャンセルされたかを返す"""
+    cancelled_before = runner.cancelled
+    async with client.stream("GET", AGENT_URL, params={"input": "あそぼう", "stream": "true"}) as response:
+        async for line in response.aiter_lines():
+            if line == "event: delta":
+                break
+    # 切断がサーバーに伝わるまで少し待つ
+    for _ in range(50):
+        if runner.cancelled > cancelled_before:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def run(args) -> None:
+    import uvicorn
+
+    os.environ.update({
+        "GOOGLE_API_KEY": "fake",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "TRACE_EXPORTER": os.environ.get("TRACE_EXPORTER", "none"),
+    })
+    import main as app_module
+    from agents.Common.agent_sessions import create_agent_session_manager
+
+    runner = FakeChatRunner(first_token_latency=args.first_token_latency, chunk_delay=args.chunk_delay)
+    app_module.RUNNER_MAP["child_care"] = runner
+    app_module.AGENT_SESSIONS["child_care"] = create_agent_session_manager(runner)
+
+    server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=0, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        blocking = await run_concurrently(args.requests, args.concurrency, lambda: request_blocking(client))
+        streamed = await run_concurrently(args.requests, args.concurrency, lambda: request_stream(client))
+        stopped = await disconnect_after_first_token(client, runner)
+
+    server.should_exit = True
+    await serving
+
+    print(f"requests={args.requests} concurrency={args.concurrency} "
+          f"first_token_latency={args.first_token_latency}s chunk_delay={args.chunk_delay}s")
+    print(f"blocking  response:    {percentiles(blocking)}")
+    print(f"stream    first token: {percentiles([first for first, _ in streamed])}")
+    print(f"stream    done:        {percentiles([done for _, done in streamed])}")
+    print(f"disconnect stops run:  {stopped} (calls={runner.calls} completed={runner.completed} cancelled={runner.cancelled})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="各モードのリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=1, help="同時に送るリクエスト数")
+    parser.add_argument("--first-token-latency", type=float, default=0.8, help="最初の断片までの時間（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="断片ごとの遅延（秒）")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+画像生成ジョブの同時実行 - 同期版（BackgroundTasks のスレッドプールで実行）と async版を比べる
+
+フェイクの Gemini（指定秒数かかる）とフェイクGCSサーバーで、N件の画像ジョブを同時に開始し、
+成功・拒否の件数、全体の所要時間、そのモードで増えたスレッド数の最大値、イベントループの遅延
+（全ジョブを同時に開始した直後の start_lag と、その後の最大値 max_loop_lag）を表示する。
+クライアントの作成・認証情報の解決など初回だけの準備は、計測の前に1件のジョブで済ませておく。
+
+    thread: generate_story_image_parallel を anyio のスレッドプール（Starlette と同じ40スレッド）で実行
+    async:  generate_story_image_parallel_async をイベントループ上で実行
+
+実行方法:
+    python -m benchmarks.bench_async_images --jobs 2000 --concurrency 64 --image-latency 1.0
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import threading
+import time
+
+from benchmarks.fakes import FakeGCSServer, FakeGenerativeModel
+
+
+def app_threads() -> set:
+    """フェイクGCSサーバーの接続処理スレッドを除いたスレッド"""
+    return {thread.ident for thread in threading.enumerate() if "process_request_thread" not in thread.name}
+
+
+async def sample(stop: asyncio.Event, peaks: dict, baseline: set) -> None:
+    """
+    計測開始後に増えたスレッド数とイベントループの遅延（予定より遅れて起きた時間）の最大値を記録する
+
+    前のモードのスレッドプールのスレッドは残り続けるので、開始時にあったスレッド（baseline）は数えない。
+    最初の1回の遅延は、全ジョブを同じ瞬間に開始した分（start_lag）として別に記録する。
+    """
+    interval = 0.02
+    first = True
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lag = time.perf_counter() - expected
+        if first:
+            peaks["start_lag"] = lag
+            first = False
+        else:
+            peaks["loop_lag"] = max(peaks["loop_lag"], lag)
+        peaks["threads"] = max(peaks["threads"], len(app_threads() - baseline))
+
+
+async def run_mode(mode: str, jobs: int) -> None:
+    import anyio.to_thread
+
+    from agents.StoryTelling_Agent import simple_parallel_tool
+
+    async def job(index: int) -> dict:
+        # ジョブごとに本文を変え、キャッシュ・合流に当たらないようにする
+        text = f"うさぎのピョンのお話 {mode}-{index}"
+        if mode == "thread":
+            return await anyio.to_thread.run_sync(simple_parallel_tool.generate_story_image_parallel, text, "p1")
+        return await simple_parallel_tool.generate_story_image_parallel_async(text, "p1")
+
+    # 初回だけの準備（同期版: Storageクライアント、async版: httpxクライアント・認証情報）を計測前に済ませる
+    await job(-1)
+
+    stop = asyncio.Event()
+    peaks = {"threads": 0, "start_lag": 0.0, "loop_lag": 0.0}
+    sampler = asyncio.create_task(sample(stop, peaks, app_threads()))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(job(index) for index in range(jobs)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    succeeded = sum(1 for result in results if result.get("success"))
+    rejected = sum(1 for result in results if "満杯" in result.get("message", ""))
+    print(f"{mode:<7} jobs={jobs} succeeded={succeeded} rejected={rejected} wall={wall:.1f}s "
+          f"new_threads={peaks['threads']} start_lag={peaks['start_lag'] * 1000:.0f}ms "
+          f"max_loop_lag={peaks['loop_lag'] * 1000:.0f}ms")
+
+
+async def run(args) -> None:
+    with FakeGCSServer(latency=args.storage_latency) as gcs:
+        os.environ.update({
+            "GOOGLE_API_KEY": "fake",
+            "STORAGE_EMULATOR_HOST": gcs.url,
+            "STORAGE_BUCKET": "bench",
+            "IMAGE_CACHE_DIR": "off",
+            "IMAGE_CACHE_CHECK_BACKEND": "0",
+            "IMAGE_MAX_CONCURRENT": str(args.concurrency),
+            "IMAGE_MAX_ASYNC_QUEUE": str(args.jobs),
+            "IMAGE_TIMEOUT_SECONDS": "600",
+            "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        })
+        import google.generativeai as genai
+
+        from agents.Common.logging_config import configure_logging
+        from agents.StoryTelling_Agent.storage_backend import warm_up_async_storage
+
+        configure_logging(force=True)
+        genai.GenerativeModel = FakeGenerativeModel.with_latency(args.image_latency)
+        # アプリの起動時と同じく、async版のクライアントを先に準備し、読み込み済みのオブジェクトをGCの対象から外す
+        await warm_up_async_storage()
+        gc.freeze()
+        for mode in args.modes:
+            await run_mode(mode, args.jobs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=2000, help="同時に開始する画像ジョブの数")
+    parser.add_argument("--concurrency", type=int, default=64, help="async版で同時に実行するジョブの数（IMAGE_MAX_CONCURRENT）")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="画像生成1回の遅延（秒）")
+    parser.add_argument("--storage-latency", type=float, default=0.02, help="ストレージ1リクエストの遅延（秒）")
+    parser.add_argument("--modes", nargs="+", default=["thread", "async"], choices=["thread", "async"])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
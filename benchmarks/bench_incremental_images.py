@@ -0,0 +1,88 @@
+"""
+ページ単位の先行画像生成ベンチマーク
+
+全文生成後に画像生成を始める従来方式と、[PAGE_N] が閉じた瞬間に画像生成を始める
+PageImagePipeline 方式で、全ページの画像がそろうまでの時間を比較する。
+
+実行方法:
+    python -m benchmarks.bench_incremental_images --chunk-delay 0.05 --image-latency 1.0
+"""
+
+import argparse
+import asyncio
+import re
+import time
+
+from agents.StoryTelling_Agent.story_stream import PageImagePipeline, StoryPageParser
+from benchmarks.fakes import FakeImageBackend, FakeStoryLLM
+
+
+async def run_sequential(llm: FakeStoryLLM, images: FakeImageBackend) -> dict:
+    """従来方式: 全文 → 正規表現で分割 → P1 → P2(参照) → P3(参照)"""
+    start = time.perf_counter()
+    text = await llm.complete()
+    pages = {
+        int(m.group(1)): m.group(2).strip()
+        for m in re.finditer(r'\[PAGE_(\d+)\]\s*(.*?)\s*(?=\[PAGE_\d+\]|$)', text, re.DOTALL)
+    }
+    text_done = time.perf_counter() - start
+    timings = {}
+    reference = None
+    for page_num in sorted(pages):
+        if reference:
+            result = await asyncio.to_thread(images.generate_with_reference, pages[page_num], reference, f"p{page_num}")
+        else:
+            result = await asyncio.to_thread(images.generate, pages[page_num], f"p{page_num}")
+        reference = result["images"][0]["cloud_url"]
+        timings[page_num] = time.perf_counter() - start
+    return {"text": text_done, "images": timings}
+
+
+async def run_incremental(llm: FakeStoryLLM, images: FakeImageBackend) -> dict:
+    """新方式: ページが閉じるたびに PageImagePipeline へ投入"""
+    start = time.perf_counter()
+    timings = {}
+    pipeline = PageImagePipeline(
+        generate_image=images.generate,
+        generate_image_with_reference=images.generate_with_reference,
+        on_image=lambda page_num, url: timings.__setitem__(page_num, time.perf_counter() - start),
+    )
+    parser = StoryPageParser()
+    async for chunk in llm.stream():
+        for page_num, text in parser.feed(chunk):
+            pipeline.page_closed(page_num, text)
+    for page_num, text in parser.close():
+        pipeline.page_closed(page_num, text)
+    text_done = time.perf_counter() - start
+    pipeline.close()
+    for page_num in sorted(pipeline._tasks):
+        await pipeline.wait(page_num)
+    return {"text": text_done, "images": timings}
+
+
+def _report(name: str, result: dict) -> None:
+    images = ", ".join(f"P{p}={t:.2f}s" for p, t in sorted(result["images"].items()))
+    print(f"{name:<12} text={result['text']:.2f}s  {images}  total={max(result['images'].values()):.2f}s")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=8, help="LLMが1回に返す文字数")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="LLMの断片ごとの遅延（秒）")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="画像1枚の生成時間（秒）")
+    args = parser.parse_args()
+
+    llm = FakeStoryLLM(chunk_size=args.chunk_size, chunk_delay=args.chunk_delay)
+    sequential = await run_sequential(llm, FakeImageBackend(args.image_latency))
+    incremental = await run_incremental(llm, FakeImageBackend(args.image_latency))
+
+    _report("sequential", sequential)
+    _report("incremental", incremental)
+    before = max(sequential["images"].values())
+    after = max(incremental["images"].values())
+    print(f"wall-clock reduction: {before - after:.2f}s ({(1 - after / before) * 100:.1f}%)")
+    print(f"P1 image ready: {sequential['images'][1]:.2f}s -> {incremental['images'][1]:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
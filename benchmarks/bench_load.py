@@ -0,0 +1,257 @@
+"""
+オフライン負荷試験 - 実際のアプリ（main.app）に、story_script.js と同じ順番でリクエストを送る
+
+Gemini（物語・画像）、Cloud Storage、gTTS をレイテンシを指定できるフェイクに差し替え、
+N人の読者を同時に走らせて、エンドポイントごとの p50/p95/p99 と requests/s を表示する。
+アプリは同じプロセス内の uvicorn で起動するので、BackgroundTasks やSSEも本番と同じように動く。
+
+読者1人の流れ（story_script.js と同じ）:
+    POST /start?stream=1（P1が届いたら先へ進み、残りのイベントは裏で done まで読む）
+    → ページごとに読み上げ音声を再生（/next が先行合成済みの audio_url を返せばそれを、
+      なければ GET /audio-stream をリダイレクト込みで取得）
+    → 最後のページ以外は、読み上げと並行して GET /image-events/{id}（SSE）で次のページの画像を待ち、
+      聞き終わって画像もそろったら POST /next
+
+実行方法:
+    python -m benchmarks.bench_load --readers 20 --stories 2 --image-latency 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fakes import FakeGCSServer, FakeGenerativeModel, FakeStoryRunner, FakeTTSBackend
+
+TOPICS = ["動物のお話", "冒険のお話", "おひめさまのお話"]
+
+
+class LatencyRecorder:
+    """エンドポイントごとの所要時間とエラー数"""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool = True) -> None:
+        self.durations[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self, wall_seconds: float) -> None:
+        print(f"{'endpoint':<30} {'count':>6} {'errors':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>7}")
+        for endpoint, durations in self.durations.items():
+            ordered = sorted(durations)
+            quantiles = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+            print(
+                f"{endpoint:<30} {len(ordered):>6} {self.errors[endpoint]:>6} "
+                f"{quantiles[49] * 1000:>7.0f}ms {quantiles[94] * 1000:>7.0f}ms {quantiles[98] * 1000:>7.0f}ms "
+                f"{len(ordered) / wall_seconds:>7.1f}"
+            )
+
+
+async def timed(recorder: LatencyRecorder, endpoint: str, request) -> httpx.Response:
+    start = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        recorder.record(endpoint, time.perf_counter() - start, ok=False)
+        raise
+    recorder.record(endpoint, time.perf_counter() - start, ok=response.status_code < 400)
+    return response
+
+
+async def iter_sse(response: httpx.Response):
+    """SSEの (イベント名, データ) を順に返す"""
+    event = None
+    async for line in response.aiter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            yield event, json.loads(line[len("data: "):])
+
+
+async def read_start_stream(client: httpx.AsyncClient, recorder: LatencyRecorder, topic: str,
+                            first_page: asyncio.Future) -> None:
+    """SSEの /start を done まで読む。P1が届いたら first_page に (session_id, 本文) を設定する"""
+    start = time.perf_counter()
+    session_id = None
+    ok = False
+    try:
+        async with client.stream(
+            "POST", "/agent/storytelling/start", params={"stream": 1},
+            json={"topic": topic, "preload_audio": True},
+        ) as response:
+            async for event, data in iter_sse(response):
+                if event == "session":
+                    session_id = data["session_id"]
+                elif event == "page" and data["page"] == 1 and not first_page.done():
+                    recorder.record("start (first page)", time.perf_counter() - start)
+                    first_page.set_result((session_id, data["text"]))
+                elif event == "done":
+                    break
+            ok = response.status_code < 400
+    finally:
+        recorder.record("start (done)", time.perf_counter() - start, ok=ok)
+        if not first_page.done():
+            first_page.set_exception(RuntimeError("P1を受信できませんでした"))
+
+
+async def play_audio(client: httpx.AsyncClient, recorder: LatencyRecorder, text: str, audio_url) -> None:
+    """<audio> と同じく、リダイレクトをたどって最初のバイトまでと全体の時間を記録する"""
+    if audio_url:
+        endpoint, request = "audio-preloaded", client.stream("GET", audio_url)
+    else:
+        endpoint = "audio-stream"
+        request = client.stream(
+            "GET", "/agent/storytelling/audio-stream",
+            params={"text": text, "language": "ja"}, follow_redirects=True,
+        )
+    start = time.perf_counter()
+    try:
+        async with request as response:
+            first_byte = None
+            async for _ in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+            ok = response.status_code < 400
+    except httpx.HTTPError:
+        recorder.record(f"{endpoint} (first byte)", time.perf_counter() - start, ok=False)
+        raise
+    recorder.record(f"{endpoint} (first byte)", first_byte if first_byte is not None else time.perf_counter() - start, ok=ok)
+    recorder.record(f"{endpoint} (done)", time.perf_counter() - start, ok=ok)
+
+
+async def wait_next_image(client: httpx.AsyncClient, recorder: LatencyRecorder, session_id: str, page: int) -> None:
+    """/image-events を購読し、指定ページの画像（失敗を含む）が届いたら切断する"""
+    start = time.perf_counter()
+    ok = False
+    try:
+        async with client.stream("GET", f"/agent/storytelling/image-events/{session_id}") as response:
+            async for event, data in iter_sse(response):
+                if event == "done" or (event == "image" and data["page"] == page):
+                    ok = response.status_code < 400
+                    break
+    finally:
+        recorder.record("image-events (next)", time.perf_counter() - start, ok=ok)
+
+
+async def run_reader(client: httpx.AsyncClient, recorder: LatencyRecorder, reader: int,
+                     stories: int, think_time: float, unique_topics: bool) -> None:
+    # アプリのパッケージは install_fakes() で環境変数を設定した後に読み込む
+    from agents.StoryTelling_Agent.story_stream import MAX_STORY_PAGES
+
+    for story_index in range(stories):
+        topic = random.choice(TOPICS)
+        if unique_topics:
+            topic = f"{topic}（読者{reader}-{story_index}）"
+        first_page = asyncio.get_running_loop().create_future()
+        start_stream = asyncio.create_task(read_start_stream(client, recorder, topic, first_page))
+        session_id, text = await first_page
+        audio_url = None
+        page = 1
+        while True:
+            # 読み上げを聞いている時間（音声の取得を含む）
+            listening = asyncio.gather(play_audio(client, recorder, text, audio_url), asyncio.sleep(think_time))
+            if "おしまい" in text or page >= MAX_STORY_PAGES:
+                await listening
+                break
+            # 聞いている間に次のページの画像を待ち、両方そろったら「続きを読む」
+            await asyncio.gather(listening, wait_next_image(client, recorder, session_id, page + 1))
+            response = await timed(recorder, "next", client.post(
+                "/agent/storytelling/next", json={"session_id": session_id}
+            ))
+            data = response.json()
+            text, audio_url = data.get("text_result", ""), data.get("audio_url")
+            page += 1
+        await start_stream
+
+
+def install_fakes(args, gcs_url: str, workdir: str):
+    """main をインポートする前に、環境変数とフェイクを設定する"""
+    os.environ.update({
+        "GOOGLE_API_KEY": "fake",
+        "STORAGE_EMULATOR_HOST": gcs_url,
+        "STORAGE_BUCKET": "bench",
+        "IMAGE_CACHE_DIR": "off",
+        "AUDIO_CACHE_INDEX": os.path.join(workdir, "audio-index.log"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "TRACE_EXPORTER": os.environ.get("TRACE_EXPORTER", "none"),
+    })
+    import google.generativeai as genai
+
+    from agents.StoryTelling_Agent.tts_stream import SentenceChunkedSynthesizer, set_tts_synthesizer
+
+    image_model = FakeGenerativeModel.with_latency(args.image_latency)
+    genai.GenerativeModel = image_model
+    tts = FakeTTSBackend(args.tts_latency, args.tts_per_char)
+    set_tts_synthesizer(SentenceChunkedSynthesizer(tts.synthesize, max_workers=args.tts_workers))
+
+    import main as app_module
+    from agents.Common.agent_sessions import create_agent_session_manager
+
+    runner = FakeStoryRunner(chunk_delay=args.chunk_delay, unique=not args.shared_stories)
+    app_module.RUNNER_MAP["storytelling"] = runner
+    app_module.AGENT_SESSIONS["storytelling"] = create_agent_session_manager(runner)
+    return app_module, runner, image_model
+
+
+async def run(args) -> None:
+    import uvicorn
+
+    with FakeGCSServer(latency=args.storage_latency) as gcs, tempfile.TemporaryDirectory() as workdir:
+        app_module, runner, image_model = install_fakes(args, gcs.url, workdir)
+        server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=0, log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        port = server.servers[0].sockets[0].getsockname()[1]
+
+        recorder = LatencyRecorder()
+        limits = httpx.Limits(max_connections=args.readers * 4, max_keepalive_connections=args.readers * 4)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                run_reader(client, recorder, reader, args.stories, args.think_time, args.unique_topics)
+                for reader in range(args.readers)
+            ))
+            wall = time.perf_counter() - start
+
+        server.should_exit = True
+        await serving
+
+    print(f"readers={args.readers} stories/reader={args.stories} wall={wall:.1f}s "
+          f"runner_calls={runner.calls} image_calls={image_model.calls} "
+          f"storage_requests={gcs.requests}")
+    recorder.report(wall)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=10, help="同時に読む読者の数")
+    parser.add_argument("--stories", type=int, default=1, help="読者1人が読む物語の数")
+    parser.add_argument("--think-time", type=float, default=0.5, help="ページごとに読み上げを聞く時間（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="物語テキストの断片ごとの遅延（秒）")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="画像生成1回の遅延（秒）")
+    parser.add_argument("--storage-latency", type=float, default=0.02, help="ストレージ1リクエストの遅延（秒）")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="読み上げ合成1回の固定遅延（秒）")
+    parser.add_argument("--tts-per-char", type=float, default=0.005, help="読み上げ合成の1文字あたりの時間（秒）")
+    parser.add_argument("--tts-workers", type=int, default=4, help="同時に合成する文の数")
+    parser.add_argument("--unique-topics", action="store_true",
+                        help="読者ごとに別のお話の種類にする（同じ種類の物語生成の合流を無効にする）")
+    parser.add_argument("--shared-stories", action="store_true",
+                        help="毎回同じ本文を返す（画像・音声のキャッシュが効く状態を計測する）")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Cloud Storage アップロードのオーバーヘッド計測
+
+従来方式（アップロードごとに認証情報を解決し、一時キーファイルを書き、新しい storage.Client を作る）と、
+共有クライアント方式（storage_backend.upload_bytes）で、1回あたりのアップロード時間を比較する。
+ローカルのフェイクGCSサーバーを使うので、実際のバケットやクォータは使わない。
+
+実行方法:
+    python -m benchmarks.bench_storage_upload --uploads 200 --size 200000
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fakes import FakeGCSServer
+
+# 従来方式の一時ファイル書き出しを再現するためのダミーキー
+_DUMMY_KEY = base64.b64encode(json.dumps({"type": "service_account", "private_key": "x" * 1700}).encode()).decode()
+
+
+def upload_per_call(blob_name: str, data: bytes) -> str:
+    """従来方式: 認証情報の解決とクライアント作成をアップロードごとに行う"""
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import storage
+
+    credentials_json = base64.b64decode(_DUMMY_KEY).decode("utf-8")
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
+        f.write(credentials_json)
+    os.environ["BENCH_LEAKED_KEY_FILE"] = f.name
+    client = storage.Client(project="local", credentials=AnonymousCredentials())
+    blob = client.bucket("bench").blob(blob_name)
+    blob.upload_from_string(data, content_type="image/png")
+    blob.make_public()
+    os.remove(f.name)  # 従来コードでは削除されずに残っていた
+    return blob_name
+
+
+def upload_shared(blob_name: str, data: bytes) -> str:
+    """新方式: 共有クライアントでアップロード"""
+    from agents.StoryTelling_Agent.storage_backend import upload_bytes
+
+    return upload_bytes(blob_name, data, content_type="image/png")
+
+
+def measure(name: str, upload, uploads: int, data: bytes, server: FakeGCSServer) -> float:
+    connections_before = server.connections
+    durations = []
+    for i in range(uploads):
+        start = time.perf_counter()
+        upload(f"story-images/bench_{name}_{i}.png", data)
+        durations.append(time.perf_counter() - start)
+    mean = statistics.mean(durations) * 1000
+    p95 = sorted(durations)[int(len(durations) * 0.95) - 1] * 1000
+    print(
+        f"{name:<10} mean={mean:.2f}ms  p95={p95:.2f}ms  "
+        f"new_connections={server.connections - connections_before}"
+    )
+    return mean
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=100, help="アップロード回数")
+    parser.add_argument("--size", type=int, default=200_000, help="1ファイルのバイト数")
+    args = parser.parse_args()
+
+    data = os.urandom(args.size)
+    with FakeGCSServer() as server:
+        os.environ["STORAGE_EMULATOR_HOST"] = server.url
+        os.environ["STORAGE_BUCKET"] = "bench"
+        from agents.StoryTelling_Agent.storage_backend import reset_storage_client
+
+        reset_storage_client()
+        before = measure("per-call", upload_per_call, args.uploads, data, server)
+        after = measure("shared", upload_shared, args.uploads, data, server)
+    print(f"per-upload overhead saved: {before - after:.2f}ms ({(1 - after / before) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
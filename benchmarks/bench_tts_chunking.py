@@ -0,0 +1,67 @@
+"""
+文単位の並列読み上げ合成ベンチマーク
+
+ページ全体を1回で合成する従来方式と、文ごとに並列で合成して先頭の文から返す
+SentenceChunkedSynthesizer 方式で、最初のバイトが届くまでの時間（TTFB）と全体の時間を
+ページの長さごとに比較する。フェイクのTTSを使うので、gTTSへのアクセスは発生しない。
+
+実行方法:
+    python -m benchmarks.bench_tts_chunking --base-latency 0.2 --per-char 0.005 --workers 4
+"""
+
+import argparse
+import asyncio
+import time
+
+from agents.StoryTelling_Agent.tts_stream import SentenceChunkedSynthesizer, split_sentences
+from benchmarks.fakes import FAKE_STORY_TEXT, FakeTTSBackend
+
+
+def page_text(sentences: int) -> str:
+    """ベンチマーク用の物語から指定した文数のページを作る"""
+    pool = split_sentences(FAKE_STORY_TEXT.replace("[PAGE_1]", "").replace("[PAGE_2]", "").replace("[PAGE_3]", ""))
+    return "".join(pool[i % len(pool)] for i in range(sentences))
+
+
+async def run_whole(tts: FakeTTSBackend, text: str) -> dict:
+    """従来方式: ページ全体を1回で合成してから返す"""
+    start = time.perf_counter()
+    await asyncio.to_thread(tts.synthesize, text, "ja")
+    elapsed = time.perf_counter() - start
+    return {"ttfb": elapsed, "total": elapsed}
+
+
+async def run_chunked(synthesizer: SentenceChunkedSynthesizer, text: str) -> dict:
+    """新方式: 文ごとに並列で合成し、順番どおりに返す"""
+    start = time.perf_counter()
+    ttfb = None
+    async for _ in synthesizer.stream(text, "ja"):
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+    return {"ttfb": ttfb, "total": time.perf_counter() - start}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-latency", type=float, default=0.2, help="1回の合成の固定遅延（秒）")
+    parser.add_argument("--per-char", type=float, default=0.005, help="1文字あたりの合成時間（秒）")
+    parser.add_argument("--workers", type=int, default=4, help="同時に合成する文の数")
+    parser.add_argument("--sentences", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="ページの文数")
+    args = parser.parse_args()
+
+    tts = FakeTTSBackend(args.base_latency, args.per_char)
+    synthesizer = SentenceChunkedSynthesizer(tts.synthesize, max_workers=args.workers)
+
+    print(f"{'sentences':>9} {'chars':>6}  {'whole ttfb/total':>18}  {'chunked ttfb':>12} {'chunked total':>13}")
+    for sentences in args.sentences:
+        text = page_text(sentences)
+        whole = await run_whole(tts, text)
+        chunked = await run_chunked(synthesizer, text)
+        print(
+            f"{sentences:>9} {len(text):>6}  {whole['total']:>17.2f}s  "
+            f"{chunked['ttfb']:>11.2f}s {chunked['total']:>12.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,322 @@
+"""
+ベンチマーク用のフェイク実装 - レイテンシを指定できるLLM・画像生成・読み上げ合成バックエンド
+"""
+
+import asyncio
+import io
+import itertools
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict
+
+# ベンチマーク用の3ページの物語
+FAKE_STORY_TEXT = """[PAGE_1]
+深い森の奥に、ふわふわの毛を持つ小さなうさぎのピョンが住んでいました。ピョンはいつも元気いっぱいで、ぴょんぴょん跳ねるのが大好きでした。
+
+[PAGE_2]
+ある晴れた朝、ピョンはタンポポの綿毛を追いかけて森の奥へ。迷子になったこりすのクルミに出会いました。
+
+[PAGE_3]
+ピョンはクルミをおうちまで送りとどけ、ふたりはなかよしになりました。おしまい。
+"""
+
+
+class FakeStoryLLM:
+    """一定間隔でテキスト断片を返すフェイクLLM"""
+
+    def __init__(self, text: str = FAKE_STORY_TEXT, chunk_size: int = 8, chunk_delay: float = 0.05):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+
+    async def stream(self) -> AsyncIterator[str]:
+        for i in range(0, len(self.text), self.chunk_size):
+            await asyncio.sleep(self.chunk_delay)
+            yield self.text[i:i + self.chunk_size]
+
+    async def complete(self) -> str:
+        return "".join([chunk async for chunk in self.stream()])
+
+
+class FakeStoryRunner:
+    """
+    InMemoryRunner の代わりに FakeStoryLLM の断片をSSEモードの差分イベントとして返すフェイク
+
+    セッション管理は ADK の InMemorySessionService をそのまま使う。
+    unique=True の場合は呼び出しごとに本文を変え、画像・音声のキャッシュに当たらないようにする。
+    """
+
+    def __init__(self, app_name: str = "storytelling", chunk_size: int = 8, chunk_delay: float = 0.05,
+                 unique: bool = True):
+        from google.adk.sessions import InMemorySessionService
+
+        self.app_name = app_name
+        self.session_service = InMemorySessionService()
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.unique = unique
+        self.calls = 0
+        self._counter = itertools.count(1)
+
+    def _story_text(self) -> str:
+        if not self.unique:
+            return FAKE_STORY_TEXT
+        number = next(self._counter)
+        return re.sub(r"(\[PAGE_\d+\]\n)", rf"\g<1>（第{number}話）", FAKE_STORY_TEXT)
+
+    async def run_async(self, user_id: str, session_id: str, new_message, run_config=None):
+        self.calls += 1
+        llm = FakeStoryLLM(self._story_text(), self.chunk_size, self.chunk_delay)
+        async for chunk in llm.stream():
+            yield SimpleNamespace(partial=True, content=SimpleNamespace(parts=[SimpleNamespace(text=chunk)]))
+
+
+class FakeChatRunner:
+    """
+    InMemoryRunner の代わりに、最初の断片まで first_token_latency 秒かかる会話の応答を返すフェイク
+
+    run_async はSSEモード（run_config で指定）なら差分イベントを、それ以外は全文を1つのイベントで返す。
+    run は同期版で、全文がそろうまでブロックする。途中でキャンセルされた実行は cancelled に数える。
+    """
+
+    def __init__(self, app_name: str = "child_care", text: str = "こんにちは！うさぎのピョンだよ。きょうはなにしてあそぶ？しりとりもできるよ。",
+                 first_token_latency: float = 0.5, chunk_size: int = 4, chunk_delay: float = 0.05):
+        from google.adk.sessions import InMemorySessionService
+
+        self.app_name = app_name
+        self.session_service = InMemorySessionService()
+        self.text = text
+        self.first_token_latency = first_token_latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self.completed = 0
+        self.cancelled = 0
+
+    def _total_latency(self) -> float:
+        chunks = -(-len(self.text) // self.chunk_size)
+        return self.first_token_latency + self.chunk_delay * (chunks - 1)
+
+    async def run_async(self, user_id: str, session_id: str, new_message, run_config=None):
+        self.calls += 1
+        streaming = getattr(getattr(run_config, "streaming_mode", None), "value", None) == "sse"
+        try:
+            if not streaming:
+                await asyncio.sleep(self._total_latency())
+                yield SimpleNamespace(partial=False, content=SimpleNamespace(parts=[SimpleNamespace(text=self.text)]))
+                self.completed += 1
+                return
+            await asyncio.sleep(self.first_token_latency)
+            for i in range(0, len(self.text), self.chunk_size):
+                if i:
+                    await asyncio.sleep(self.chunk_delay)
+                yield SimpleNamespace(partial=True, content=SimpleNamespace(parts=[SimpleNamespace(text=self.text[i:i + self.chunk_size])]))
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+        self.completed += 1
+
+    def run(self, user_id: str, session_id: str, new_message, run_config=None):
+        self.calls += 1
+        time.sleep(self._total_latency())
+        self.completed += 1
+        yield SimpleNamespace(partial=False, content=SimpleNamespace(parts=[SimpleNamespace(text=self.text)]))
+
+
+def fake_png(size: int = 64) -> bytes:
+    """参照画像として読み込めるPNG"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (250, 220, 180)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeGenerativeModel:
+    """
+    genai.GenerativeModel の代わりに、指定秒数ブロックしてから画像1枚の応答を返すフェイク
+    （generate_content_async はブロックせずに待つ）
+
+    使い方: genai.GenerativeModel = FakeGenerativeModel.with_latency(1.0)
+    """
+
+    latency = 1.0
+    calls = 0
+    _png = None
+
+    def __init__(self, model_name: str, **kwargs):
+        self.model_name = model_name
+
+    @classmethod
+    def with_latency(cls, latency: float) -> type:
+        return type(cls.__name__, (cls,), {"latency": latency, "calls": 0})
+
+    def generate_content(self, contents, request_options=None, **kwargs):
+        type(self).calls += 1
+        time.sleep(self.latency)
+        return self._response()
+
+    async def generate_content_async(self, contents, request_options=None, **kwargs):
+        type(self).calls += 1
+        await asyncio.sleep(self.latency)
+        return self._response()
+
+    @staticmethod
+    def _response() -> SimpleNamespace:
+        if FakeGenerativeModel._png is None:
+            FakeGenerativeModel._png = fake_png()
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=FakeGenerativeModel._png, mime_type="image/png"))
+        candidate = SimpleNamespace(content=SimpleNamespace(parts=[part]))
+        return SimpleNamespace(candidates=[candidate], prompt_feedback=None)
+
+
+class FakeImageBackend:
+    """指定秒数ブロックしてから成功結果を返すフェイク画像生成（ツール関数と同じ戻り値形式）"""
+
+    def __init__(self, latency: float = 1.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _result(self, image_type: str) -> Dict[str, Any]:
+        self.calls += 1
+        return {
+            "success": True,
+            "message": "fake",
+            "images": [{"id": 1, "cloud_url": f"https://fake.local/{image_type}_{self.calls}.png"}],
+        }
+
+    def generate(self, story_content: str, image_type: str) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self._result(image_type)
+
+    def generate_with_reference(self, story_content: str, reference_image_url: str, image_type: str) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self._result(image_type)
+
+
+class FakeTTSBackend:
+    """文字数に比例して時間がかかるフェイク読み上げ合成（gTTSの待ち時間を模擬）"""
+
+    def __init__(self, base_latency: float = 0.2, per_char: float = 0.005):
+        self.base_latency = base_latency
+        self.per_char = per_char
+        self.calls = 0
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        self.calls += 1
+        time.sleep(self.base_latency + self.per_char * len(text))
+        # 1文字あたり約1KBのダミーMP3フレーム
+        return b"\xff\xfb" + b"\x00" * (len(text) * 1024)
+
+
+class FakeGCSServer:
+    """
+    Cloud Storage JSON APIの最小限のフェイクサーバー（STORAGE_EMULATOR_HOST に指定して使う）
+
+    アップロード・ACL更新などのリクエストには常にオブジェクトのメタデータを返す。
+    HTTP/1.1 keep-alive に対応しているので、接続の再利用の有無が計測結果に反映される。
+    """
+
+    def __init__(self, latency: float = 0.0):
+        import http.server
+        import json
+        import threading
+        from urllib.parse import parse_qs, unquote, urlparse
+
+        server = self
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self.objects: Dict[str, bytes] = {}
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                # ヘッダーと本体を1回の送信にまとめる（分けて送ると keep-alive 接続で
+                # Nagle アルゴリズムと遅延ACKにより約40ms待たされ、計測結果がゆがむ）
+                self._headers_buffer.append(b"\r\n")
+                self.wfile.write(b"".join(self._headers_buffer) + body)
+                self._headers_buffer = []
+
+            def _handle(self):
+                server.requests += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = self.rfile.read(length) if length else b""
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                parts = url.path.strip("/").split("/")
+                json_api = parts[0] in ("storage", "upload")
+                if self.command == "GET" and not json_api and len(parts) >= 2:
+                    # 公開URL（/{bucket}/{name}）でのダウンロード
+                    data = server.objects.get("/".join(parts[1:]))
+                    if data is None:
+                        return self._respond(404, b"{}")
+                    return self._respond(200, data, "application/octet-stream")
+                # JSON API: /storage/v1/b/{bucket}/o/{name}[/acl など]（name はURLエンコードされた1セグメント）
+                object_index = parts.index("o") + 1 if json_api and "o" in parts else None
+                object_name = unquote(parts[object_index]) if object_index is not None and object_index < len(parts) else None
+                subresource = object_index is not None and object_index + 1 < len(parts)
+                if self.command == "GET" and object_name is not None and not subresource:
+                    # メタデータ取得（exists）・ダウンロード（alt=media）
+                    data = server.objects.get(object_name)
+                    if data is None:
+                        return self._respond(404, b"{}")
+                    if query.get("alt") == ["media"]:
+                        return self._respond(200, data, "application/octet-stream")
+                name = query.get("name", [object_name or "object"])[0]
+                if "upload" in parts:
+                    name, payload = self._parse_upload(name, payload)
+                    server.objects[name] = payload
+                bucket = parts[parts.index("b") + 1] if "b" in parts else "bucket"
+                body = {"kind": "storage#object", "name": name, "bucket": bucket, "generation": "1", "acl": []}
+                self._respond(200, json.dumps(body).encode())
+
+            def _parse_upload(self, name: str, payload: bytes):
+                # multipart/related: 1つ目がメタデータ(JSON)、2つ目が本体
+                content_type = self.headers.get("Content-Type", "")
+                if "boundary=" not in content_type:
+                    return name, payload
+                boundary = content_type.split("boundary=")[1].strip('"').encode()
+                sections = [p for p in payload.split(b"--" + boundary) if p.strip(b"-\r\n")]
+                if len(sections) < 2:
+                    return name, payload
+                metadata = json.loads(sections[0].split(b"\r\n\r\n", 1)[1])
+                body = sections[1].split(b"\r\n\r\n", 1)[1]
+                return metadata.get("name", name), body[:-2] if body.endswith(b"\r\n") else body
+
+            do_GET = do_POST = do_PUT = do_PATCH = _handle
+
+        class Server(http.server.ThreadingHTTPServer):
+            # 読者が公開URLから音声・画像を同時に取得しても接続を拒否しないよう、listen の待ち行列を広げる
+            request_queue_size = 128
+
+        self._httpd = Server(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeGCSServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
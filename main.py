@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Request, HTTPException, Query, BackgroundTasks
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
@@ -7,10 +7,29 @@ from pathlib import Path
 from agents.Child_Care_Agent import root_agent as child_care_agent
 from agents.StoryTelling_Agent import root_agent as storytelling_agent
 from agents.StoryTelling_Agent.simple_parallel_tool import get_last_image_result, clear_last_image_result
+from agents.Common.agent_sessions import create_agent_session_manager
+from agents.Common.logging_config import bind_contextvars, configure_logging, get_logger
+from agents.Common.record_replay import wrap_runner
+from agents.Common.metrics import observe_stage, register_counter, register_gauge, render_metrics
+from agents.Common.tracing import TracingMiddleware, configure_tracing, end_span, span, start_span
+from agents.Common.session_store import create_session_store
+from agents.Common.single_flight import SingleFlight, normalize_key, single_flight_stats
+from agents.StoryTelling_Agent.image_notifier import ImageNotifier
+from agents.StoryTelling_Agent.image_scheduler import get_image_scheduler
+from agents.StoryTelling_Agent.audio_cache import audio_cache, audio_cache_key
+from agents.StoryTelling_Agent.image_cache import image_cache
+from agents.StoryTelling_Agent.reference_cache import reference_image_cache
+from agents.StoryTelling_Agent.storage_backend import LocalStorageBackend, close_async_http_client, get_storage_backend, warm_up_async_storage
+from agents.StoryTelling_Agent.story_library import create_story_library, run_refresh_loop
+from agents.StoryTelling_Agent.story_stream import StoryPageParser, PageImagePipeline, iter_story_text, format_sse
 from google.adk.runners import InMemoryRunner
 from google.genai.types import Part, UserContent
 # ToolOutputEventのインポートを削除（利用できないため）
+import asyncio
+import gc
 import os
+import time
+import uuid
 import uvicorn
 import yaml
 
@@ -20,25 +39,106 @@ BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "src"
 # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
 
-# セッション全体のデータを保存する辞書
-SESSIONS = {}
+# セッションごとのページ画像生成パイプライン（生成中のジョブを保持）
+IMAGE_PIPELINES = {}
+# 画像完成のプッシュ通知
+IMAGE_NOTIFIER = ImageNotifier()
+# next_page で画像の完成を待つ最大秒数
+IMAGE_WAIT_TIMEOUT = 15
+# 共有ストア（Redis）使用時に、他のワーカーで完成した画像をストアから確認する間隔（秒）
+# 完成通知はプロセス内にしか届かないため、スティッキーセッションなしでも待ちすぎないようにする
+IMAGE_WAIT_POLL_INTERVAL = 0.5
+# 同じお話の種類で同時に始まった物語の生成を1回にまとめる
+STORY_FLIGHTS = SingleFlight("story_text")
+# 実行中のページ音声の先行合成タスク（完了前に回収されないよう保持）
+AUDIO_PRELOAD_TASKS = set()
 # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
 
-# 環境変数の読み込み
+# 環境変数の読み込み（読み込んだキーを返す。ログの設定前なので、ここではログを出さない）
 def load_env_files():
     env_files = ['api_key_env.yaml', 'env.yaml']
+    loaded = []
     for env_file in env_files:
         if os.path.exists(env_file):
             with open(env_file, 'r') as f:
                 env_vars = yaml.safe_load(f)
                 for key, value in env_vars.items():
                     os.environ[key] = str(value)
-                    print(f"Loaded env var: {key}")
+                    loaded.append(key)
+    return loaded
 
-load_env_files()
+loaded_env_keys = load_env_files()
+# 環境変数（LOG_LEVEL など）を読み込んだ後にログを設定する
+configure_logging()
+configure_tracing()
+logger = get_logger(__name__)
+if loaded_env_keys:
+    logger.info("🔧 環境変数を読み込み", keys=loaded_env_keys)
+
+# セッション全体のデータを保存するストア（LRU+TTLで自動破棄、SESSION_STORE_URLでRedisに切替）
+# セッション破棄時に通知用のイベントも破棄する
+SESSIONS = create_session_store(on_evict=IMAGE_NOTIFIER.discard)
+# 事前生成したお話のライブラリ（トップページのお話の種類ごと）
+STORY_LIBRARY = create_story_library()
+# ライブラリの定期更新タスク（回収されないよう保持）
+LIBRARY_TASKS = set()
+# ADKセッションの期限切れ削除タスク（回収されないよう保持）
+AGENT_SESSION_TASKS = set()
+# ストレージの事前準備タスク（回収されないよう保持）
+STORAGE_TASKS = set()
+# 接続元を X-Forwarded-For の後ろから何番目で判断するか（信頼できるプロキシの数、0 なら直接の接続元）
+FORWARDED_HOPS = int(os.environ.get("FORWARDED_HOPS", 1))
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def bind_image_notifier():
+    # バックグラウンドスレッドからの通知をこのイベントループへ配送する
+    IMAGE_NOTIFIER.bind_loop(asyncio.get_running_loop())
+
+@app.on_event("startup")
+async def load_story_library():
+    # ライブラリがなくても起動は止めない（その場で生成する）
+    await asyncio.to_thread(STORY_LIBRARY.load)
+    task = asyncio.get_running_loop().create_task(run_refresh_loop(STORY_LIBRARY, RUNNER_MAP["storytelling"]))
+    LIBRARY_TASKS.add(task)
+    task.add_done_callback(LIBRARY_TASKS.discard)
+
+@app.on_event("startup")
+async def start_agent_session_sweepers():
+    # 使われなくなったADKセッションを定期的に削除する
+    for manager in AGENT_SESSIONS.values():
+        task = asyncio.get_running_loop().create_task(manager.run_sweeper())
+        AGENT_SESSION_TASKS.add(task)
+        task.add_done_callback(AGENT_SESSION_TASKS.discard)
+
+@app.on_event("startup")
+async def freeze_startup_objects():
+    # 起動時に読み込んだモジュール（ADK・Google Cloudのライブラリ等で数十万オブジェクト）をGCの対象から外す
+    # （リクエスト中のフルGCでイベントループが数百ミリ秒止まらないようにする）
+    gc.freeze()
+
+async def warm_up_storage():
+    try:
+        await warm_up_async_storage()
+    except Exception as e:
+        logger.warning("⚠️ ストレージの事前準備に失敗（初回のアップロード時に再試行）", error=str(e))
+
+@app.on_event("startup")
+async def start_storage_warm_up():
+    # 初回の画像アップロードでクライアント作成・認証情報の解決を待たないよう、先に済ませておく
+    # （認証情報の解決に時間がかかっても起動は待たせない）
+    task = asyncio.get_running_loop().create_task(warm_up_storage())
+    STORAGE_TASKS.add(task)
+    task.add_done_callback(STORAGE_TASKS.discard)
+
+@app.on_event("shutdown")
+async def close_storage_clients():
+    await close_async_http_client()
+
+# リクエストごとのトレース（traceparent / X-Cloud-Trace-Context を引き継ぐ）
+app.add_middleware(TracingMiddleware)
+
 # CORS設定を追加
 app.add_middleware(
     CORSMiddleware,
@@ -56,40 +156,94 @@ AGENT_MAP = {
 # 各エージェントのInMemoryRunnerを作成
 RUNNER_MAP = {}
 for agent_name, agent in AGENT_MAP.items():
-    RUNNER_MAP[agent_name] = InMemoryRunner(agent=agent)
+    # RECORD_REPLAY_MODE が設定されていれば、応答を記録・再生する Runner に包む
+    RUNNER_MAP[agent_name] = wrap_runner(InMemoryRunner(agent=agent))
+
+# Runnerごとのセッション管理（再利用・期限切れの削除・クライアントごとと全体の上限）
+AGENT_SESSIONS = {agent_name: create_agent_session_manager(runner) for agent_name, runner in RUNNER_MAP.items()}
+
+def runner_session_counts():
+    """エージェントごとの InMemoryRunner が保持しているADKセッション数"""
+    return {
+        agent_name: sum(
+            len(user_sessions)
+            for app_sessions in runner.session_service.sessions.values()
+            for user_sessions in app_sessions.values()
+        )
+        for agent_name, runner in RUNNER_MAP.items()
+    }
+
+# /metrics の取得時に現在の値を読むゲージ
+if not SESSIONS.shared:
+    # 共有ストア（Redis）では件数を数えるのに全キーの SCAN が必要なので公開しない
+    register_gauge("mimamori_sessions", "保持している物語セッション数", lambda: len(SESSIONS))
+register_gauge("mimamori_runner_sessions", "InMemoryRunner のセッション数", runner_session_counts, label="agent")
+register_gauge(
+    "mimamori_agent_session_bytes", "ADKセッションが保持しているイベントの推定サイズ（バイト）",
+    lambda: {agent_name: manager.stats()["estimated_bytes"] or 0 for agent_name, manager in AGENT_SESSIONS.items()},
+    label="agent",
+)
+register_gauge(
+    "mimamori_image_jobs", "スレッドプールの画像生成ジョブの件数（待機中・実行中）",
+    lambda: {state: get_image_scheduler().stats()[key] for state, key in (("queued", "queue_depth"), ("in_flight", "in_flight"))},
+    label="state",
+)
+register_gauge(
+    "mimamori_image_async_jobs", "async版の画像生成ジョブの件数（待機中・実行中）",
+    lambda: {state: get_image_scheduler().stats()[key] for state, key in (("queued", "async_queue_depth"), ("in_flight", "async_in_flight"))},
+    label="state",
+)
+register_gauge(
+    "mimamori_image_pipelines_pending", "開始時のパイプラインで生成中のページ数",
+    lambda: sum(len(pipeline.pending_pages()) for pipeline in list(IMAGE_PIPELINES.values())),
+)
+register_gauge("mimamori_audio_preload_tasks", "実行中のページ音声の先行合成", lambda: len(AUDIO_PRELOAD_TASKS))
+IMAGE_SCHEDULER_EVENTS = ("submitted", "completed", "failed", "timeouts", "rejected", "expired")
+register_counter(
+    "mimamori_image_scheduler_events", "スレッドプールの画像生成ジョブの累計（timeouts, rejected, expired など）",
+    lambda: {event: get_image_scheduler().stats()[event] for event in IMAGE_SCHEDULER_EVENTS},
+    label="event",
+)
+register_counter(
+    "mimamori_image_async_events", "async版の画像生成ジョブの累計（timeouts, rejected, expired など）",
+    lambda: {event: get_image_scheduler().stats()[f"async_{event}"] for event in IMAGE_SCHEDULER_EVENTS},
+    label="event",
+)
 
 # srcフォルダを静的ファイルとして提供（絶対パスで指定）
-print(f"📁 Static files directory: {STATIC_DIR}")
-print(f"📁 Static files directory exists: {STATIC_DIR.exists()}")
-print(f"📁 Static files directory contents: {list(STATIC_DIR.iterdir()) if STATIC_DIR.exists() else 'Directory not found'}")
+logger.info("📁 Static files directory", path=str(STATIC_DIR), exists=STATIC_DIR.exists())
+logger.debug("📁 Static files directory contents", contents=[p.name for p in STATIC_DIR.iterdir()] if STATIC_DIR.exists() else None)
 
 # 静的ファイルの配信を確実にする
 try:
     app.mount("/src", StaticFiles(directory=STATIC_DIR), name="src")
-    print("✅ 静的ファイルマウント成功: /src")
+    logger.info("✅ 静的ファイルマウント成功", path="/src")
 except Exception as e:
-    print(f"❌ 静的ファイルマウント失敗: {e}")
+    logger.error("❌ 静的ファイルマウント失敗", error=str(e))
+
+# ローカルストレージバックエンドの場合は、生成した画像・音声をアプリから配信
+storage_backend = get_storage_backend()
+if isinstance(storage_backend, LocalStorageBackend):
+    app.mount(storage_backend.url_prefix, StaticFiles(directory=storage_backend.root), name="media")
+    logger.info("✅ ローカルストレージマウント成功", path=storage_backend.url_prefix)
 
 # フォールバック: 個別のファイルを提供（静的ファイルマウントが失敗した場合の保険）
 @app.get("/src/{file_path:path}")
 async def serve_static_file(file_path: str):
     file_full_path = STATIC_DIR / file_path
-    print(f"🔍 ファイル要求: {file_path} -> {file_full_path}")
-    print(f"🔍 ファイル存在: {file_full_path.exists()}")
+    logger.debug("🔍 ファイル要求", file_path=file_path, full_path=str(file_full_path))
     
     if file_full_path.exists():
-        print(f"✅ ファイル配信成功: {file_path}")
         return FileResponse(file_full_path)
     else:
-        print(f"❌ ファイルが見つかりません: {file_path}")
+        logger.warning("❌ ファイルが見つかりません", file_path=file_path)
         raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
 
 # ルートパスで静的ファイルを提供（こちらも絶対パスで指定）
 @app.get("/")
 async def root():
     index_path = STATIC_DIR / "index.html"
-    print(f"📄 Serving index.html from: {index_path}")
-    print(f"📄 index.html exists: {index_path.exists()}")
+    logger.debug("📄 Serving index.html", path=str(index_path))
     return FileResponse(index_path)
 
 # 静的ファイルの存在確認用エンドポイント
@@ -120,35 +274,94 @@ async def check_static_files():
     return static_files
 
 # 背景で画像生成を実行する関数
-def generate_image_task(session_id: str, page_num: int, story_text: str, reference_image_url: str = None):
-    print(f"🖼️ Background task started for Session {session_id}, Page {page_num}")
+async def generate_image_task(session_id: str, page_num: int, story_text: str, reference_image_url: str = None):
+    # async関数なので BackgroundTasks はスレッドプールを使わずイベントループ上で実行する
+    bind_contextvars(session_id=session_id, page=page_num)
+    # BackgroundTasks はリクエストのトレースを引き継ぐので、その子スパンになる
+    with span("page_image", page=page_num):
+        logger.info("🖼️ 画像生成タスク開始", has_reference=bool(reference_image_url))
     
-    # reference_image_url があれば、それを使って生成
-    if reference_image_url:
-        print(f"🖼️ Using reference image: {reference_image_url}")
-        from agents.StoryTelling_Agent.simple_parallel_tool import generate_story_image_with_reference
-        result = generate_story_image_with_reference(story_text, reference_image_url, f"p{page_num}_with_ref")
-    else:
-        # なければ通常の生成
-        from agents.StoryTelling_Agent.simple_parallel_tool import generate_story_image_parallel
-        result = generate_story_image_parallel(story_text, f"p{page_num}")
+        # reference_image_url があれば、それを使って生成
+        if reference_image_url:
+            logger.debug("🖼️ 参照画像を使用", reference_url=reference_image_url)
+            from agents.StoryTelling_Agent.simple_parallel_tool import generate_story_image_with_reference_async
+            result = await generate_story_image_with_reference_async(story_text, reference_image_url, f"p{page_num}_with_ref")
+        else:
+            # なければ通常の生成
+            from agents.StoryTelling_Agent.simple_parallel_tool import generate_story_image_parallel_async
+            result = await generate_story_image_parallel_async(story_text, f"p{page_num}")
     
-    if result and result.get("success"):
-        image_url = result["images"][0].get("cloud_url")
-        # セッションデータに画像URLを保存
-        if session_id in SESSIONS:
-            SESSIONS[session_id]["image_urls"][page_num] = image_url
-            print(f"🖼️ Image URL for P{page_num} saved for Session {session_id}: {image_url}")
+        if result and result.get("success"):
+            image_url = result["images"][0].get("cloud_url")
         else:
-            print(f"⚠️ Session {session_id} not found when saving image URL")
+            logger.warning("❌ 画像生成失敗", page=page_num)
+            # エラー時はNoneを保存して次のページに遷移できるようにする
+            image_url = None
+
+        await save_image_url(session_id, page_num, image_url)
+
+async def save_image_url(session_id: str, page_num: int, image_url):
+    """セッションデータに画像URLを保存し、待機中の next_page と購読中のクライアントに通知"""
+    def set_image_url(session_data):
+        session_data["image_urls"][page_num] = image_url
+        if page_num in session_data.get("image_pending", []):
+            session_data["image_pending"].remove(page_num)
+
+    if await SESSIONS.update_async(session_id, set_image_url) is None:
+        logger.warning("⚠️ 画像URL保存先のセッションがありません", session_id=session_id)
+        return
+    logger.info("🖼️ 画像URL保存", session_id=session_id, page=page_num, image_url=image_url)
+    IMAGE_NOTIFIER.publish(session_id, page_num, image_url)
+
+async def save_audio_url(session_id: str, page_num: int, audio_url):
+    """セッションデータにページ音声のURLを保存"""
+    def set_audio_url(session_data):
+        session_data.setdefault("audio_urls", {})[page_num] = audio_url
+
+    if await SESSIONS.update_async(session_id, set_audio_url) is None:
+        logger.warning("⚠️ 音声URL保存先のセッションがありません", session_id=session_id)
+        return
+    logger.info("🎵 音声URL保存", session_id=session_id, page=page_num, audio_url=audio_url)
+
+async def preload_page_audio(session_id: str, page_num: int, text: str, language: str = "ja"):
+    """ページの読み上げ音声を先に合成し、セッションに保存する"""
+    from agents.StoryTelling_Agent.tts_tool import generate_story_audio
+    bind_contextvars(session_id=session_id, page=page_num)
+    with span("audio_preload", page=page_num):
+        result = await asyncio.to_thread(generate_story_audio, text, language)
+    if result and result.get("success"):
+        await save_audio_url(session_id, page_num, result["audio"]["cloud_url"])
     else:
-        print(f"❌ Image generation failed for P{page_num}")
-        # エラー時はNoneを保存して次のページに遷移できるようにする
-        if session_id in SESSIONS:
-            SESSIONS[session_id]["image_urls"][page_num] = None
-            print(f"⚠️ Setting P{page_num} image URL to None due to generation failure")
-        else:
-            print(f"⚠️ Session {session_id} not found when handling image generation failure")
+        logger.warning("❌ 音声の先行合成失敗", page=page_num)
+
+def schedule_audio_preload(session_id: str, page_num: int, text: str):
+    task = asyncio.get_running_loop().create_task(preload_page_audio(session_id, page_num, text))
+    AUDIO_PRELOAD_TASKS.add(task)
+    task.add_done_callback(AUDIO_PRELOAD_TASKS.discard)
+
+async def mark_image_pending(session_id: str, page_num: int):
+    """画像ジョブの開始をセッションデータに記録（他のワーカーからも生成中と分かるように）"""
+    def add_pending(session_data):
+        pending = session_data.setdefault("image_pending", [])
+        if page_num not in pending:
+            pending.append(page_num)
+
+    await SESSIONS.update_async(session_id, add_pending)
+
+async def image_settled(session_id: str, page_num: int) -> bool:
+    """ページ画像が保存済み（生成失敗のNoneを含む）ならTrue"""
+    return page_num in (await SESSIONS.get_async(session_id) or {}).get("image_urls", {})
+
+async def finish_story_pages(session_id: str):
+    """物語のページがこれ以上増えないことをセッションデータに記録"""
+    await SESSIONS.update_async(session_id, lambda session_data: session_data.pop("story_generating", None))
+
+async def save_story_page(session_id: str, page_num: int, text: str):
+    """セッションデータにページのテキストを保存"""
+    def set_page(session_data):
+        session_data["story_pages"][page_num] = text
+
+    await SESSIONS.update_async(session_id, set_page)
 
 # ADKの標準的なWeb UIの静的ファイルを提供
 try:
@@ -200,7 +413,7 @@ try:
             """)
             
 except Exception as e:
-    print(f"Warning: Could not load ADK standard UI: {e}")
+    logger.warning("Could not load ADK standard UI", error=str(e))
     
     # フォールバック: シンプルなエージェント選択UI
     @app.get("/", response_class=HTMLResponse)
@@ -243,8 +456,112 @@ except Exception as e:
 async def health_check():
     return {"status": "healthy", "message": "GeminiReport API is running"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus形式のメトリクス（各段階のレイテンシ・結果、セッション数、待ち行列）"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/health/image-scheduler")
+async def image_scheduler_status():
+    """画像生成スケジューラーの待ち行列・実行中の件数"""
+    return get_image_scheduler().stats()
+
+@app.get("/health/agent-sessions")
+async def agent_session_status():
+    """エージェントごとのADKセッション数・推定メモリ使用量と、作成・再利用・削除の累計"""
+    return {agent_name: manager.stats() for agent_name, manager in AGENT_SESSIONS.items()}
+
+@app.get("/health/single-flight")
+async def single_flight_status():
+    """同時リクエストの合流数（coalesced）と実行数（leaders）"""
+    return single_flight_stats()
+
+@app.get("/health/caches")
+async def cache_status():
+    """キャッシュの使用量とヒット率"""
+    return {
+        "generated_images": image_cache.stats(),
+        "audio": audio_cache.stats(),
+        "reference_images": reference_image_cache.stats(),
+        "story_library": STORY_LIBRARY.stats()
+    }
+
+async def iter_until_disconnect(request: Request, source):
+    """
+    source の要素を順に返し、クライアントが切断したらその時点で source を止める
+
+    次の要素を待っている間（モデルの応答待ち）も切断を監視し、実行中の処理をキャンセルする。
+    """
+    async def wait_for_disconnect():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    iterator = source.__aiter__()
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait({pending, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not pending.done():
+                logger.info("🔌 クライアントが切断したため実行を中止")
+                break
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                break
+            pending = None
+            yield item
+    finally:
+        watcher.cancel()
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await iterator.aclose()
+
+async def stream_agent_events(request: Request, agent_name: str, runner, user_id: str, session_id: str, content):
+    """エージェントの応答テキストを生成された順にSSEとして送信する"""
+    yield format_sse("session", {"session_id": session_id})
+
+    chunks = []
+    started = time.perf_counter()
+    try:
+        async for text in iter_until_disconnect(request, iter_story_text(runner, user_id, session_id, content)):
+            if not chunks:
+                observe_stage("agent_first_token", time.perf_counter() - started)
+            chunks.append(text)
+            yield format_sse("delta", {"text": text})
+    except Exception as e:
+        logger.error("❌ ADKエージェント実行エラー", agent=agent_name, error=str(e))
+        yield format_sse("error", {"message": f"エージェントの実行中にエラーが発生しました: {str(e)}"})
+    yield format_sse("done", {"session_id": session_id, "result": "".join(chunks)})
+
+def client_key(request: Request) -> str:
+    """
+    セッション数の上限を数える接続元のキー（クライアントが自由に変えられる user_id は使わない）
+
+    FORWARDED_HOPS（デフォルト: 1）が1以上なら、X-Forwarded-For の後ろから数えてその位置のアドレスを使う
+    （Cloud Run などのフロントが最後に付け足した値で、クライアントは書き換えられない）。
+    """
+    if FORWARDED_HOPS > 0:
+        forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",") if address.strip()]
+        if forwarded:
+            return forwarded[-min(FORWARDED_HOPS, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
 @app.get("/agent/{agent_name}")
-async def run_agent_get(agent_name: str, input: str = Query(None, description="質問内容を指定してください（省略時は「こんにちは」で開始）")):
+async def run_agent_get(
+    agent_name: str,
+    request: Request,
+    input: str = Query(None, description="質問内容を指定してください（省略時は「こんにちは」で開始）"),
+    session_id: str = Query(None, description="前回のレスポンスの session_id を指定すると、同じ会話を続けます"),
+    user_id: str = Query("web_user", description="ユーザーID（セッション数の上限は接続元ごとに数えます）"),
+    stream: bool = Query(False, description="trueの場合、生成されたテキストをSSEで逐次返します"),
+):
     agent = AGENT_MAP.get(agent_name)
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
@@ -254,57 +571,39 @@ async def run_agent_get(agent_name: str, input: str = Query(None, description="
     
     # InMemoryRunnerを使用してエージェントを実行
     runner = RUNNER_MAP[agent_name]
-    session = await runner.session_service.create_session(
-        app_name=runner.app_name, user_id="web_user"
-    )
+    # 既知の session_id なら再利用し、なければ新しく作る（使われなくなったものは期限切れで削除される）
+    session_id, _ = await AGENT_SESSIONS[agent_name].acquire(user_id, session_id, client_key(request))
     
     content = UserContent(parts=[Part(text=user_input)])
+
+    if stream:
+        return StreamingResponse(
+            stream_agent_events(request, agent_name, runner, user_id, session_id, content),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     
     # エージェントを実行して結果を取得
+    # （同期版の runner.run はイベントループをブロックするので、async版で最後まで読む）
     result = ""
     try:
-        # Cloud Run環境でのADK実行を安全に行う
-        for event in runner.run(
-            user_id=session.user_id, session_id=session.id, new_message=content
+        async for event in runner.run_async(
+            user_id=user_id, session_id=session_id, new_message=content
         ):
+            if getattr(event, 'partial', False):
+                continue
             if hasattr(event, 'content') and hasattr(event.content, 'parts'):
                 for part in event.content.parts:
                     if hasattr(part, 'text') and part.text is not None:
                         result += part.text
     except Exception as e:
-        print(f"❌ ADKエージェント実行エラー: {e}")
+        logger.error("❌ ADKエージェント実行エラー", agent=agent_name, error=str(e))
         result = f"エージェントの実行中にエラーが発生しました: {str(e)}"
     
-    return {"result": result}
+    return {"result": result, "session_id": session_id}
 
-@app.post("/agent/storytelling/start")
-async def start_story(request: Request, background_tasks: BackgroundTasks):
-    data = await request.json()
-    topic = data.get("topic", "動物の話")
-    
-    print(f"🔄 ストーリー開始: topic={topic}")
-
-    runner = RUNNER_MAP["storytelling"]
-    session = await runner.session_service.create_session(
-        app_name=runner.app_name, user_id="web_user"
-    )
-    session_id = session.id
-    print(f"💾 セッション作成: {session_id}")
-    
-    # 1. エージェントを一度だけ呼び出し、3ページ分の物語を取得
-    full_story_text = ""
-    content = UserContent(parts=[Part(text=topic)])
-    try:
-        # Cloud Run環境でのADK実行を安全に行う
-        for event in runner.run(user_id=session.user_id, session_id=session_id, new_message=content):
-            if hasattr(event, 'content'):
-                for part in event.content.parts:
-                    if hasattr(part, 'text'):
-                        full_story_text += part.text
-    except Exception as e:
-        print(f"❌ ストーリーテリングADKエージェント実行エラー: {e}")
-        # エラー時はデフォルトのストーリーを返す
-        full_story_text = """
+# エージェント実行エラー時に返すデフォルトのストーリー
+FALLBACK_STORY_TEXT = """
         [PAGE_1]
         深い森の奥に、ふわふわの毛を持つ小さなうさぎのピョンが住んでいました。ピョンはいつも元気いっぱいで、ぴょんぴょん跳ねるのが大好きでした。
         
@@ -314,69 +613,224 @@ async def start_story(request: Request, background_tasks: BackgroundTasks):
         [PAGE_3]
         ピョンは、もっと遠くまで探検してみたいと、ワクワクしながら森の奥へと歩き始めました。新しい冒険が始まろうとしていました。
         """
+
+async def generate_story_pages(runner, session, topic: str):
+    """
+    エージェントを一度だけ呼び出し、[PAGE_X]ブロックが閉じるたびに (ページ番号, テキスト) を返す
+    """
+    parser = StoryPageParser()
+    emitted = set()
+    content = UserContent(parts=[Part(text=topic)])
+    start = time.perf_counter()
+    # yield をまたぐので、現在のスパンにはせずに終了時に閉じる（ADKのスパンはリクエストのスパンの下に入る）
+    generation_span = start_span("story_generation", topic=topic)
+    try:
+        async for chunk in iter_story_text(runner, session.user_id, session.id, content):
+            for page_num, text in parser.feed(chunk):
+                emitted.add(page_num)
+                yield page_num, text
+        for page_num, text in parser.close():
+            emitted.add(page_num)
+            yield page_num, text
+        end_span(generation_span)
+        observe_stage("story_generation", time.perf_counter() - start)
+    except Exception as e:
+        end_span(generation_span, e)
+        observe_stage("story_generation", time.perf_counter() - start, "error")
+        logger.error("❌ ストーリーテリングADKエージェント実行エラー", error=str(e))
+        # エラー時はデフォルトのストーリーで未送信のページを補う
+        fallback_parser = StoryPageParser()
+        for page_num, text in fallback_parser.feed(FALLBACK_STORY_TEXT) + fallback_parser.close():
+            if page_num not in emitted:
+                yield page_num, text
+    logger.debug("📝 生成された物語テキスト", text=parser.text[:200], text_chars=len(parser.text))
+
+def shared_story_pages(runner, session, topic: str):
+    """
+    generate_story_pages() を同じお話の種類の同時リクエストで共有する
     
-    print(f"📝 生成された物語テキスト: {full_story_text[:200]}...")
-    
-    # 2. 物語をページごとに分割
+    ダブルクリックや同時アクセスでは最初のリクエストの生成結果を全員に配る
+    （画像生成もプロンプトが同じになるため1回にまとまる）
+    """
+    return STORY_FLIGHTS.stream(
+        normalize_key("story", topic),
+        lambda: generate_story_pages(runner, session, topic)
+    )
+
+def create_image_pipeline(session_id: str) -> PageImagePipeline:
+    """ページ確定と同時に画像生成を始めるパイプラインをセッションに紐づけて作成"""
+    async def on_image(page_num: int, image_url):
+        # エラー時はNoneを保存して次のページに遷移できるようにする
+        await save_image_url(session_id, page_num, image_url)
+
+    # 全ページの生成が終わったら参照を外す（それまではタスクが回収されないよう保持）
+    pipeline = PageImagePipeline(
+        on_image=on_image,
+        on_finished=lambda: IMAGE_PIPELINES.pop(session_id, None),
+    )
+    IMAGE_PIPELINES[session_id] = pipeline
+    return pipeline
+
+def image_job_status(session_id: str, page_num: int, session_data: dict) -> dict:
+    """ページ画像ジョブの状態（ready / pending / failed / none）。session_data はストアから読んだセッションデータ"""
+    image_urls = session_data.get("image_urls", {})
+    if image_urls.get(page_num):
+        status = "ready"
+    elif page_num in session_data.get("image_pending", []):
+        status = "pending"
+    elif page_num in image_urls:
+        status = "failed"
+    else:
+        status = "none"
+    return {
+        "page": page_num,
+        "status": status,
+        "image_url": image_urls.get(page_num),
+        "status_url": f"/agent/storytelling/image-status/{session_id}"
+    }
+
+async def stream_story_events(session_id: str, runner, session, topic: str, preload_audio: bool = False):
+    """物語をページ単位でSSEとして送信する"""
+    yield format_sse("session", {"session_id": session_id})
+
     pages = {}
-    # 正規表現で[PAGE_X]と次の[PAGE_X]の間のテキストを抽出
-    import re
-    matches = re.finditer(r'\[PAGE_(\d+)\]\s*(.*?)\s*(?=\[PAGE_\d+\]|$)', full_story_text, re.DOTALL)
-    for match in matches:
-        page_num = int(match.group(1))
-        text = match.group(2).strip()
-        # 3ページまでしか受け入れない
-        if page_num <= 3:
+    pipeline = create_image_pipeline(session_id)
+    try:
+        async for page_num, text in shared_story_pages(runner, session, topic):
             pages[page_num] = text
-            print(f"📄 P{page_num}抽出: {text[:50]}...")
-        else:
-            print(f"⚠️ P{page_num}は無視（3ページ制限）")
+            await save_story_page(session_id, page_num, text)
+            # ページが閉じた瞬間に画像生成を開始
+            await mark_image_pending(session_id, page_num)
+            pipeline.page_closed(page_num, text)
+            if preload_audio:
+                schedule_audio_preload(session_id, page_num, text)
+            logger.info("📄 ページ送信", page=page_num, text_chars=len(text))
+            yield format_sse("page", {"page": page_num, "text": text})
+    finally:
+        # クライアントが途中で切断しても、開始済みのジョブは最後まで実行させる
+        pipeline.close()
+        await finish_story_pages(session_id)
+    # 生成が終わればADKセッションは不要（途中で切断された場合は期限切れで削除される）
+    await AGENT_SESSIONS["storytelling"].release(session.user_id, session.id)
 
-    print(f"📚 抽出されたページ数: {len(pages)}")
-    print(f"📋 利用可能なページ: {list(pages.keys())}")
+    if 1 not in pages:
+        logger.warning("⚠️ P1のページが見つかりません")
+        yield format_sse("page", {"page": 1, "text": "物語の生成に失敗しました。"})
+        yield format_sse("done", {"session_id": session_id, "pages": []})
+        return
 
-    # 3. セッションデータを作成・保存
-    SESSIONS[session_id] = {
-        "story_pages": pages,
+    p1_image_url = await pipeline.wait(1)
+    yield format_sse("image", {"page": 1, "image_url": p1_image_url})
+    yield format_sse("done", {"session_id": session_id, "pages": sorted(pages.keys())})
+
+async def library_story_events(session_id: str, entry: dict):
+    """ライブラリの物語を、その場で生成した場合と同じ形式のSSEで送信する"""
+    yield format_sse("session", {"session_id": session_id})
+    for page_num in sorted(entry["story_pages"]):
+        yield format_sse("page", {"page": page_num, "text": entry["story_pages"][page_num]})
+    yield format_sse("image", {"page": 1, "image_url": entry["image_urls"].get(1)})
+    yield format_sse("done", {"session_id": session_id, "pages": sorted(entry["story_pages"])})
+
+async def start_library_story(entry: dict, stream: bool):
+    """事前生成した物語でセッションを作成して即座に返す（画像・音声は生成済み）"""
+    session_id = uuid.uuid4().hex
+    session_data = {
+        "story_pages": dict(entry["story_pages"]),
         "current_page": 1,
-        "image_urls": {} # 生成された画像URLをここに保存
+        "image_urls": dict(entry["image_urls"]),
+        "audio_urls": dict(entry.get("audio_urls", {})),
+        "library_story_id": entry["id"]
     }
-    print(f"💾 セッションデータ保存: {session_id}")
+    await SESSIONS.set_async(session_id, session_data)
+    bind_contextvars(session_id=session_id)
+    logger.info("📚 ライブラリの物語を使用", story_id=entry["id"])
 
-    # 4. P1の画像を同期的に生成
-    if 1 in pages:
-        print(f"🖼️ P1画像生成開始: {session_id}")
-        from agents.StoryTelling_Agent.simple_parallel_tool import generate_story_image_parallel
-        p1_result = generate_story_image_parallel(pages[1], "p1")
-        
-        if p1_result and p1_result.get("success"):
-            p1_image_url = p1_result["images"][0].get("cloud_url")
-            SESSIONS[session_id]["image_urls"][1] = p1_image_url
-            print(f"✅ P1画像生成完了: {p1_image_url}")
-        else:
-            print(f"❌ P1画像生成失敗")
-            p1_image_url = None
-    else:
-        print(f"⚠️ P1のページが見つかりません")
-        p1_image_url = None
+    if stream:
+        return StreamingResponse(
+            library_story_events(session_id, entry),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return {
+        "session_id": session_id,
+        "text_result": entry["story_pages"].get(1, "物語の生成に失敗しました。"),
+        "image_url": entry["image_urls"].get(1),
+        "audio_url": entry.get("audio_urls", {}).get(1),
+        "image_job": image_job_status(session_id, 1, session_data),
+        "source": "library"
+    }
+
+@app.post("/agent/storytelling/start")
+async def start_story(
+    request: Request,
+    stream: bool = Query(False, description="trueの場合、ページをSSEで逐次返します"),
+):
+    data = await request.json()
+    topic = data.get("topic", "動物の話")
+    # trueの場合、各ページの読み上げ音声もバックグラウンドで先に合成する
+    preload_audio = bool(data.get("preload_audio", False))
+    
+    logger.info("🔄 ストーリー開始", topic=topic, stream=stream, preload_audio=preload_audio)
+
+    # ライブラリに事前生成した物語があれば即座に返す（live=true の場合は常にその場で生成）
+    if not data.get("live", False):
+        entry = STORY_LIBRARY.pick(topic)
+        if entry:
+            return await start_library_story(entry, stream)
+
+    runner = RUNNER_MAP["storytelling"]
+    session = await AGENT_SESSIONS["storytelling"].create("web_user", client_key(request))
+    session_id = session.id
+    bind_contextvars(session_id=session_id)
+    logger.info("💾 セッション作成")
 
-    # 5. P1のテキストとセッションIDを返す
+    # セッションデータを作成・保存（ページは生成され次第追加される）
+    await SESSIONS.set_async(session_id, {
+        "story_pages": {},
+        "current_page": 1,
+        "image_urls": {}, # 生成された画像URLをここに保存
+        "audio_urls": {}, # 先行合成した音声URLをここに保存
+        "story_generating": True # ページの生成が終わるまで（image-events が途中で done を送らないように）
+    })
+
+    if stream:
+        return StreamingResponse(
+            stream_story_events(session_id, runner, session, topic, preload_audio),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # 1. エージェントを一度だけ呼び出し、ページが閉じるたびに画像生成を開始
+    pages = {}
+    pipeline = create_image_pipeline(session_id)
+    async for page_num, text in shared_story_pages(runner, session, topic):
+        pages[page_num] = text
+        await save_story_page(session_id, page_num, text)
+        await mark_image_pending(session_id, page_num)
+        pipeline.page_closed(page_num, text)
+        if preload_audio:
+            schedule_audio_preload(session_id, page_num, text)
+        logger.info("📄 ページ抽出、画像生成開始", page=page_num, text_chars=len(text))
+    pipeline.close()
+    await finish_story_pages(session_id)
+    await AGENT_SESSIONS["storytelling"].release(session.user_id, session.id)
+
+    logger.info("📚 ページ抽出完了", pages=sorted(pages))
+
+    if 1 not in pages:
+        logger.warning("⚠️ P1のページが見つかりません")
+
+    # 2. P1の画像は待たずに返す（生成状況は image_job の status_url で確認できる）
+    session_data = await SESSIONS.get_async(session_id) or {}
     result = {
         "session_id": session_id,
         "text_result": pages.get(1, "物語の生成に失敗しました。"),
-        "image_url": p1_image_url
+        "image_url": session_data.get("image_urls", {}).get(1),
+        "audio_url": session_data.get("audio_urls", {}).get(1),
+        "image_job": image_job_status(session_id, 1, session_data),
+        "source": "live"
     }
-    print(f"✅ レスポンス返却: session_id={session_id}, text_len={len(result['text_result'])}")
-    
-    # 6. P2の画像をバックグラウンドで先行生成
-    if 2 in pages:
-        print(f"🖼️ P2画像生成タスク開始: {session_id}")
-        # ★ p1_image_url を引数として渡すように修正
-        background_tasks.add_task(generate_image_task, session_id, 2, pages[2], p1_image_url)
-        print(f"✅ P2画像生成タスク登録完了")
-    else:
-        print(f"⚠️ P2のページが見つかりません")
-    
+    logger.info("✅ レスポンス返却", text_chars=len(result["text_result"]), image_job=result["image_job"]["status"])
     return result
 
 @app.post("/agent/storytelling/next")
@@ -384,53 +838,65 @@ async def next_page(request: Request, background_tasks: BackgroundTasks):
     data = await request.json()
     session_id = data.get("session_id")
     
-    print(f"🔄 ストーリー継続: session_id={session_id}")
-    print(f"📊 現在のセッション数: {len(SESSIONS)}")
-    print(f"🔍 利用可能なセッション: {list(SESSIONS.keys())}")
+    bind_contextvars(session_id=session_id)
+    logger.info("🔄 ストーリー継続")
+
+    # 次のページに進める
+    def advance_page(session_data):
+        session_data["current_page"] += 1
 
-    if not session_id or session_id not in SESSIONS:
-        print(f"❌ セッションが見つかりません: {session_id}")
+    session_data = await SESSIONS.update_async(session_id, advance_page) if session_id else None
+    if session_data is None:
+        logger.warning("❌ セッションが見つかりません")
         raise HTTPException(status_code=404, detail="Session not found")
 
-    session_data = SESSIONS[session_id]
-    print(f"✅ セッション発見: {session_id}")
-    print(f"📄 現在のページ: {session_data['current_page']}")
-    print(f"📚 利用可能なページ: {list(session_data['story_pages'].keys())}")
-    
-    # 次のページに進める
-    session_data["current_page"] += 1
     current_page_num = session_data["current_page"]
-    print(f"🔄 次のページに進行: P{current_page_num}")
+    bind_contextvars(page=current_page_num)
+    logger.debug("🔄 次のページに進行", available_pages=sorted(session_data["story_pages"]))
     
     # ページと画像URLを取得
     text_result = session_data["story_pages"].get(current_page_num, "")
     image_url = session_data["image_urls"].get(current_page_num)
     
-    print(f"📝 取得したテキスト: {text_result[:100]}...")
-    print(f"🖼️ 取得した画像URL: {image_url}")
-    print(f"📊 現在の画像URL一覧: {session_data['image_urls']}")
+    logger.debug("📝 ページ取得", text_chars=len(text_result), image_url=image_url, image_pages=sorted(session_data["image_urls"]))
     
-    # 画像URLがない場合は、少し待ってから再確認
-    if not image_url:
-        import asyncio
-        print(f"⏳ P{current_page_num}の画像URLを待機中...")
-        # 最大15秒まで待機（3秒ずつ5回）
-        for i in range(5):
-            await asyncio.sleep(3)
-            image_url = session_data["image_urls"].get(current_page_num)
-            if image_url:
-                print(f"✅ P{current_page_num}の画像URL取得: {image_url}")
-                break
-            else:
-                print(f"⏳ P{current_page_num}の画像URL待機中... ({i+1}/5)")
-        
-        if not image_url:
-            print(f"⚠️ P{current_page_num}の画像URLが取得できませんでした（画像なしで続行）")
+    # 画像がまだ生成中の場合は、少し待ってから再確認（生成失敗済みのページは待たない）
+    if not image_url and current_page_num not in session_data["image_urls"]:
+        logger.info("⏳ 画像URLを待機中")
+        # 最大15秒まで、画像ジョブの完了通知で起こされるまで待機
+        # （共有ストアでは、他のワーカーで完成した画像をストアから定期的に確認する）
+        wait_started = time.perf_counter()
+        with span("next_page_wait", page=current_page_num):
+            notified = await IMAGE_NOTIFIER.wait(
+                session_id,
+                current_page_num,
+                timeout=IMAGE_WAIT_TIMEOUT,
+                check=lambda: image_settled(session_id, current_page_num),
+                poll_interval=IMAGE_WAIT_POLL_INTERVAL if SESSIONS.shared else None,
+            )
+        session_data = await SESSIONS.get_async(session_id) or session_data
+        image_url = session_data["image_urls"].get(current_page_num)
+        if image_url:
+            wait_outcome = "success"
+            logger.info("✅ 画像URL取得", image_url=image_url)
+        elif notified:
+            wait_outcome = "failed"
+            logger.warning("⚠️ 画像生成は失敗しました（画像なしで続行）")
+        else:
+            wait_outcome = "timeout"
+            logger.warning("⚠️ 画像URLが取得できませんでした（画像なしで続行）", timeout=IMAGE_WAIT_TIMEOUT)
+        observe_stage("next_page_wait", time.perf_counter() - wait_started, wait_outcome)
 
     # さらに次のページがあれば、その画像をバックグラウンドで先行生成
+    # （開始時のパイプラインが生成済み・生成中の場合は不要。生成中かどうかは他のワーカーの分もストアで分かる）
     next_page_to_preload = current_page_num + 1
-    if next_page_to_preload in session_data["story_pages"]:
-        print(f"🖼️ P{next_page_to_preload}画像生成タスク開始: {session_id}")
+    if next_page_to_preload in session_data["image_urls"] or (
+        next_page_to_preload in session_data.get("image_pending", [])
+    ):
+        logger.debug("✅ 次のページの画像は生成済みまたは生成中です", next_page=next_page_to_preload)
+    elif next_page_to_preload in session_data["story_pages"]:
+        logger.info("🖼️ 次のページの画像生成タスク登録", next_page=next_page_to_preload)
+        await mark_image_pending(session_id, next_page_to_preload)
         # ★ このターンの画像URL (image_url) を引数として渡すように修正
         background_tasks.add_task(
             generate_image_task, 
@@ -439,27 +905,47 @@ async def next_page(request: Request, background_tasks: BackgroundTasks):
             session_data["story_pages"][next_page_to_preload],
             image_url 
         )
-        print(f"✅ P{next_page_to_preload}画像生成タスク登録完了")
     else:
-        print(f"⚠️ P{next_page_to_preload}のページが見つかりません")
+        logger.debug("⚠️ 次のページが見つかりません", next_page=next_page_to_preload)
 
-    # セッションが終了したらデータを削除（任意）
+    # セッションデータはストアのTTLで自動的に破棄される（すぐに消すと画像取得が間に合わない可能性がある）
     if "おしまい" in text_result:
-        print(f"🏁 ストーリー終了検出")
-        # del SESSIONS[session_id] # すぐに消すと画像取得が間に合わない可能性があるので、実際には定期的なクリーンアップ処理が望ましい
-        pass
+        logger.info("🏁 ストーリー終了検出")
+        # Redisストアでは期限切れの通知が来ないので、このプロセスの待機用イベントはここで破棄する
+        IMAGE_NOTIFIER.discard(session_id)
 
     result = {
         "session_id": session_id,
         "text_result": text_result,
-        "image_url": image_url
+        "image_url": image_url,
+        # 先行合成が終わっていれば、すぐに再生できる音声のURL
+        "audio_url": session_data.get("audio_urls", {}).get(current_page_num)
     }
-    print(f"✅ レスポンス返却: session_id={session_id}, text_len={len(text_result)}")
+    logger.info("✅ レスポンス返却", text_chars=len(text_result))
     return result
 
+async def audio_stream_response(text: str, language: str):
+    """
+    合成済みなら保存済みの音声へリダイレクトし、未合成ならメモリ上で合成しながらMP3を返す
+    """
+    from agents.StoryTelling_Agent.tts_tool import stream_story_audio
+    
+    cached_url = await asyncio.to_thread(audio_cache.lookup, audio_cache_key(text, language))
+    if cached_url:
+        return RedirectResponse(cached_url)
+    return StreamingResponse(
+        stream_story_audio(text, language),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-store"}
+    )
+
 @app.post("/agent/storytelling/generate-audio")
-async def generate_audio(request: Request):
-    """ストーリーテキストを音声に変換"""
+async def generate_audio(request: Request, stream: bool = Query(False)):
+    """
+    ストーリーテキストを音声に変換
+    
+    stream=1 の場合はURLではなく音声そのもの（audio/mpeg）を合成しながら返す
+    """
     data = await request.json()
     text = data.get("text", "")
     language = data.get("language", "ja")
@@ -467,11 +953,14 @@ async def generate_audio(request: Request):
     if not text:
         raise HTTPException(status_code=400, detail="Text is required")
     
-    print(f"🎤 音声生成リクエスト: {text[:50]}...")
+    logger.info("🎤 音声生成リクエスト", text_chars=len(text), language=language, stream=stream)
+    
+    if stream:
+        return await audio_stream_response(text, language)
     
     try:
         from agents.StoryTelling_Agent.tts_tool import generate_story_audio
-        result = generate_story_audio(text, language)
+        result = await asyncio.to_thread(generate_story_audio, text, language)
         
         if result and result.get("success"):
             audio_url = result["audio"]["cloud_url"]
@@ -484,18 +973,26 @@ async def generate_audio(request: Request):
             raise HTTPException(status_code=500, detail="Audio generation failed")
             
     except Exception as e:
-        print(f"❌ 音声生成エラー: {e}")
+        logger.error("❌ 音声生成エラー", error=str(e))
         raise HTTPException(status_code=500, detail=f"Audio generation error: {str(e)}")
 
+@app.get("/agent/storytelling/audio-stream")
+async def stream_audio(text: str = Query(..., description="読み上げるテキスト"), language: str = Query("ja")):
+    """<audio> 要素から直接再生するためのストリーミング版"""
+    if not text:
+        raise HTTPException(status_code=400, detail="Text is required")
+    return await audio_stream_response(text, language)
+
 @app.get("/agent/storytelling/image-status/{session_id}")
 async def get_image_status(session_id: str):
     """指定されたセッションの画像生成状況を取得"""
-    if session_id not in SESSIONS:
+    session_data = await SESSIONS.get_async(session_id)
+    if session_data is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session_data = SESSIONS[session_id]
     current_page = session_data["current_page"]
     image_urls = session_data["image_urls"]
+    audio_urls = session_data.get("audio_urls", {})
     
     # 次のページの画像URLが存在するかチェック
     next_page = current_page + 1
@@ -506,11 +1003,65 @@ async def get_image_status(session_id: str):
         "current_page": current_page,
         "next_page": next_page,
         "has_next_image": has_next_image,
-        "image_urls": image_urls
+        "image_urls": image_urls,
+        "current_image": image_job_status(session_id, current_page, session_data),
+        "next_image": image_job_status(session_id, next_page, session_data),
+        "audio_url": audio_urls.get(current_page),
+        "audio_urls": audio_urls
     }
 
 
 
+@app.get("/agent/storytelling/image-events/{session_id}")
+async def image_events(session_id: str, request: Request):
+    """画像が完成した瞬間に {page, image_url} をSSEでプッシュする"""
+    if await SESSIONS.get_async(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    async def event_stream():
+        # 購読を先に登録してから完成済みの画像を送る（取りこぼし防止）
+        queue = IMAGE_NOTIFIER.subscribe(session_id)
+        try:
+            sent = set()
+            last_sent = time.monotonic()
+            # 共有ストアでは他のワーカーで完成した画像の通知が届かないので、短い間隔でストアを確認する
+            timeout = IMAGE_WAIT_POLL_INTERVAL if SESSIONS.shared else 15
+            while True:
+                # 物語の生成中はページが増えるので、毎回ストアから読み直す
+                session_data = await SESSIONS.get_async(session_id) or {}
+                for page_num, image_url in session_data.get("image_urls", {}).items():
+                    if page_num not in sent:
+                        sent.add(page_num)
+                        last_sent = time.monotonic()
+                        yield format_sse("image", {"page": page_num, "image_url": image_url})
+                # ページの生成中は、届いたページの画像がそろっても終わらない
+                pages = session_data.get("story_pages", {})
+                if pages and set(pages) <= sent and not session_data.get("story_generating"):
+                    break
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    if time.monotonic() - last_sent >= 15:
+                        # 接続維持用のコメント
+                        last_sent = time.monotonic()
+                        yield ": keep-alive\n\n"
+                    continue
+                if message["page"] in sent:
+                    continue
+                sent.add(message["page"])
+                yield format_sse("image", message)
+            yield format_sse("done", {"session_id": session_id})
+        finally:
+            IMAGE_NOTIFIER.unsubscribe(session_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/info")
 def info():
     return {
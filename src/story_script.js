@@ -12,7 +12,8 @@ class StoryAgent {
         this.nextPagePromise = null; // 次ページの事前準備
         this.nextPageData = null; // 次ページのプリロードデータ
         this.p3ImageUrl = null; // P3の画像URLを保持
-        this.imageStatusInterval = null; // 画像生成状況監視のインターバル
+        this.imageEventSource = null; // 画像生成通知のEventSource
+        this.preloadedAudioUrls = {}; // ページテキスト → 先行合成済みの音声URL
         this.audioEnabled = true; // 音声読み上げの有効/無効状態
         this.currentPageRead = false; // 現在のページが読み上げ済みかどうか
         this.init();
@@ -84,6 +85,7 @@ class StoryAgent {
         // 新しいストーリー開始時に読み上げ済みフラグをリセット
         this.currentPageRead = false;
         this.audioEnabled = true; // 新しいストーリーでは音声を有効にする
+        this.preloadedAudioUrls = {}; // ページテキスト → 先行合成済みの音声URL
         console.log('📚 新しいストーリー開始: 読み上げ状態をリセット');
         
         this.pageCount = 1; // P1から開始
@@ -111,10 +113,12 @@ class StoryAgent {
             console.log(`🔄 ストーリー開始APIを呼び出し中: ${topic}`);
             console.log(`📡 API URL: ${this.apiBaseUrl}/agent/storytelling/start`);
             
-            const requestBody = { topic: topic };
+            // preload_audio: 全ページの読み上げ音声をサーバー側で先に合成しておく
+            const requestBody = { topic: topic, preload_audio: true };
             console.log(`📤 リクエストボディ:`, requestBody);
             
-            const response = await fetch(`${this.apiBaseUrl}/agent/storytelling/start`, {
+            // stream=1: ページが完成するたびにSSEで届く
+            const response = await fetch(`${this.apiBaseUrl}/agent/storytelling/start?stream=1`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -130,7 +134,8 @@ class StoryAgent {
                 throw new Error(`HTTP error! status: ${response.status} - ${errorText}`);
             }
             
-            const data = await response.json();
+            // P1が届いた時点で表示し、残りのイベントはバックグラウンドで受信する
+            const data = await this.readStartStream(response);
             console.log('✅ ストーリー開始API応答:', data);
             
             // セッションIDを保存
@@ -162,6 +167,77 @@ class StoryAgent {
         }
     }
 
+    // Server-Sent Events を読み取り、イベントごとにコールバックを呼ぶ
+    async readSSE(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let separatorIndex;
+            while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, separatorIndex);
+                buffer = buffer.slice(separatorIndex + 2);
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        eventData += line.slice(5).trim();
+                    }
+                });
+                if (eventData) {
+                    onEvent(eventName, JSON.parse(eventData));
+                }
+            }
+        }
+    }
+
+    // ストーリー開始ストリームを読み、P1が届いたら resolve する
+    readStartStream(response) {
+        return new Promise((resolve, reject) => {
+            let sessionId = null;
+            let resolved = false;
+            
+            this.readSSE(response, (eventName, data) => {
+                console.log(`📨 ストリームイベント受信: ${eventName}`, data);
+                if (eventName === 'session') {
+                    sessionId = data.session_id;
+                } else if (eventName === 'page' && data.page === 1 && !resolved) {
+                    resolved = true;
+                    resolve({ session_id: sessionId, text_result: data.text, image_url: null });
+                } else if (eventName === 'image' && data.page === 1) {
+                    this.showStreamedImage(sessionId, data);
+                }
+            }).then(() => {
+                if (!resolved) {
+                    reject(new Error('P1を受信できませんでした'));
+                }
+            }).catch(error => {
+                if (!resolved) {
+                    reject(error);
+                } else {
+                    console.error('❌ ストリーム受信エラー:', error);
+                }
+            });
+        });
+    }
+
+    // ストリームで後から届いた画像を、まだ同じページを表示中なら反映する
+    showStreamedImage(sessionId, data) {
+        if (!data.image_url || sessionId !== this.currentSession || data.page !== this.pageCount) {
+            console.log('⚠️ 表示中のページと異なるため画像を反映しません:', data);
+            return;
+        }
+        console.log(`🖼️ P${data.page}の画像をストリームから表示:`, data.image_url);
+        this.currentImageShown = true;
+        this.showPictureArea();
+        this.displayImage(data.image_url);
+    }
+
     async callStoryAgentNext() {
         try {
             console.log(`🔄 ストーリー継続APIを呼び出し中: session_id=${this.currentSession}`);
@@ -195,6 +271,12 @@ class StoryAgent {
             console.log('📝 テキスト結果:', textResult);
             console.log('🖼️ 画像URL:', imageUrl);
             
+            // 先行合成済みの音声があれば、読み上げ時にそのまま再生する
+            if (data.audio_url) {
+                console.log('🎵 先行合成済みの音声URL:', data.audio_url);
+                this.preloadedAudioUrls[textResult] = data.audio_url;
+            }
+            
             // 「おしまい」が含まれているかチェック
             const isEnd = textResult.includes('おしまい');
             console.log(`🏁 ストーリー終了チェック: ${isEnd}`);
@@ -392,6 +474,7 @@ class StoryAgent {
         }
         
         // 画像を表示
+        this.currentImageShown = !!imageUrlToDisplay;
         if (imageUrlToDisplay) {
             console.log('画像URLを表示:', imageUrlToDisplay);
             this.showPictureArea();
@@ -608,81 +691,64 @@ class StoryAgent {
         this.startImageStatusMonitoring();
     }
     
-    // 画像生成状況を監視する関数
+    // 画像生成状況を監視する関数（サーバーからのプッシュ通知を購読）
     async startImageStatusMonitoring() {
         if (!this.currentSession || this.pageCount >= this.maxPages) {
             return;
         }
         
         // 既に監視中の場合はスキップ
-        if (this.imageStatusInterval) {
+        if (this.imageEventSource) {
             console.log('⚠️ 画像生成状況の監視は既に実行中です');
             return;
         }
         
-        console.log(`🔄 画像生成状況の監視を開始 - 対象: P${this.pageCount + 1}`);
+        const targetPage = this.pageCount + 1;
+        console.log(`🔄 画像生成状況の監視を開始 - 対象: P${targetPage}`);
         
-        // 既存のインターバルをクリア（念のため）
-        this.stopImageStatusMonitoring();
+        this.imageEventSource = new EventSource(`${this.apiBaseUrl}/agent/storytelling/image-events/${this.currentSession}`);
         
-        this.imageStatusInterval = setInterval(async () => {
-            // 実行中のフラグをチェック（重複実行防止）
-            if (this.imageStatusChecking) {
-                console.log('⚠️ 画像生成状況チェックは既に実行中です');
+        this.imageEventSource.addEventListener('image', (event) => {
+            const data = JSON.parse(event.data);
+            console.log('📊 画像生成通知:', data);
+            
+            // 表示中のページの画像が後から完成した場合は反映する
+            if (data.page === this.pageCount && data.image_url && !this.currentImageShown) {
+                this.showStreamedImage(this.currentSession, data);
+            }
+            
+            if (data.page !== targetPage) {
                 return;
             }
             
-            this.imageStatusChecking = true;
+            // 次のページの画像が完成（または失敗）したら購読を停止してボタンを活性化
+            console.log(data.image_url ? '✅ 次のページの画像が準備完了' : '⚠️ 次のページの画像生成に失敗（画像なしで続行）');
+            this.stopImageStatusMonitoring();
             
-            try {
-                const response = await fetch(`${this.apiBaseUrl}/agent/storytelling/image-status/${this.currentSession}`);
-                if (response.ok) {
-                    const data = await response.json();
-                    console.log('📊 画像生成状況:', data);
-                    
-                    const continueBtn = document.getElementById('continue-btn');
-                    if (continueBtn && data.has_next_image) {
-                        // 画像が生成完了したら、ポーリングを停止してボタンを活性化
-                        console.log('✅ 次のページの画像が準備完了');
-                        
-                        // 重複実行を防ぐため、既に停止済みかチェック
-                        if (this.imageStatusInterval) {
-                            this.stopImageStatusMonitoring();
-                        } else {
-                            console.log('⚠️ 画像監視は既に停止済みです');
-                        }
-                        
-                        // 画像準備完了 - 読み上げとは無関係
-                        console.log('🖼️ 画像準備完了 - 続きを読むボタンを有効化');
-                        
-                        // ボタンが既に有効化されている場合はスキップ
-                        if (!continueBtn.disabled) {
-                            console.log('⚠️ 続きを読むボタンは既に有効化済みです');
-                        } else {
-                            continueBtn.disabled = false;
-                            continueBtn.textContent = '📖 続きを読む';
-                            continueBtn.style.opacity = '1';
-                        }
-                    }
-                } else {
-                    // APIエラー時もポーリングを停止
-                    this.stopImageStatusMonitoring();
-                }
-            } catch (error) {
-                console.error('❌ 画像生成状況の取得に失敗:', error);
-                this.stopImageStatusMonitoring();
-            } finally {
-                this.imageStatusChecking = false;
+            const continueBtn = document.getElementById('continue-btn');
+            if (continueBtn && continueBtn.disabled) {
+                console.log('🖼️ 画像準備完了 - 続きを読むボタンを有効化');
+                continueBtn.disabled = false;
+                continueBtn.textContent = '📖 続きを読む';
+                continueBtn.style.opacity = '1';
             }
-        }, 3000); // 3秒ごとにチェック
+        });
+        
+        this.imageEventSource.addEventListener('done', () => {
+            this.stopImageStatusMonitoring();
+        });
+        
+        this.imageEventSource.onerror = (error) => {
+            console.error('❌ 画像生成通知の受信に失敗:', error);
+            this.stopImageStatusMonitoring();
+        };
     }
     
     // 画像生成状況の監視を停止する関数
     stopImageStatusMonitoring() {
-        if (this.imageStatusInterval) {
-            clearInterval(this.imageStatusInterval);
-            this.imageStatusInterval = null;
-            this.imageStatusChecking = false; // 実行中フラグもリセット
+        if (this.imageEventSource) {
+            this.imageEventSource.close();
+            this.imageEventSource = null;
             console.log('🛑 画像生成状況の監視を停止');
         } else {
             console.log('🛑 画像生成状況の監視は既に停止済み');
@@ -1050,45 +1116,18 @@ class StoryAgent {
                 return;
             }
             
-            // TTS APIを呼び出し
-            const response = await fetch(`${this.apiBaseUrl}/agent/storytelling/generate-audio`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    text: text,
-                    language: 'ja'
-                })
-            });
-            
-            if (response.ok) {
-                const data = await response.json();
-                console.log('🎵 TTS APIレスポンス:', data);
-                console.log('🎵 レスポンス詳細 - success:', data.success, 'audio_url:', data.audio_url);
-                
-                // ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
-                // 修正点：音声ファイル受信後に、現在の音声状態を再確認
-                if (!this.audioEnabled) {
-                    console.log('🔇 音声生成完了後に停止が指示されたため、再生をキャンセルします。');
-                    return; // 再生せずに処理を終了
-                }
-                // ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
-                
-                if (data.success && data.audio_url) {
-                    console.log('🎵 音声再生開始:', data.audio_url);
-                    console.log('🎵 音声URLの形式:', typeof data.audio_url, '長さ:', data.audio_url.length);
-                    this.playAudio(data.audio_url);
-                } else {
-                    console.log('⚠️ 音声生成に失敗、ブラウザ音声合成を使用');
-                    console.log('⚠️ 失敗理由 - success:', data.success, 'audio_url存在:', !!data.audio_url);
-                    this.fallbackSpeechSynthesis(text);
-                }
-            } else {
-                console.log('⚠️ TTS APIエラー、ブラウザ音声合成を使用');
-                console.log('⚠️ HTTPステータス:', response.status, response.statusText);
-                this.fallbackSpeechSynthesis(text);
+            // 先行合成済みならその音声を、なければ合成しながら返されるMP3をそのまま再生する
+            // （合成済みの音声にはサーバーがリダイレクトする）
+            const preloadedUrl = (this.preloadedAudioUrls || {})[text];
+            if (preloadedUrl) {
+                console.log('🎵 先行合成済みの音声を再生:', preloadedUrl);
+                this.playAudio(preloadedUrl, text);
+                return;
             }
+            const params = new URLSearchParams({ text: text, language: 'ja' });
+            const audioUrl = `${this.apiBaseUrl}/agent/storytelling/audio-stream?${params}`;
+            console.log('🎵 音声ストリーミング再生開始:', audioUrl.length, '文字のURL');
+            this.playAudio(audioUrl, text);
         } catch (error) {
             console.error('❌ 音声生成エラー:', error);
             console.log('⚠️ ブラウザ音声合成を使用');
@@ -1096,7 +1135,7 @@ class StoryAgent {
         }
     }
     
-    playAudio(audioUrl) {
+    playAudio(audioUrl, fallbackText = null) {
         // 音声再生開始前に停止状態をチェック
         if (!this.audioEnabled) {
             console.log('🔇 音声再生開始時に停止されたため、再生をキャンセル');
@@ -1153,6 +1192,10 @@ class StoryAgent {
             this.updateReadAloudButton();
             // エラー時もボタンを再有効化
             this.setReadAloudButtonEnabled(true);
+            // ストリーミング合成に失敗した場合はブラウザ音声合成で読み上げる
+            if (fallbackText && this.audioEnabled) {
+                this.fallbackSpeechSynthesis(fallbackText);
+            }
         };
         audio.onpause = () => {
             console.log('🎵 音声一時停止');
@@ -0,0 +1,97 @@
+"""AgentSessionManager のクライアントごと・全体の上限と推定サイズのテスト"""
+
+import asyncio
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from agents.Common.agent_sessions import AgentSessionManager
+
+
+class FakeRunner:
+    app_name = "test_app"
+
+    def __init__(self):
+        self.session_service = InMemorySessionService()
+
+
+def make_manager(**kwargs):
+    return AgentSessionManager(FakeRunner(), **kwargs)
+
+
+def runner_session_ids(manager):
+    app_sessions = manager.runner.session_service.sessions.get(manager.runner.app_name, {})
+    return {session_id for user_sessions in app_sessions.values() for session_id in user_sessions}
+
+
+def test_rotating_user_id_does_not_bypass_client_cap():
+    async def scenario():
+        manager = make_manager(max_per_client=2)
+        for index in range(5):
+            await manager.acquire(f"user-{index}", client="1.2.3.4")
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager.session_count() == 2
+    assert len(runner_session_ids(manager)) == 2
+    assert manager.stats()["evicted"] == 3
+
+
+def test_clients_do_not_evict_each_other():
+    async def scenario():
+        manager = make_manager(max_per_client=1)
+        first, _ = await manager.acquire("web_user", client="1.1.1.1")
+        await manager.acquire("web_user", client="2.2.2.2")
+        return manager, first
+
+    manager, first = asyncio.run(scenario())
+    assert manager.session_count() == 2
+    assert first in runner_session_ids(manager)
+
+
+def test_global_cap_evicts_oldest():
+    async def scenario():
+        manager = make_manager(max_sessions=3)
+        ids = [(await manager.acquire("web_user", client=f"client-{index}"))[0] for index in range(4)]
+        return manager, ids
+
+    manager, ids = asyncio.run(scenario())
+    assert manager.session_count() == 3
+    assert runner_session_ids(manager) == set(ids[1:])
+
+
+def test_session_is_reused_only_by_same_client_and_user():
+    async def scenario():
+        manager = make_manager()
+        session_id, _ = await manager.acquire("web_user", client="1.1.1.1")
+        same = await manager.acquire("web_user", session_id, client="1.1.1.1")
+        other_client = await manager.acquire("web_user", session_id, client="2.2.2.2")
+        return session_id, same, other_client
+
+    session_id, same, other_client = asyncio.run(scenario())
+    assert same == (session_id, False)
+    assert other_client[0] != session_id and other_client[1]
+
+
+def test_estimated_bytes_counts_only_new_events():
+    async def scenario():
+        manager = make_manager()
+        session = await manager.create("web_user", "1.1.1.1")
+        stored = manager.runner.session_service.sessions["test_app"]["web_user"][session.id]
+        event = Event(author="user", content=types.Content(role="user", parts=[types.Part(text="こんにちは")]))
+        stored.events.append(event)
+        first = manager.stats()["estimated_bytes"]
+        # 数え終わったイベントは再度シリアライズしない
+        stored.events[0] = Event(author="user", content=types.Content(role="user", parts=[types.Part(text="x" * 1000)]))
+        unchanged = manager.stats()["estimated_bytes"]
+        stored.events.append(event)
+        second = manager.stats()["estimated_bytes"]
+        await manager.release("web_user", session.id)
+        return manager, event, first, unchanged, second
+
+    manager, event, first, unchanged, second = asyncio.run(scenario())
+    event_bytes = len(event.model_dump_json(exclude_none=True))
+    assert unchanged == first
+    assert second - first == event_bytes
+    assert manager.stats()["estimated_bytes"] == 0
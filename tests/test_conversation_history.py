@@ -0,0 +1,108 @@
+"""ConversationHistoryManager のターン分割・要約への畳み込み・リクエストの切り詰めのテスト"""
+
+from types import SimpleNamespace
+
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from agents.Common.conversation_history import (
+    SUMMARIZED_TURNS_KEY,
+    SUMMARY_KEY,
+    ConversationHistoryManager,
+    split_turns,
+)
+
+
+def user(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def model(text: str) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+def tool_call() -> types.Content:
+    return types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="tool", args={}))])
+
+
+def tool_result() -> types.Content:
+    return types.Content(
+        role="user", parts=[types.Part(function_response=types.FunctionResponse(name="tool", response={"ok": True}))]
+    )
+
+
+def conversation(turns: int) -> list:
+    contents = []
+    for index in range(turns):
+        contents += [user(f"質問{index}です。続きです。"), model(f"答え{index}です。")]
+    # 今回の発言（ツール呼び出しを含む）
+    return contents + [user("いまの質問"), tool_call(), tool_result()]
+
+
+def make_request(contents: list) -> LlmRequest:
+    return LlmRequest(contents=contents, config=types.GenerateContentConfig(system_instruction="うさぎです。"))
+
+
+def test_split_turns_starts_at_user_text_only():
+    contents = [model("こんにちは"), user("あそぼう"), tool_call(), tool_result(), model("いいよ"), user("つぎ")]
+    turns = split_turns(contents)
+    assert [len(turn) for turn in turns] == [1, 4, 1]
+    # 関数呼び出しの結果はターンの区切りにならない
+    assert turns[1][-1].role == "model"
+
+
+def test_short_conversation_is_untouched():
+    manager = ConversationHistoryManager("test", keep_turns=6)
+    contents = conversation(3)
+    request = make_request(list(contents))
+    context = SimpleNamespace(state={})
+
+    manager(context, request)
+    assert request.contents == contents
+    assert context.state == {}
+    assert request.config.system_instruction == "うさぎです。"
+
+
+def test_old_turns_fold_into_summary_and_latest_turn_is_kept():
+    manager = ConversationHistoryManager("test", keep_turns=2)
+    contents = conversation(10)
+    request = make_request(list(contents))
+    context = SimpleNamespace(state={})
+
+    manager(context, request)
+
+    # 直近2ターンと今回のターンだけが残り、今回のツール呼び出しも落ちない
+    assert request.contents == contents[-7:]
+    assert request.contents[-3:] == contents[-3:]
+    assert context.state[SUMMARIZED_TURNS_KEY] == 8
+    summary = context.state[SUMMARY_KEY].splitlines()
+    assert summary[0] == "子ども: 質問0です。 / うさぎ: 答え0です。"
+    assert len(summary) == 8
+    assert request.config.system_instruction.startswith("うさぎです。")
+    assert context.state[SUMMARY_KEY] in request.config.system_instruction
+
+
+def test_summary_is_extended_with_new_turns_only():
+    manager = ConversationHistoryManager("test", keep_turns=2)
+    context = SimpleNamespace(state={SUMMARY_KEY: "前回までの要約", SUMMARIZED_TURNS_KEY: 8})
+
+    manager(context, make_request(conversation(12)))
+
+    # 要約済みの8ターンは作り直さず、新しく古くなった2ターンだけ追記する
+    assert context.state[SUMMARIZED_TURNS_KEY] == 10
+    assert context.state[SUMMARY_KEY].splitlines() == [
+        "前回までの要約",
+        "子ども: 質問8です。 / うさぎ: 答え8です。",
+        "子ども: 質問9です。 / うさぎ: 答え9です。",
+    ]
+
+
+def test_summary_drops_oldest_lines_over_limit():
+    manager = ConversationHistoryManager("test", keep_turns=0, max_summary_chars=60)
+    context = SimpleNamespace(state={})
+
+    manager(context, make_request(conversation(10)))
+
+    summary = context.state[SUMMARY_KEY]
+    assert len(summary) <= 60
+    assert summary.splitlines()[-1] == "子ども: 質問9です。 / うさぎ: 答え9です。"
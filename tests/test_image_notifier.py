@@ -0,0 +1,90 @@
+"""ImageNotifier の待機・ストア確認・後始末のテスト"""
+
+import asyncio
+
+from agents.StoryTelling_Agent.image_notifier import ImageNotifier
+
+
+def test_publish_wakes_waiter_and_releases_event():
+    notifier = ImageNotifier()
+
+    async def main():
+        waiter = asyncio.ensure_future(notifier.wait("s", 1, timeout=5))
+        await asyncio.sleep(0)
+        notifier.publish("s", 1, "https://example.com/1.png")
+        return await waiter
+
+    assert asyncio.run(main()) is True
+    assert notifier.pending_waits() == 0
+
+
+def test_publish_without_waiter_keeps_nothing():
+    notifier = ImageNotifier()
+
+    async def main():
+        notifier.bind_loop(asyncio.get_running_loop())
+        for page in range(100):
+            notifier.publish("s", page, None)
+
+    asyncio.run(main())
+    assert notifier.pending_waits() == 0
+
+
+def test_check_returns_when_already_settled():
+    notifier = ImageNotifier()
+
+    assert asyncio.run(notifier.wait("s", 1, timeout=5, check=lambda: True)) is True
+
+
+def test_poll_picks_up_completion_from_store():
+    notifier = ImageNotifier()
+    store = {}
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        # 他のワーカーが保存した（このプロセスには通知が来ない）
+        loop.call_later(0.05, store.update, {1: "https://example.com/1.png"})
+        started = loop.time()
+        settled = await notifier.wait("s", 1, timeout=5, check=lambda: 1 in store, poll_interval=0.01)
+        return settled, loop.time() - started
+
+    settled, waited = asyncio.run(main())
+    assert settled is True
+    assert waited < 1
+
+
+def test_async_check_is_awaited():
+    notifier = ImageNotifier()
+    store = {}
+
+    async def check():
+        # ネットワーク越しのストアを想定した async 版の確認
+        await asyncio.sleep(0)
+        return 1 in store
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.05, store.update, {1: None})
+        return await notifier.wait("s", 1, timeout=5, check=check, poll_interval=0.01)
+
+    assert asyncio.run(main()) is True
+    assert notifier.pending_waits() == 0
+
+
+def test_timeout_returns_false():
+    notifier = ImageNotifier()
+
+    assert asyncio.run(notifier.wait("s", 1, timeout=0.01, check=lambda: False, poll_interval=0.005)) is False
+    assert notifier.pending_waits() == 0
+
+
+def test_discard_wakes_waiters():
+    notifier = ImageNotifier()
+
+    async def main():
+        waiter = asyncio.ensure_future(notifier.wait("s", 1, timeout=5))
+        await asyncio.sleep(0)
+        notifier.discard("s")
+        return await waiter
+
+    assert asyncio.run(main()) is True
+    assert notifier.pending_waits() == 0
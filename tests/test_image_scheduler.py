@@ -0,0 +1,101 @@
+"""ImageGenerationScheduler のスレッドプールとasync関数のジョブの上限・期限のテスト"""
+
+import asyncio
+import threading
+
+import pytest
+
+from agents.StoryTelling_Agent.image_scheduler import ImageGenerationScheduler, SchedulerFullError
+
+
+def make_scheduler(**kwargs):
+    options = {"max_workers": 1, "max_queue": 1, "max_concurrent": 1, "max_async_queue": 1, "default_timeout": 5}
+    options.update(kwargs)
+    return ImageGenerationScheduler(**options)
+
+
+def test_async_jobs_do_not_count_against_thread_pool():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrent=16, max_async_queue=24)
+        release = asyncio.Event()
+        jobs = [asyncio.create_task(scheduler.run_coroutine(release.wait)) for _ in range(40)]
+        await asyncio.sleep(0.01)
+        during = scheduler.stats()
+        # async関数のジョブが待機・実行中でも、スレッドプールのジョブは受け付ける
+        result = await scheduler.run_async(lambda: "thread")
+        release.set()
+        await asyncio.gather(*jobs)
+        return scheduler, during, result
+
+    scheduler, during, result = asyncio.run(scenario())
+    assert result == "thread"
+    assert (during["async_in_flight"], during["async_queue_depth"]) == (16, 24)
+    assert (during["in_flight"], during["queue_depth"]) == (0, 0)
+    stats = scheduler.stats()
+    assert (stats["completed"], stats["async_completed"]) == (1, 40)
+    assert stats["rejected"] == stats["async_rejected"] == 0
+
+
+def test_busy_thread_pool_does_not_reject_async_jobs():
+    async def scenario():
+        scheduler = make_scheduler()
+        release = threading.Event()
+        blocked = [scheduler.submit(release.wait) for _ in range(2)]
+        with pytest.raises(SchedulerFullError):
+            scheduler.submit(release.wait)
+        result = await scheduler.run_coroutine(asyncio.sleep, 0, "async")
+        release.set()
+        for future in blocked:
+            future.result(timeout=5)
+        return scheduler, result
+
+    scheduler, result = asyncio.run(scenario())
+    assert result == "async"
+    stats = scheduler.stats()
+    assert (stats["rejected"], stats["async_rejected"]) == (1, 0)
+
+
+def test_async_queue_rejects_when_full():
+    async def scenario():
+        scheduler = make_scheduler()
+        release = asyncio.Event()
+        jobs = [asyncio.create_task(scheduler.run_coroutine(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(SchedulerFullError, match="実行中1件、待機中1件"):
+            await scheduler.run_coroutine(release.wait)
+        release.set()
+        await asyncio.gather(*jobs)
+        return scheduler
+
+    stats = asyncio.run(scenario()).stats()
+    assert (stats["async_submitted"], stats["async_rejected"], stats["async_completed"]) == (2, 1, 2)
+    assert (stats["async_queue_depth"], stats["async_in_flight"]) == (0, 0)
+
+
+def test_async_timeout_cancels_running_and_queued_jobs():
+    async def scenario():
+        scheduler = make_scheduler()
+        release = asyncio.Event()
+        jobs = [asyncio.create_task(scheduler.run_coroutine(release.wait, timeout=0.05)) for _ in range(2)]
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        return scheduler, results
+
+    scheduler, results = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+    stats = scheduler.stats()
+    # 2件とも期限切れ、うち1件はセマフォを待ったまま開始しなかった
+    assert (stats["async_timeouts"], stats["async_expired"]) == (2, 1)
+    assert (stats["async_queue_depth"], stats["async_in_flight"]) == (0, 0)
+
+
+def test_thread_job_expires_in_queue():
+    scheduler = make_scheduler()
+    release = threading.Event()
+    running = scheduler.submit(release.wait)
+    with pytest.raises(TimeoutError):
+        scheduler.run(lambda: "late", timeout=0.05)
+    release.set()
+    running.result(timeout=5)
+    stats = scheduler.stats()
+    assert stats["timeouts"] == 1
+    assert (stats["queue_depth"], stats["in_flight"]) == (0, 0)
@@ -0,0 +1,55 @@
+"""RecordReplayRunner のカセットのキー（会話の途中で同じ発言をした場合）のテスト"""
+
+import asyncio
+
+from google.adk.events import Event
+from google.genai import types
+
+from agents.Common.record_replay import CassetteStore, RecordReplayRunner
+
+
+class EchoRunner:
+    """呼ばれた回数を返す Runner"""
+
+    app_name = "child_care"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def run_async(self, *, user_id, session_id, new_message, **kwargs):
+        self.calls += 1
+        yield Event(author="model", content=types.Content(role="model", parts=[types.Part(text=f"reply {self.calls}")]))
+
+
+def user_message(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+async def conversation(runner, session_id: str, messages) -> list:
+    replies = []
+    for message in messages:
+        async for event in runner.run_async(user_id="u", session_id=session_id, new_message=user_message(message)):
+            replies.append(event.content.parts[0].text)
+    return replies
+
+
+def test_repeated_message_in_session_is_recorded_per_turn(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    messages = ["うん", "それで？", "うん"]
+
+    recorded = asyncio.run(conversation(RecordReplayRunner(EchoRunner(), store, "record", 0), "s1", messages))
+    replayed = asyncio.run(conversation(RecordReplayRunner(EchoRunner(), store, "replay", 0), "s2", messages))
+
+    assert recorded == ["reply 1", "reply 2", "reply 3"]
+    assert replayed == recorded
+    assert store.stats() == {"recorded": 3, "replayed": 3, "misses": 0}
+
+
+def test_sessions_are_keyed_independently(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    asyncio.run(conversation(RecordReplayRunner(EchoRunner(), store, "record", 0), "s1", ["うん"]))
+    replaying = RecordReplayRunner(EchoRunner(), store, "replay", 0)
+
+    # どちらのセッションも1ターン目として同じカセットを再生する
+    assert asyncio.run(conversation(replaying, "a", ["うん"])) == ["reply 1"]
+    assert asyncio.run(conversation(replaying, "b", ["うん"])) == ["reply 1"]
@@ -0,0 +1,104 @@
+"""RedisSessionStore のテスト（fakeredis をローカルの代替サーバーとして使う）"""
+
+import asyncio
+import threading
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from agents.Common.session_store import RedisSessionStore
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_store(server, **kwargs):
+    evicted = []
+    store = RedisSessionStore(fakeredis.FakeRedis(server=server), ttl=60, on_evict=evicted.append, **kwargs)
+    return store, evicted
+
+
+def test_round_trip_restores_page_keys(server):
+    store, _ = make_store(server)
+    store.set("s", {"story_pages": {1: "はじまり", 2: "つづき"}, "image_urls": {1: None}, "current_page": 1})
+
+    data = store.get("s")
+    assert data["story_pages"] == {1: "はじまり", 2: "つづき"}
+    assert data["image_urls"] == {1: None}
+    assert store.get("missing") is None
+
+
+def test_get_extends_ttl(server):
+    store, _ = make_store(server)
+    store.set("s", {"current_page": 1})
+    store.client.expire(store._key("s"), 5)
+
+    store.get("s")
+    assert store.client.ttl(store._key("s")) > 5
+
+
+def test_update_retries_after_concurrent_write(server):
+    store, _ = make_store(server)
+    other, _ = make_store(server)
+    store.set("s", {"image_urls": {}})
+    calls = []
+
+    def mutate(data):
+        calls.append(dict(data["image_urls"]))
+        if len(calls) == 1:
+            # WATCH 中に他のワーカーが書き込む
+            other.update("s", lambda d: d["image_urls"].__setitem__(1, "https://example.com/p1.png"))
+        data["image_urls"][2] = "https://example.com/p2.png"
+
+    result = store.update("s", mutate)
+    assert len(calls) == 2
+    assert result["image_urls"] == {1: "https://example.com/p1.png", 2: "https://example.com/p2.png"}
+    assert store.get("s") == result
+    assert store.update("missing", mutate) is None
+
+
+def test_delete_notifies_only_existing_sessions(server):
+    store, evicted = make_store(server)
+    store.set("s", {"current_page": 1})
+    store.delete("s")
+    store.delete("s")
+    assert evicted == ["s"]
+    assert store.get("s") is None
+
+
+def test_shared_between_stores_and_keys(server):
+    store, _ = make_store(server)
+    other, _ = make_store(server)
+    store.set("a", {"current_page": 1})
+    other.set("b", {"current_page": 2})
+    assert store.get("b") == {"current_page": 2}
+    assert sorted(store.keys()) == ["a", "b"]
+    assert len(store) == 2
+
+
+def test_async_methods_do_not_run_on_event_loop(server):
+    store, evicted = make_store(server)
+    threads = set()
+    execute_command = store.client.execute_command
+
+    def record(*args, **kwargs):
+        threads.add(threading.get_ident())
+        return execute_command(*args, **kwargs)
+
+    store.client.execute_command = record
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        await store.set_async("s", {"image_urls": {}})
+        updated = await store.update_async("s", lambda data: data["image_urls"].__setitem__(1, None))
+        fetched = await store.get_async("s")
+        await store.delete_async("s")
+        return loop_thread, updated, fetched
+
+    loop_thread, updated, fetched = asyncio.run(scenario())
+    assert updated == fetched == {"image_urls": {1: None}}
+    assert evicted == ["s"]
+    assert threads and loop_thread not in threads
@@ -0,0 +1,123 @@
+"""InMemorySessionStore のLRU・TTL・破棄通知のテスト"""
+
+import pytest
+
+from agents.Common import session_store
+from agents.Common.session_store import InMemorySessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_store.time, "monotonic", clock)
+    return clock
+
+
+def make_store(**kwargs):
+    evicted = []
+    store = InMemorySessionStore(on_evict=evicted.append, **kwargs)
+    return store, evicted
+
+
+def test_evicts_least_recently_used(clock):
+    store, evicted = make_store(max_sessions=2)
+    store.set("a", {"n": 1})
+    store.set("b", {"n": 2})
+    # a にアクセスすると b が最も古くなる
+    assert store.get("a") == {"n": 1}
+    store.set("c", {"n": 3})
+
+    assert evicted == ["b"]
+    assert list(store.keys()) == ["a", "c"]
+
+
+def test_update_refreshes_lru_order(clock):
+    store, evicted = make_store(max_sessions=2)
+    store.set("a", {"n": 1})
+    store.set("b", {"n": 2})
+    store.update("a", lambda data: data.update(n=10))
+    store.set("c", {"n": 3})
+
+    assert evicted == ["b"]
+    assert store.get("a") == {"n": 10}
+
+
+def test_get_returns_copy(clock):
+    store, _ = make_store()
+    store.set("a", {"pages": {1: "x"}})
+    store.get("a")["pages"][2] = "y"
+
+    assert store.get("a") == {"pages": {1: "x"}}
+
+
+def test_get_expires_entry_and_notifies(clock):
+    store, evicted = make_store(ttl=10)
+    store.set("a", {})
+    clock.now += 10
+
+    assert store.get("a") is None
+    assert evicted == ["a"]
+    # 2回目は通知しない
+    assert store.get("a") is None
+    assert evicted == ["a"]
+
+
+def test_update_on_expired_entry_notifies(clock):
+    store, evicted = make_store(ttl=10)
+    store.set("a", {})
+    clock.now += 11
+
+    assert store.update("a", lambda data: data.update(n=1)) is None
+    assert evicted == ["a"]
+
+
+def test_access_extends_ttl(clock):
+    store, evicted = make_store(ttl=10)
+    store.set("a", {})
+    clock.now += 8
+    assert store.get("a") == {}
+    clock.now += 8
+
+    assert store.get("a") == {}
+    assert evicted == []
+
+
+def test_len_excludes_expired_entries(clock):
+    store, evicted = make_store(ttl=10)
+    store.set("a", {})
+    clock.now += 5
+    store.set("b", {})
+    clock.now += 6
+
+    assert len(store) == 1
+    assert evicted == ["a"]
+    assert "a" not in store
+    assert "b" in store
+
+
+def test_delete_notifies_only_existing(clock):
+    store, evicted = make_store()
+    store.set("a", {})
+    store.delete("a")
+    store.delete("a")
+
+    assert evicted == ["a"]
+
+
+def test_on_evict_error_does_not_break_store(clock):
+    def fail(session_id):
+        raise RuntimeError("boom")
+
+    store = InMemorySessionStore(max_sessions=1, on_evict=fail)
+    store.set("a", {})
+    store.set("b", {})
+
+    assert list(store.keys()) == ["b"]
@@ -0,0 +1,30 @@
+"""simple_parallel_tool の Gemini クライアント設定のテスト"""
+
+import pytest
+
+from agents.StoryTelling_Agent import simple_parallel_tool
+
+
+@pytest.fixture
+def configured(monkeypatch):
+    calls = []
+    monkeypatch.setattr(simple_parallel_tool, "_configured_api_key", None)
+    monkeypatch.setattr(simple_parallel_tool.genai, "configure", lambda **kwargs: calls.append(kwargs["api_key"]))
+    return calls
+
+
+def test_configures_once_per_api_key(monkeypatch, configured):
+    monkeypatch.setenv("GOOGLE_API_KEY", "key-1")
+    for _ in range(3):
+        assert simple_parallel_tool._configure_genai() is None
+    # キーが変わった時だけ設定し直す（作成済みのクライアントを毎回捨てない）
+    monkeypatch.setenv("GOOGLE_API_KEY", "key-2")
+    simple_parallel_tool._configure_genai()
+    assert configured == ["key-1", "key-2"]
+
+
+def test_missing_api_key_is_reported(monkeypatch, configured):
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    result = simple_parallel_tool._configure_genai()
+    assert result["success"] is False
+    assert configured == []
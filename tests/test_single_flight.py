@@ -0,0 +1,198 @@
+"""SingleFlight の合流・失敗時の伝播のテスト"""
+
+import asyncio
+import threading
+
+from agents.Common.single_flight import SingleFlight, normalize_key
+
+
+def test_normalize_key_ignores_width_and_spaces():
+    assert normalize_key("ＡＢＣ  うさぎ") == normalize_key("abc うさぎ")
+
+
+def test_do_async_fans_out_leader_result():
+    flight = SingleFlight("test_fan_out")
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", work, 21) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert calls == [21]
+    assert flight.stats() == {"leaders": 1, "coalesced": 4, "failures": 0, "in_flight": 0}
+
+
+def test_do_async_leader_failure_reaches_followers_and_releases_key():
+    flight = SingleFlight("test_failure")
+    attempts = []
+
+    async def fail():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def ok():
+        return "ok"
+
+    async def main():
+        results = await asyncio.gather(*(flight.do_async("k", fail) for _ in range(3)), return_exceptions=True)
+        # 失敗後は同じキーでも新しく実行される
+        retry = await flight.do_async("k", ok)
+        return results, retry
+
+    results, retry = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert attempts == [1]
+    assert retry == "ok"
+    assert flight.stats()["failures"] == 1
+
+
+def test_do_async_leader_cancel_does_not_cancel_followers():
+    flight = SingleFlight("test_cancel")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, leader
+
+    result, leader = asyncio.run(main())
+    assert result == "done"
+    assert leader.cancelled()
+
+
+def test_do_fans_out_across_threads():
+    flight = SingleFlight("test_threads")
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "shared"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flight.stats()["coalesced"] < 3:
+        pass
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert results == ["shared"] * 4
+    assert calls == [1]
+
+
+def test_do_leader_failure_raises_in_followers():
+    flight = SingleFlight("test_thread_failure")
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("k", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads += [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads[1:]:
+        thread.start()
+    while flight.stats()["coalesced"] < 2:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_stream_replays_items_to_late_subscribers():
+    flight = SingleFlight("test_stream")
+    runs = []
+
+    async def source():
+        runs.append(1)
+        for item in range(3):
+            await asyncio.sleep(0.01)
+            yield item
+
+    async def collect():
+        return [item async for item in flight.stream("k", source)]
+
+    async def main():
+        first = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.015)
+        # 1つ目の要素が出た後に参加しても最初から受け取る
+        second = await collect()
+        return await first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == [0, 1, 2]
+    assert runs == [1]
+
+
+def test_stream_error_reaches_all_subscribers():
+    flight = SingleFlight("test_stream_error")
+
+    async def source():
+        yield 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def collect(items):
+        async for item in flight.stream("k", source):
+            items.append(item)
+
+    async def main():
+        first, second = [], []
+        results = await asyncio.gather(collect(first), collect(second), return_exceptions=True)
+        return results, first, second
+
+    results, first, second = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert first == second == [1]
+
+
+def test_different_keys_run_independently():
+    flight = SingleFlight("test_keys")
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        return await asyncio.gather(flight.do_async("a", work, "a"), flight.do_async("b", work, "b"))
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
@@ -0,0 +1,60 @@
+"""UrlIndexLog と、それを使う画像・音声キャッシュの永続化のテスト"""
+
+from agents.StoryTelling_Agent.audio_cache import AudioCache
+from agents.StoryTelling_Agent.image_cache import ContentAddressedImageCache
+from agents.StoryTelling_Agent.url_index import UrlIndexLog
+
+
+def test_append_and_reload(tmp_path):
+    path = str(tmp_path / "index.log")
+    index = UrlIndexLog(path, max_entries=10)
+    entries = {}
+    for key, url in [("a", "u1"), ("b", "u2"), ("a", "u3")]:
+        entries[key] = url
+        index.append(key, url, lambda: entries)
+
+    # 同じキーは後の行が優先され、最後に使った順に並ぶ
+    assert list(UrlIndexLog(path, max_entries=10).load().items()) == [("b", "u2"), ("a", "u3")]
+
+
+def test_load_skips_truncated_line_and_keeps_newest(tmp_path):
+    path = tmp_path / "index.log"
+    path.write_text("a\tu1\nb\tu2\nc\tu3\nd", encoding="utf-8")
+
+    assert list(UrlIndexLog(str(path), max_entries=2).load()) == ["b", "c"]
+
+
+def test_compacts_when_log_grows(tmp_path):
+    path = tmp_path / "index.log"
+    index = UrlIndexLog(str(path), max_entries=2, compact_ratio=2)
+    entries = {}
+    for i in range(10):
+        entries[f"k{i}"] = f"u{i}"
+        while len(entries) > 2:
+            entries.pop(next(iter(entries)))
+        index.append(f"k{i}", f"u{i}", lambda: dict(entries))
+
+    assert len(path.read_text(encoding="utf-8").splitlines()) <= 4
+    assert UrlIndexLog(str(path), max_entries=2).load() == {"k8": "u8", "k9": "u9"}
+
+
+def test_image_cache_disk_tier_survives_restart(tmp_path):
+    cache = ContentAddressedImageCache(memory_entries=1, disk_dir=str(tmp_path))
+    cache.remember("key", "https://example.com/key.png")
+
+    restarted = ContentAddressedImageCache(memory_entries=1, disk_dir=str(tmp_path))
+    assert restarted.lookup("key") == "https://example.com/key.png"
+    assert restarted.lookup("missing") is None
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["misses"] == 1
+
+
+def test_audio_cache_appends_one_line_per_store(tmp_path):
+    path = tmp_path / "index.log"
+    cache = AudioCache(index_path=str(path), max_entries=100, check_backend=False)
+    for i in range(3):
+        cache.remember(f"k{i}", f"https://example.com/{i}.mp3")
+
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+    restarted = AudioCache(index_path=str(path), max_entries=100, check_backend=False)
+    assert restarted.lookup("k1") == "https://example.com/1.mp3"